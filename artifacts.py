@@ -0,0 +1,224 @@
+import json
+import os
+import numpy as np
+
+# Columnar binary version of data_preprocessed.json and manga.json.
+# Every column is a .npy file which is memory mapped when loading, this way the pages are shared
+# between all processes reading the same files. Strings are stored as string tables, a utf-8 blob
+# together with the offsets of each string. Lists per manga are stored as offsets into a flat values array.
+FORMAT_VERSION = 2
+DEFAULT_DIRECTORY = "data_columnar"
+# The search index (see search_index.py) is written for both output formats and has its own directory
+SEARCH_INDEX_DIRECTORY = "search_index"
+SEARCH_INDEX_FORMAT_VERSION = 1
+META_FILE_NAME = "meta.json"
+
+class StringTable:
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, strings):
+        # One bytes blob instead of a Python string object per value
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+    def to_list(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[start:stop].decode("utf-8") for start, stop in zip(offsets, offsets[1:])]
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.npy")
+
+def _save_column(directory, name, values, dtype):
+    np.save(_column_path(directory, name), np.asarray(values, dtype=dtype))
+
+def _load_column(directory, name):
+    return np.load(_column_path(directory, name), mmap_mode="r")
+
+def _save_string_table(directory, name, strings):
+    string_table = StringTable.from_strings(strings)
+    _save_column(directory, f"{name}.offsets", string_table.offsets, np.int64)
+    _save_column(directory, f"{name}.data", string_table.data, np.uint8)
+
+def _load_string_table(directory, name):
+    return StringTable(_load_column(directory, f"{name}.offsets"), _load_column(directory, f"{name}.data"))
+
+def _save_categories(directory, name, values):
+    # Store repeated strings (such as tag ids) once and reference them by an int32 code
+    categories = {}
+    codes = [categories.setdefault(v, len(categories)) for v in values]
+    _save_string_table(directory, f"{name}.categories", list(categories))
+    _save_column(directory, f"{name}.codes", codes, np.int32)
+
+def _load_categories(directory, name):
+    # A pandas categorical, the strings are not repeated per row
+    import pandas as pd
+    categories = _load_string_table(directory, f"{name}.categories").to_list()
+    return pd.Categorical.from_codes(_load_column(directory, f"{name}.codes"), categories=categories)
+
+def rows_to_columns(rows, categorical_columns=("tag_id", "title")):
+    # Rows of data_preprocessed.json as columns like load_preprocessed_data returns them,
+    # this way the dicts per row do not have to be kept in memory
+    import pandas as pd
+    df = pd.DataFrame(rows)
+    columns = {}
+    for name in df.columns:
+        if name in categorical_columns:
+            values = pd.Categorical(df[name])
+            # New string objects for the categories, the parsed ones are spread over the memory of the whole
+            # json document and would keep all of it from being released
+            categories = StringTable.from_strings(values.categories).to_list()
+            columns[name] = pd.Categorical.from_codes(values.codes, categories=categories)
+        else:
+            columns[name] = df[name].to_numpy()
+    return columns
+
+def _save_offsets(directory, name, lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(l) for l in lists], out=offsets[1:])
+    _save_column(directory, f"{name}.offsets", offsets, np.int64)
+
+def has_binary_data(directory):
+    return os.path.isfile(os.path.join(directory, META_FILE_NAME))
+
+def _save_tag_statistics(directory, name, tags):
+    _save_categories(directory, f"{name}.tag_id", [t["tag_id"] for t in tags])
+    _save_column(directory, f"{name}.year", [t["year"] for t in tags], np.int64)
+    _save_column(directory, f"{name}.average_rating", [np.nan if t["average_rating"] is None else t["average_rating"] for t in tags], np.float64)
+    _save_column(directory, f"{name}.number_of_mangas", [t["number_of_mangas"] for t in tags], np.int64)
+
+def _load_tag_statistics(directory, name):
+    return {
+        "tag_id": _load_categories(directory, f"{name}.tag_id"),
+        "year": _load_column(directory, f"{name}.year"),
+        "average_rating": _load_column(directory, f"{name}.average_rating"),
+        "number_of_mangas": _load_column(directory, f"{name}.number_of_mangas"),
+    }
+
+def write_binary_data(directory, preprocessed_data, manga_data):
+    os.makedirs(directory, exist_ok=True)
+
+    _save_tag_statistics(directory, "tags", preprocessed_data["tags"])
+    for rollup in preprocessed_data["tag_rollups"]:
+        _save_tag_statistics(directory, f"tag_rollups.{rollup['years_per_bucket']}", rollup["tags"])
+
+    top_ratings = preprocessed_data["top_ratings"]
+    _save_categories(directory, "top_ratings.tag_id", [t["tag_id"] for t in top_ratings])
+    _save_column(directory, "top_ratings.manga_id", [t["manga_id"] for t in top_ratings], np.int64)
+    _save_column(directory, "top_ratings.rating", [t["rating"] for t in top_ratings], np.float64)
+    # A manga is among the top ratings of many tags and years, its title is stored once
+    _save_categories(directory, "top_ratings.title", [t["title"] for t in top_ratings])
+    _save_column(directory, "top_ratings.year", [t["year"] for t in top_ratings], np.int64)
+
+    mangas = manga_data["mangas"]
+    _save_column(directory, "mangas.id", [m["id"] for m in mangas], np.int64)
+    _save_string_table(directory, "mangas.title", [m["title"] for m in mangas])
+    _save_string_table(directory, "mangas.description", [m["description"] for m in mangas])
+    _save_column(directory, "mangas.rating", [m["rating"] for m in mangas], np.float64)
+    _save_column(directory, "mangas.year", [m["year"] for m in mangas], np.int64)
+    _save_string_table(directory, "mangas.cover", [m["cover"] for m in mangas])
+    _save_offsets(directory, "mangas.tags", [m["tags"] for m in mangas])
+    _save_categories(directory, "mangas.tags", [t for m in mangas for t in m["tags"]])
+    # Titles of similar mangas are not stored again, they are looked up by id when loading
+    _save_offsets(directory, "mangas.similar_mangas", [m["similar_mangas"] for m in mangas])
+    _save_column(directory, "mangas.similar_mangas.id", [s["id"] for m in mangas for s in m["similar_mangas"]], np.int64)
+    # Positions of the similar mangas in the mangas columns, see manga_store.MangaStore
+    positions = { m["id"]: position for position, m in enumerate(mangas) }
+    _save_column(directory, "mangas.similar_mangas.position", [positions[s["id"]] for m in mangas for s in m["similar_mangas"]], np.int32)
+    _save_column(directory, "mangas.similar_mangas.similarity_score", [s["similarity_score"] for m in mangas for s in m["similar_mangas"]], np.float64)
+
+    # Write the meta file last, it marks the directory as complete
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "tag_descriptions": preprocessed_data["tag_descriptions"],
+        "years": preprocessed_data["years"],
+        "tag_rollups": [r["years_per_bucket"] for r in preprocessed_data["tag_rollups"]],
+    }
+    with open(os.path.join(directory, META_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+def _load_meta(directory, format_version=FORMAT_VERSION):
+    with open(os.path.join(directory, META_FILE_NAME), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["format_version"] != format_version:
+        raise ValueError(f"Unsupported binary data format version {meta['format_version']} in {directory}")
+    return meta
+
+def load_preprocessed_data(directory):
+    # Same structure as data_preprocessed.json but "tags" and "top_ratings" are dicts of columns
+    # which can be passed to pd.DataFrame directly. Numeric columns are memory mapped,
+    # tag ids and titles are categoricals.
+    meta = _load_meta(directory)
+    return {
+        "tag_descriptions": meta["tag_descriptions"],
+        "years": meta["years"],
+        "tags": _load_tag_statistics(directory, "tags"),
+        # Data written before the rollups existed has none
+        "tag_rollups": [{
+            "years_per_bucket": years_per_bucket,
+            "tags": _load_tag_statistics(directory, f"tag_rollups.{years_per_bucket}"),
+        } for years_per_bucket in meta.get("tag_rollups", [])],
+        "top_ratings": {
+            "tag_id": _load_categories(directory, "top_ratings.tag_id"),
+            "manga_id": _load_column(directory, "top_ratings.manga_id"),
+            "rating": _load_column(directory, "top_ratings.rating"),
+            "title": _load_categories(directory, "top_ratings.title"),
+            "year": _load_column(directory, "top_ratings.year"),
+        }
+    }
+
+def load_manga_columns(directory):
+    # Columns of manga.json, all of them stay memory mapped. Strings are string tables which
+    # decode a single string on access, list columns are split into offsets and values.
+    _load_meta(directory)
+    return {
+        "id": _load_column(directory, "mangas.id"),
+        "title": _load_string_table(directory, "mangas.title"),
+        "description": _load_string_table(directory, "mangas.description"),
+        "rating": _load_column(directory, "mangas.rating"),
+        "year": _load_column(directory, "mangas.year"),
+        "cover": _load_string_table(directory, "mangas.cover"),
+        "tags.offsets": _load_column(directory, "mangas.tags.offsets"),
+        "tags.codes": _load_column(directory, "mangas.tags.codes"),
+        "tags.categories": _load_string_table(directory, "mangas.tags.categories"),
+        "similar_mangas.offsets": _load_column(directory, "mangas.similar_mangas.offsets"),
+        "similar_mangas.id": _load_column(directory, "mangas.similar_mangas.id"),
+        "similar_mangas.position": _load_column(directory, "mangas.similar_mangas.position"),
+        "similar_mangas.similarity_score": _load_column(directory, "mangas.similar_mangas.similarity_score"),
+    }
+
+def has_search_index(directory):
+    return os.path.isfile(os.path.join(directory, META_FILE_NAME))
+
+def write_search_index(directory, columns):
+    os.makedirs(directory, exist_ok=True)
+    _save_string_table(directory, "terms", columns["terms"])
+    _save_column(directory, "postings.offsets", columns["offsets"], np.int64)
+    _save_column(directory, "postings.positions", columns["positions"], np.int32)
+    _save_column(directory, "postings.scores", columns["scores"], np.float32)
+    _save_column(directory, "manga_ids", columns["manga_ids"], np.int64)
+    # Write the meta file last, it marks the directory as complete
+    with open(os.path.join(directory, META_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump({ "format_version": SEARCH_INDEX_FORMAT_VERSION }, f)
+
+def load_search_index_columns(directory):
+    # The terms stay a string table, they are only decoded for the binary search of a query
+    _load_meta(directory, SEARCH_INDEX_FORMAT_VERSION)
+    return {
+        "terms": _load_string_table(directory, "terms"),
+        "offsets": _load_column(directory, "postings.offsets"),
+        "positions": _load_column(directory, "postings.positions"),
+        "scores": _load_column(directory, "postings.scores"),
+        "manga_ids": _load_column(directory, "manga_ids"),
+    }
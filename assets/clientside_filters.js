@@ -0,0 +1,155 @@
+// Clientside versions of the filter callbacks of main.py, used when CLIENTSIDE_FILTERS=1.
+// The aggregated tag/year data and the top ratings are shipped once in a dcc.Store (see prepare_filter_data in main.py),
+// filtering by year and tags and building the figures happens in the browser. The figures are built the same way
+// plotly express builds them on the server.
+(function () {
+    function getDropdownValueAsList(dropdownValue) {
+        // The inital value if one element is selected can be a string such as 'action' instead of a list
+        return Array.isArray(dropdownValue) ? dropdownValue : [dropdownValue];
+    }
+
+    function groupRowsByTag(table, tagIds, tagsDropdownValue, minYear, maxYear) {
+        // Rows of the selected tags within the year range, grouped by tag in the order the tags appear first
+        const tagsToFilter = new Set(getDropdownValueAsList(tagsDropdownValue));
+        const groups = new Map();
+        for (let i = 0; i < table.year.length; i++) {
+            const tag = tagIds[table.tag_code[i]];
+            const year = table.year[i];
+            if (year < minYear || year > maxYear || !tagsToFilter.has(tag)) {
+                continue;
+            }
+            if (!groups.has(tag)) {
+                groups.set(tag, []);
+            }
+            groups.get(tag).push(i);
+        }
+        return groups;
+    }
+
+    function pick(values, rows) {
+        return rows.map((i) => values[i]);
+    }
+
+    function createLayout(filterData, data, xTitle, yTitle, extraLayout) {
+        const layout = Object.assign({
+            template: filterData.template,
+            xaxis: {anchor: "y", domain: [0.0, 1.0], title: {text: xTitle}},
+            yaxis: {anchor: "x", domain: [0.0, 1.0], title: {text: yTitle}},
+            legend: {tracegroupgap: 0},
+            margin: {t: 60}
+        }, extraLayout);
+        // Like plotly express the legend only gets a title if there are traces
+        if (data.length > 0) {
+            layout.legend.title = {text: "tag_id"};
+        }
+        return layout;
+    }
+
+    function getColor(filterData, traceIndex) {
+        const colorway = filterData.template.layout.colorway;
+        return colorway[traceIndex % colorway.length];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        manhuag: {
+            updateBarTopRatingsForTags: function (timerangeSliderValue, tagsDropdownValue, tagsOverTimeData, filterData) {
+                let minYear = timerangeSliderValue[0];
+                let maxYear = timerangeSliderValue[1];
+
+                // Use min and max year from relayoutData if available
+                if (tagsOverTimeData && "xaxis.range[0]" in tagsOverTimeData) {
+                    minYear = Math.trunc(tagsOverTimeData["xaxis.range[0]"]);
+                    maxYear = Math.trunc(tagsOverTimeData["xaxis.range[1]"]);
+                }
+
+                const table = filterData.top_ratings;
+                const groups = groupRowsByTag(table, filterData.tag_ids, tagsDropdownValue, minYear, maxYear);
+                const data = Array.from(groups, ([tag, rows], traceIndex) => ({
+                    alignmentgroup: "True",
+                    customdata: rows.map((i) => [table.manga_id[i]]),
+                    hovertemplate: `tag_id=${tag}<br>Year=%{x}<br>Manga Rating=%{y}<br>title=%{text}<extra></extra>`,
+                    legendgroup: tag,
+                    marker: {color: getColor(filterData, traceIndex), pattern: {shape: ""}},
+                    name: tag,
+                    offsetgroup: tag,
+                    orientation: "v",
+                    showlegend: tag !== "",
+                    text: pick(table.title, rows),
+                    textposition: "auto",
+                    x: pick(table.year, rows),
+                    xaxis: "x",
+                    y: pick(table.rating, rows),
+                    yaxis: "y",
+                    type: "bar"
+                }));
+                return {data: data, layout: createLayout(filterData, data, "Year", "Manga Rating", {barmode: "group"})};
+            },
+
+            updateScatterNumberOfMangasPerTag: function (timerangeSliderValue, tagsDropdownValue, filterData) {
+                const table = filterData.tags;
+                const groups = groupRowsByTag(table, filterData.tag_ids, tagsDropdownValue, timerangeSliderValue[0], timerangeSliderValue[1]);
+
+                // Bubble size is the average rating normalized over all selected rows
+                const ratings = Array.from(groups.values()).flat().map((i) => table.average_rating[i]);
+                const minRating = Math.min(...ratings);
+                const maxRating = Math.max(...ratings);
+                const getBubbleSize = (i) => {
+                    const bubbleSize = (table.average_rating[i] - minRating) / (maxRating - minRating) * 100;
+                    return Number.isFinite(bubbleSize) ? bubbleSize : null;
+                };
+                const maxBubbleSize = ratings.length > 0 && maxRating > minRating ? 100 : null;
+
+                const data = Array.from(groups, ([tag, rows], traceIndex) => {
+                    const bubbleSizes = rows.map(getBubbleSize);
+                    return {
+                        customdata: bubbleSizes.map((size) => [size]),
+                        hovertemplate: `<b>%{hovertext}</b><br><br>tag_id=${tag}<br>Year=%{x}<br>Number of Mangas=%{y}<extra></extra>`,
+                        hovertext: rows.map(() => tag),
+                        legendgroup: tag,
+                        marker: {
+                            color: getColor(filterData, traceIndex),
+                            size: bubbleSizes,
+                            sizemode: "area",
+                            // Same as plotly express with the default size_max of 20
+                            sizeref: maxBubbleSize === null ? null : maxBubbleSize / (20 ** 2),
+                            symbol: "circle"
+                        },
+                        mode: "markers",
+                        name: tag,
+                        orientation: "v",
+                        showlegend: tag !== "",
+                        x: pick(table.year, rows),
+                        xaxis: "x",
+                        y: pick(table.number_of_mangas, rows),
+                        yaxis: "y",
+                        type: "scatter"
+                    };
+                });
+                const layout = createLayout(filterData, data, "Year", "Number of Mangas", {});
+                layout.legend.itemsizing = "constant";
+                return {data: data, layout: layout};
+            },
+
+            updateLineAvgScoreForTagsOverTime: function (timerangeSliderValue, tagsDropdownValue, filterData) {
+                const table = filterData.tags;
+                const groups = groupRowsByTag(table, filterData.tag_ids, tagsDropdownValue, timerangeSliderValue[0], timerangeSliderValue[1]);
+                const data = Array.from(groups, ([tag, rows], traceIndex) => ({
+                    hovertemplate: `tag_id=${tag}<br>Year=%{x}<br>Average Rating=%{y}<extra></extra>`,
+                    legendgroup: tag,
+                    line: {color: getColor(filterData, traceIndex), dash: "solid"},
+                    marker: {symbol: "circle"},
+                    mode: "lines",
+                    name: tag,
+                    orientation: "v",
+                    showlegend: tag !== "",
+                    x: pick(table.year, rows),
+                    xaxis: "x",
+                    y: pick(table.average_rating, rows),
+                    yaxis: "y",
+                    type: "scatter"
+                }));
+                return {data: data, layout: createLayout(filterData, data, "Year", "Average Rating", {})};
+            }
+        }
+    });
+})();
@@ -0,0 +1,13 @@
+import uuid
+from dash import DiskcacheManager
+
+# Slow callbacks of main.py run as Dash background callbacks (see main.background_callback).
+# The request of a callback only starts a job process and returns its key, the browser then polls
+# for the progress and the result. The jobs, their progress and results are kept in a disk cache.
+
+class JobDiskcacheManager(DiskcacheManager):
+    # Dash derives the key of a job from the source of the callback and its arguments. Different clicks can have
+    # the same arguments (a click on a search result is only told apart by the triggered input) and two browsers
+    # running the same job at the same time would read and delete each other's result. Every job gets a key of its own.
+    def build_cache_key(self, fn, args, cache_args_to_ignore):
+        return f"{super().build_cache_key(fn, args, cache_args_to_ignore)}-{uuid.uuid4().hex}"
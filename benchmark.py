@@ -0,0 +1,339 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import artifacts
+import data_versions
+import jikan
+import preprocessing
+from manga_store import MangaStore
+from minhash import MinHashIndex
+from search_index import SearchIndex
+from similarity import METRICS, SEARCH_DENSE, SEARCH_PRUNED, SimilarityIndex, build_tag_matrix, calculate_top_k_similar
+from synthetic_data import write_synthetic_data
+
+# Benchmarks of the preprocessing stages, the data loading at startup, the Dash callbacks and the similarity queries.
+# Every benchmark is warmed up and then repeated, the median and the 95th percentile of the wall clock and cpu times
+# are reported. The memory peak is measured with tracemalloc in one extra call because tracing slows down every
+# allocation and would distort the timings. Results are written as json and can be compared with an earlier run.
+#
+# python3 benchmark.py --mangas 20000 --output benchmark_results.json
+# python3 benchmark.py --mangas 20000 --compare benchmark_results.json
+
+DEFAULT_REPETITIONS = 10
+DEFAULT_WARMUPS = 2
+# A benchmark is a regression if its median time or memory peak grew by more than this share
+DEFAULT_THRESHOLD = 0.1
+# Memory peaks below this are too small to compare
+MIN_COMPARED_MEMORY_MB = 1
+REPOSITORY_PATH = os.path.dirname(os.path.abspath(__file__))
+# Benchmarks which run (their work) in new processes, tracemalloc does not see their memory
+SUBPROCESS_BENCHMARKS = { "preprocessing.write_json", "startup.import_main", "startup.import_main_fast" }
+
+def run_benchmark(function, repetitions, warmups, setup=None, trace_memory=True):
+	# setup is called before every call of function and is not measured
+	setup = setup or (lambda: None)
+	for _ in range(warmups):
+		setup()
+		function()
+
+	wall_times = []
+	cpu_times = []
+	for _ in range(repetitions):
+		setup()
+		wall_start, cpu_start = time.perf_counter(), time.process_time()
+		function()
+		wall_times.append(time.perf_counter() - wall_start)
+		cpu_times.append(time.process_time() - cpu_start)
+
+	peak_memory_mb = None
+	if trace_memory:
+		setup()
+		tracemalloc.start()
+		try:
+			function()
+			peak_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+		finally:
+			tracemalloc.stop()
+
+	wall_times_ms = np.array(wall_times) * 1000
+	return {
+		"repetitions": repetitions,
+		"median_ms": float(np.median(wall_times_ms)),
+		"p95_ms": float(np.percentile(wall_times_ms, 95)),
+		"min_ms": float(wall_times_ms.min()),
+		"max_ms": float(wall_times_ms.max()),
+		"cpu_median_ms": float(np.median(cpu_times) * 1000),
+		"peak_memory_mb": peak_memory_mb
+	}
+
+def prepare_data_dir(data_dir, num_mangas, num_tags, seed):
+	# Generates data.csv unless the directory already has one and runs the preprocessing once,
+	# the startup and callback benchmarks need its output files
+	data_path = os.path.join(data_dir, "data.csv")
+	if not os.path.isfile(data_path):
+		write_synthetic_data(data_path, num_mangas, num_tags, seed)
+	if not os.path.isfile(os.path.join(data_versions.get_data_directory(data_dir), "manga.json")):
+		preprocessing.main(["--data", data_path, "--output-dir", data_dir])
+	return data_path
+
+def load_json(path):
+	with open(path, encoding="utf-8") as f:
+		return json.load(f)
+
+def load_manga_store_json(path):
+	with open(path, encoding="utf-8") as f:
+		return MangaStore.from_json(f)
+
+def create_preprocessing_benchmarks(data_dir, data_path, output_dir):
+	mangas, tag_descriptions, years, tag_ids = preprocessing.read_mangas(data_path)
+	exploded_df = preprocessing.explode_tags(pd.DataFrame.from_dict(mangas))
+	tag_matrix, tag_counts = build_tag_matrix(mangas, tag_ids)
+	minhash_index = MinHashIndex(tag_matrix, tag_counts)
+	version_dir = data_versions.get_data_directory(data_dir)
+	preprocessed_data = load_json(os.path.join(version_dir, "data_preprocessed.json"))
+	manga_data = load_json(os.path.join(version_dir, "manga.json"))
+
+	def write_json():
+		# The same way as preprocessing.py, one forked process per file
+		data_versions.start_writing_json_files({
+			os.path.join(output_dir, "data_preprocessed.json"): preprocessed_data,
+			os.path.join(output_dir, "manga.json"): manga_data,
+		})()
+
+	return [
+		("preprocessing.read", lambda: preprocessing.read_mangas(data_path), None),
+		("preprocessing.explode_tags", lambda: preprocessing.explode_tags(pd.DataFrame.from_dict(mangas)), None),
+		("preprocessing.tag_statistics", lambda: preprocessing.calculate_tag_statistics(exploded_df, tag_descriptions, years), None),
+		("preprocessing.tag_matrix", lambda: build_tag_matrix(mangas, tag_ids), None),
+		("preprocessing.similarity_dense", lambda: calculate_top_k_similar(tag_matrix, tag_counts, search=SEARCH_DENSE), None),
+		("preprocessing.similarity_pruned", lambda: calculate_top_k_similar(tag_matrix, tag_counts, search=SEARCH_PRUNED), None),
+		("preprocessing.minhash_index", lambda: MinHashIndex(tag_matrix, tag_counts), None),
+		("preprocessing.search_index", lambda: SearchIndex.from_mangas(manga_data["mangas"]), None),
+		("preprocessing.similarity_minhash", lambda: minhash_index.top_k(np.arange(len(mangas))), None),
+		("preprocessing.write_json", write_json, None),
+		("preprocessing.write_binary", lambda: artifacts.write_binary_data(os.path.join(output_dir, artifacts.DEFAULT_DIRECTORY), preprocessed_data, manga_data), None),
+	]
+
+def create_startup_benchmarks(data_dir):
+	version_dir = data_versions.get_data_directory(data_dir)
+	binary_data_path = os.path.join(version_dir, artifacts.DEFAULT_DIRECTORY)
+	# The whole startup of the application in a new interpreter, the way gunicorn or python3 main.py start it
+	env = dict(os.environ, PYTHONPATH=REPOSITORY_PATH)
+	import_main = lambda: subprocess.run([sys.executable, "-c", "import main"], cwd=data_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+	# FAST_STARTUP=1 needs the startup artifact of the data
+	subprocess.run([sys.executable, os.path.join(REPOSITORY_PATH, "startup.py")], cwd=data_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+	import_main_fast = lambda: subprocess.run([sys.executable, "-c", "import main"], cwd=data_dir, env=dict(env, FAST_STARTUP="1"), check=True, stdout=subprocess.DEVNULL)
+	return [
+		("startup.load_preprocessed_data_json", lambda: load_json(os.path.join(version_dir, "data_preprocessed.json")), None),
+		("startup.load_preprocessed_data_binary", lambda: artifacts.load_preprocessed_data(binary_data_path), None),
+		("startup.load_manga_store_json", lambda: load_manga_store_json(os.path.join(version_dir, "manga.json")), None),
+		("startup.load_manga_store_binary", lambda: MangaStore.from_columns(artifacts.load_manga_columns(binary_data_path)), None),
+		("startup.import_main", import_main, None),
+		("startup.import_main_fast", import_main_fast, None),
+	]
+
+def get_callback_function(callback):
+	# The callbacks registered with dash wrap the function, the original one can be called directly
+	return getattr(callback, "__wrapped__", callback)
+
+class StubJikanClient(jikan.JikanClient):
+	# Answers the live lookups of main.py without requests, the network is not measured
+	def __init__(self, recommendations):
+		super().__init__()
+		self.recommendations = recommendations
+
+	def get_manga_id(self, manga_title):
+		return 1
+
+	def get_recommendations(self, mal_id):
+		return self.recommendations
+
+def create_callback_benchmarks(data_dir, output_dir):
+	# main loads the data of the current directory when it is imported
+	os.chdir(data_dir)
+	import main
+	import startup
+	from recommendation_store import STATUS_FOUND, RecommendationStore
+
+	def clear_caches():
+		main.figure_cache.clear()
+		main.filter_top_ratings.cache_clear()
+		main.filter_tags_with_ratings.cache_clear()
+
+	# Realistic inputs: the three most common tags over all years, the charts of the browser show the last decade
+	tags = [t["tag_id"] for t in main.get_tag_descriptions()[:3]]
+	# A wide selection, shown per 5 years or per decade (see rollups.py)
+	many_tags = [t["tag_id"] for t in main.get_tag_descriptions()[:25]]
+	all_years = [main.min_year, main.max_year]
+	last_decade = [max(main.min_year, main.max_year - 10), main.max_year]
+	data = main.get_data()
+	top_rating = data.filter_indexes.get()["top_ratings"].df.iloc[0]
+	click_data = { "points": [{ "customdata": [int(top_rating["manga_id"])], "text": top_rating["title"] }] }
+
+	benchmarks = []
+	for figure_name, callback in (
+		("bar_top_ratings_for_tags", main.update_bar_top_ratings_for_tags),
+		("scatter_number_of_mangas_per_tag", main.update_scatter_number_of_mangas_per_tag),
+		("line_avg_score_for_tags_over_time", main.update_line_avg_score_for_tags_over_time),
+	):
+		function = get_callback_function(callback)
+		# The bar chart has an additional relayoutData input
+		extra_args = (None,) if figure_name == "bar_top_ratings_for_tags" else ()
+		displayed_figure_key = main.get_figure_key(figure_name, tuple(sorted(tags)), last_decade[0], last_decade[1], data)
+		def show_last_decade(displayed_figure_key=displayed_figure_key):
+			clear_caches()
+			main.get_figure(displayed_figure_key, data)
+		benchmarks.append((f"callbacks.update_{figure_name}", lambda function=function, extra_args=extra_args: function(all_years, tags, *extra_args, None), clear_caches))
+		# The browser shows the last decade and the whole timerange is selected, only the patch is sent
+		benchmarks.append((f"callbacks.update_{figure_name}.patch", lambda function=function, extra_args=extra_args, key=displayed_figure_key: function(all_years, tags, *extra_args, [key[0], list(key[1]), key[2], key[3], key[4]]), show_last_decade))
+		benchmarks.append((f"callbacks.update_{figure_name}.cached", lambda function=function, extra_args=extra_args: function(all_years, tags, *extra_args, None), None))
+		benchmarks.append((f"callbacks.update_{figure_name}.many_tags", lambda function=function, extra_args=extra_args: function(all_years, many_tags, *extra_args, None), clear_caches))
+
+	benchmarks.append(("callbacks.update_bar_similar_mangas", lambda: get_callback_function(main.update_bar_similar_mangas)(click_data), None))
+	# The modal callback needs the callback context of a request to find out what was clicked, only the content is measured
+	benchmarks.append(("callbacks.update_manga_detail_modal", lambda: main.create_manga_detail(data, int(top_rating["manga_id"])), None))
+	# The recommendations of the first top rating are in the store of enrichment.py, the ones of another
+	# manga are requested live from a stub of the Jikan client
+	recommendations = [(f"Recommendation {i}", f"https://myanimelist.net/manga/{i}") for i in range(10)]
+	recommendation_store = RecommendationStore(os.path.join(output_dir, "jikan_recommendations.sqlite"), read_only=False)
+	recommendation_store.put(top_rating["title"], STATUS_FOUND, 1, recommendations)
+	main.recommendation_store = startup.Lazy(lambda: recommendation_store)
+	main.jikan_client = startup.Lazy(lambda: StubJikanClient(recommendations))
+	top_ratings_df = data.filter_indexes.get()["top_ratings"].df
+	live_rating = top_ratings_df[top_ratings_df["title"] != top_rating["title"]].iloc[0]
+	set_progress = lambda progress_values: None
+	benchmarks.append(("callbacks.update_manga_detail_modal_similar_manga_content", lambda: main.create_similar_manga_content(data, int(top_rating["manga_id"]), set_progress), None))
+	benchmarks.append(("callbacks.update_manga_detail_modal_similar_manga_content.live", lambda: main.create_similar_manga_content(data, int(live_rating["manga_id"]), set_progress), None))
+	# A full title, a tag and the prefix of a tag while typing
+	tag_description = main.get_tag_descriptions()[0]["tag_description"]
+	search_queries = itertools.cycle([top_rating["title"], tag_description, tag_description[:3]])
+	benchmarks.append(("callbacks.update_search_results", lambda: get_callback_function(main.update_search_results)(next(search_queries)), None))
+	return benchmarks
+
+def create_similarity_benchmarks(data_dir):
+	mangas = load_json(os.path.join(data_versions.get_data_directory(data_dir), "manga.json"))["mangas"]
+	similarity_index = SimilarityIndex.from_mangas(mangas)
+	# Query a different manga every time
+	rng = np.random.default_rng(0)
+	manga_ids = [mangas[position]["id"] for position in rng.choice(len(mangas), size=min(100, len(mangas)), replace=False)]
+	benchmarks = [("similarity.build_index", lambda: SimilarityIndex.from_mangas(mangas), None)]
+	for metric in METRICS:
+		next_manga_id = itertools.cycle(manga_ids).__next__
+		benchmarks.append((f"similarity.query_{metric}", lambda metric=metric, next_manga_id=next_manga_id: similarity_index.query(next_manga_id(), k=10, metric=metric), None))
+	return benchmarks
+
+def get_git_commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare_results(baseline, results, threshold):
+	# Prints the change of every benchmark which is part of both runs and returns the names of the regressions
+	baseline_results = { result["name"]: result for result in baseline["results"] }
+	regressions = []
+	print(f"{'benchmark':<60} {'baseline':>10} {'current':>10} {'change':>8} {'memory':>8}")
+	for result in results:
+		baseline_result = baseline_results.get(result["name"])
+		if baseline_result is None:
+			continue
+		time_change = result["median_ms"] / baseline_result["median_ms"] - 1 if baseline_result["median_ms"] > 0 else 0
+		memory_change = 0
+		if result["peak_memory_mb"] is not None and baseline_result["peak_memory_mb"] is not None and max(result["peak_memory_mb"], baseline_result["peak_memory_mb"]) >= MIN_COMPARED_MEMORY_MB:
+			memory_change = result["peak_memory_mb"] / max(baseline_result["peak_memory_mb"], 1e-9) - 1
+		is_regression = time_change > threshold or memory_change > threshold
+		if is_regression:
+			regressions.append(result["name"])
+		print(f"{result['name']:<60} {baseline_result['median_ms']:>8.2f}ms {result['median_ms']:>8.2f}ms {time_change:>+8.1%} {memory_change:>+8.1%}{'  REGRESSION' if is_regression else ''}")
+	return regressions
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark the preprocessing, the startup, the callbacks and the similarity queries")
+	parser.add_argument("--mangas", type=int, default=5000, help="number of mangas of the synthetic catalog (default: 5000)")
+	parser.add_argument("--tags", type=int, default=None, help="number of distinct tags of the synthetic catalog (default: grows with the catalog)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--data-dir", default=None, help="directory with a data.csv to use instead of a synthetic catalog, missing preprocessing output is generated there")
+	parser.add_argument("--repetitions", type=int, default=DEFAULT_REPETITIONS, help=f"measured calls per benchmark (default: {DEFAULT_REPETITIONS})")
+	parser.add_argument("--warmups", type=int, default=DEFAULT_WARMUPS, help=f"calls before measuring (default: {DEFAULT_WARMUPS})")
+	parser.add_argument("--filter", nargs="+", default=None, help="only run the benchmarks whose name contains one of these strings")
+	parser.add_argument("--output", default=None, help="write the results to this json file")
+	parser.add_argument("--compare", default=None, help="compare the results with the json file of an earlier run, exits with 1 if there are regressions")
+	parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"relative growth of the median time or memory peak which counts as regression (default: {DEFAULT_THRESHOLD})")
+	return parser.parse_args(argv)
+
+def main(argv=None):
+	args = parse_args(argv)
+	baseline = load_json(args.compare) if args.compare is not None else None
+	with tempfile.TemporaryDirectory() as temp_dir:
+		data_dir = os.path.abspath(args.data_dir or temp_dir)
+		print(f"Preparing data in {data_dir} ...")
+		data_path = prepare_data_dir(data_dir, args.mangas, args.tags, args.seed)
+		output_dir = os.path.join(temp_dir, "output")
+		os.makedirs(output_dir, exist_ok=True)
+
+		benchmark_groups = (
+			lambda: create_preprocessing_benchmarks(data_dir, data_path, output_dir),
+			lambda: create_startup_benchmarks(data_dir),
+			lambda: create_callback_benchmarks(data_dir, output_dir),
+			lambda: create_similarity_benchmarks(data_dir),
+		)
+		is_selected = lambda name: args.filter is None or any(part in name for part in args.filter)
+		results = []
+		working_dir = os.getcwd()
+		try:
+			for create_benchmarks in benchmark_groups:
+				for name, function, setup in create_benchmarks():
+					if not is_selected(name):
+						continue
+					result = { "name": name, **run_benchmark(function, args.repetitions, args.warmups, setup, trace_memory=name not in SUBPROCESS_BENCHMARKS) }
+					results.append(result)
+					peak_memory = "-" if result["peak_memory_mb"] is None else f"{result['peak_memory_mb']:.1f}MB"
+					print(f"{name:<60} median {result['median_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  peak {peak_memory:>9}")
+		finally:
+			os.chdir(working_dir)
+		num_mangas = len(load_json(os.path.join(data_versions.get_data_directory(data_dir), "manga.json"))["mangas"])
+
+	report = {
+		"metadata": {
+			"created": datetime.datetime.now().isoformat(timespec="seconds"),
+			"git_commit": get_git_commit(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"cpu_count": os.cpu_count(),
+			"data_dir": args.data_dir,
+			"synthetic_mangas": None if args.data_dir else args.mangas,
+			"synthetic_tags": None if args.data_dir else args.tags,
+			"seed": args.seed,
+			"mangas": num_mangas,
+			"repetitions": args.repetitions,
+			"warmups": args.warmups
+		},
+		"results": results
+	}
+	if args.output is not None:
+		with open(args.output, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=4)
+		print(f"Results written to {args.output}")
+
+	if baseline is not None:
+		if baseline["metadata"]["mangas"] != num_mangas:
+			print(f"Warning the baseline was measured with {baseline['metadata']['mangas']} instead of {num_mangas} mangas")
+		regressions = compare_results(baseline, results, args.threshold)
+		if len(regressions) > 0:
+			print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+			sys.exit(1)
+		print("No regressions")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,107 @@
+import datetime
+import json
+import os
+import shutil
+import sys
+
+# Every preprocessing run writes its output into a directory of its own below data_versions/.
+# The files are written into a temporary directory first, validated and then renamed to the name of the
+# version. data_versions/CURRENT names the version main.py loads, it is replaced in one step as well.
+# An interrupted run leaves at most a temporary directory behind and main.py never sees half written files.
+# Without data_versions/CURRENT the files are read from the output directory itself (the layout of older runs).
+VERSIONS_DIRECTORY = "data_versions"
+CURRENT_FILE_NAME = "CURRENT"
+TEMPORARY_PREFIX = "."
+DEFAULT_KEEP_VERSIONS = 3
+
+def create_version_name():
+    # Sorted by creation time
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+def get_versions_path(output_dir):
+    return os.path.join(output_dir, VERSIONS_DIRECTORY)
+
+def read_current_version(output_dir):
+    # Returns the name of the current version or None if no version was published yet
+    try:
+        with open(os.path.join(get_versions_path(output_dir), CURRENT_FILE_NAME), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def get_version_path(output_dir, version):
+    if version is None:
+        return output_dir
+    return os.path.join(get_versions_path(output_dir), version)
+
+def get_data_directory(output_dir):
+    return get_version_path(output_dir, read_current_version(output_dir))
+
+def create_temporary_directory(output_dir, version):
+    path = os.path.join(get_versions_path(output_dir), f"{TEMPORARY_PREFIX}{version}.tmp")
+    os.makedirs(path)
+    return path
+
+def publish_version(output_dir, version, temporary_path):
+    # Both renames are atomic, a reader sees either the previous or the new version
+    versions_path = get_versions_path(output_dir)
+    os.rename(temporary_path, os.path.join(versions_path, version))
+    current_path = os.path.join(versions_path, CURRENT_FILE_NAME)
+    with open(f"{current_path}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{current_path}.tmp", current_path)
+
+def remove_old_versions(output_dir, keep_versions=DEFAULT_KEEP_VERSIONS):
+    # Keeps the newest versions, a running application which did not load a new version yet still finds its files.
+    # Temporary directories of interrupted runs are removed as well.
+    versions_path = get_versions_path(output_dir)
+    current_version = read_current_version(output_dir)
+    names = sorted(name for name in os.listdir(versions_path) if os.path.isdir(os.path.join(versions_path, name)))
+    versions = [name for name in names if not name.startswith(TEMPORARY_PREFIX) and name != current_version]
+    removed = [name for name in names if name.startswith(TEMPORARY_PREFIX)] + versions[:max(len(versions) - keep_versions + 1, 0)]
+    for name in removed:
+        shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+    return removed
+
+def write_json_file(path, data):
+    # Without indentation json uses its C encoder, this is several times faster and the file about half the size.
+    # The file is read back and compared, a broken file fails here instead of in the application.
+    encoded = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(encoded)
+    with open(path, "rb") as f:
+        if f.read() != encoded:
+            raise ValueError(f"{path} does not contain the written data")
+
+json_files = {}
+
+def init_json_writer(files):
+    global json_files
+    json_files = files
+
+def write_json_file_by_path(path):
+    write_json_file(path, json_files[path])
+
+def start_writing_json_files(files):
+    # Writes the dict of path -> data in the background, one process per file. The processes are forked
+    # on linux and share the data with the parent process instead of unpickling it. Returns a function
+    # which waits until all files are written and raises the error of a failed one.
+    if not sys.platform.startswith("linux"):
+        for path, data in files.items():
+            write_json_file(path, data)
+        return lambda: None
+    # Imported here, main.py imports this module at startup
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    mp_context = multiprocessing.get_context("fork")
+    executor = ProcessPoolExecutor(max_workers=len(files), mp_context=mp_context, initializer=init_json_writer, initargs=(files,))
+    futures = [executor.submit(write_json_file_by_path, path) for path in files]
+    def wait():
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            executor.shutdown()
+    return wait
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+import requests
+import artifacts
+import data_versions
+import jikan
+from recommendation_store import DEFAULT_STORE_PATH, STATUS_ERROR, STATUS_FOUND, STATUS_NOT_FOUND, RecommendationStore
+
+# Resolves the MyAnimeList id and the recommendations of every manga via the Jikan REST API and stores
+# them in a local store, this way the detail dialog of main.py does not need to wait for Jikan.
+# Already enriched titles are skipped, an interrupted run can simply be started again.
+
+def enrich_title(client, title):
+	# Returns (status, mal_id, recommendations)
+	mal_id = client.get_manga_id(title)
+	if mal_id is None:
+		return (STATUS_NOT_FOUND, None, [])
+	return (STATUS_FOUND, mal_id, client.get_recommendations(mal_id))
+
+def load_titles(data_dir):
+	# Unique titles of all mangas, the binary data is preferred over manga.json
+	binary_data_path = os.path.join(data_dir, artifacts.DEFAULT_DIRECTORY)
+	if artifacts.has_binary_data(binary_data_path):
+		titles = artifacts.load_manga_columns(binary_data_path)["title"].to_list()
+	else:
+		with open(os.path.join(data_dir, "manga.json"), "r", encoding="utf-8") as f:
+			titles = [m["title"] for m in json.load(f)["mangas"]]
+	return list(dict.fromkeys(titles))
+
+def enrich(titles, store, base_url, requests_per_second, limit=None):
+	completed_titles = store.get_completed_titles()
+	pending_titles = [t for t in titles if t not in completed_titles]
+	if limit is not None:
+		pending_titles = pending_titles[:limit]
+	print(f"{len(completed_titles)} of {len(titles)} titles already enriched, fetching {len(pending_titles)} titles")
+
+	# Be more patient than the live requests of main.py, nobody is waiting for the result
+	client = jikan.JikanClient(base_url, max_retries=5, max_backoff=60, rate_limiter=jikan.RateLimiter(requests_per_second))
+	for index, title in enumerate(pending_titles):
+		try:
+			status, mal_id, recommendations = enrich_title(client, title)
+		except (requests.RequestException, ValueError, KeyError) as e:
+			print(f"Failed to enrich '{title}': {e}")
+			status, mal_id, recommendations = (STATUS_ERROR, None, [])
+		store.put(title, status, mal_id, recommendations)
+		if (index + 1) % 100 == 0:
+			print(f"Enriched {index + 1} of {len(pending_titles)} titles")
+	return store.count_by_status()
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Fetch Jikan recommendations for all mangas into a local store")
+	parser.add_argument("--data-dir", default=".", help="output directory of preprocessing.py (default: .)")
+	parser.add_argument("--store", default=DEFAULT_STORE_PATH, help=f"path of the recommendation store (default: {DEFAULT_STORE_PATH})")
+	parser.add_argument("--base-url", default=jikan.JIKAN_BASE_URL, help=f"Jikan base url (default: {jikan.JIKAN_BASE_URL})")
+	parser.add_argument("--requests-per-second", type=float, default=1.0, help="maximum number of requests per second (default: 1)")
+	parser.add_argument("--limit", type=int, default=None, help="only fetch this many titles in this run")
+	return parser.parse_args(argv)
+
+def main(argv=None):
+	args = parse_args(argv)
+	# The current version published by preprocessing.py, see data_versions.py
+	data_dir = data_versions.get_data_directory(args.data_dir)
+	if not os.path.isfile(os.path.join(data_dir, "manga.json")) and not artifacts.has_binary_data(os.path.join(data_dir, artifacts.DEFAULT_DIRECTORY)):
+		print(f"Error could not find preprocessed manga data in {args.data_dir}, run preprocessing.py first!")
+		sys.exit(-1)
+
+	titles = load_titles(data_dir)
+	store = RecommendationStore(args.store, read_only=False)
+	counts = enrich(titles, store, args.base_url, args.requests_per_second, args.limit)
+	print(f"Finished enrichment, {args.store} contains: {counts}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,74 @@
+import json
+import threading
+from collections import OrderedDict
+from metrics import measure_phase
+
+class FigureCache:
+    # Least recently used cache for the serialized json of figures.
+    # The size is limited by the number of bytes of the stored json, the least recently used
+    # figures are evicted first. All operations are guarded by a lock so the cache can be shared
+    # between the threads of a gunicorn worker.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, figure_json):
+        size_bytes = len(figure_json.encode("utf-8"))
+        # Figures which are larger than the whole cache are not stored at all
+        if size_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (figure_json, size_bytes)
+            self.size_bytes += size_bytes
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted_size_bytes) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size_bytes
+
+    def get_or_create(self, key, create_figure):
+        # Returns the figure as dict, create_figure is only called on a cache miss.
+        # Two threads missing the same key at the same time both create the figure, the last one is kept.
+        figure_json = self.get(key)
+        if figure_json is None:
+            figure = create_figure()
+            with measure_phase("serialize"):
+                figure_json = figure.to_json()
+            self.put(key, figure_json)
+        with measure_phase("serialize"):
+            return json.loads(figure_json)
+
+    def remove_where(self, predicate):
+        # Removes the figures whose key matches predicate
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.size_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,53 @@
+from dash import Patch
+
+# Updates the figure the browser already shows to a new figure by sending only the parts which changed.
+# Changing the year range only changes the data arrays of the traces and adding or removing a tag
+# inserts or deletes a single trace. The template, which is the largest part of a figure, is never resent.
+
+def patch_dict(patch, old_dict, new_dict):
+    for key, value in new_dict.items():
+        old_value = old_dict.get(key)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            patch_dict(patch[key], old_value, value)
+        elif key not in old_dict or old_value != value:
+            patch[key] = value
+    for key in old_dict.keys() - new_dict.keys():
+        del patch[key]
+
+def get_trace_names(traces):
+    return [trace.get("name") for trace in traces]
+
+def find_added_trace(names, names_with_added_trace):
+    # Index of the single name in names_with_added_trace which is not part of names or None
+    if len(names_with_added_trace) != len(names) + 1:
+        return None
+    for index in range(len(names_with_added_trace)):
+        if names_with_added_trace[:index] + names_with_added_trace[index + 1:] == names:
+            return index
+    return None
+
+def create_figure_patch(old_figure, new_figure):
+    # Returns a Patch which turns old_figure into new_figure, both are figures as dict
+    patch = Patch()
+    patch_dict(patch["layout"], old_figure["layout"], new_figure["layout"])
+
+    old_traces = old_figure["data"]
+    new_traces = new_figure["data"]
+    added_index = find_added_trace(get_trace_names(old_traces), get_trace_names(new_traces))
+    removed_index = find_added_trace(get_trace_names(new_traces), get_trace_names(old_traces))
+    if added_index is not None:
+        patch["data"].insert(added_index, new_traces[added_index])
+        old_traces = old_traces[:added_index] + [new_traces[added_index]] + old_traces[added_index:]
+    elif removed_index is not None:
+        del patch["data"][removed_index]
+        old_traces = old_traces[:removed_index] + old_traces[removed_index + 1:]
+
+    # The traces changed in another way (e.g. several tags at once or a different order), replace all of them
+    if get_trace_names(old_traces) != get_trace_names(new_traces):
+        patch["data"] = new_traces
+        return patch
+
+    # The colors of the following traces change if a trace is added or removed in the middle
+    for index, (old_trace, new_trace) in enumerate(zip(old_traces, new_traces)):
+        patch_dict(patch["data"][index], old_trace, new_trace)
+    return patch
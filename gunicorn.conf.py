@@ -0,0 +1,22 @@
+import gc
+import os
+
+# Load main.py and with it all the data once in the master process. The workers are forked afterwards
+# and share the memory pages of the master as long as they do not write to them.
+# Set GUNICORN_PRELOAD=0 to let every worker load the app on its own.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+def when_ready(server):
+    # Move all objects created while loading the app into the permanent generation.
+    # Otherwise the first garbage collection in every worker writes to the header of each
+    # object and all the pages containing them get copied.
+    if preload_app:
+        gc.freeze()
+
+def post_worker_init(worker):
+    # With FAST_STARTUP=1 every worker loads the data in the background once it is ready to serve, see main.start_warm_up.
+    # Every worker checks for new data versions and loads them on its own, see main.start_data_reload.
+    import main
+    main.start_warm_up()
+    main.start_data_reload()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+# The manifest stores a content hash per manga id of the last preprocessing run.
+# Together with the previous manga.json and data_preprocessed.json it allows to only recompute what changed.
+MANIFEST_FILE_NAME = "preprocessing_manifest.json"
+
+def hash_manga(manga):
+	content = [manga["title"], manga["description"], manga["rating"], manga["year"], manga["cover"], manga["tags"]]
+	return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def create_manifest(mangas):
+	return {
+		"rows": { str(manga["id"]): hash_manga(manga) for manga in mangas }
+	}
+
+def save_manifest(manifest_path, manifest):
+	with open(manifest_path, "w", encoding="utf-8") as f:
+		json.dump(manifest, f)
+
+def load_previous_run(output_dir):
+	# Returns (manifest, preprocessed_data, manga_data) of the last run or None if any of the files is missing
+	paths = [os.path.join(output_dir, file_name) for file_name in (MANIFEST_FILE_NAME, "data_preprocessed.json", "manga.json")]
+	if not all(os.path.isfile(path) for path in paths):
+		return None
+	previous_run = []
+	for path in paths:
+		with open(path, "r", encoding="utf-8") as f:
+			previous_run.append(json.load(f))
+	return tuple(previous_run)
+
+def find_changed_mangas(previous_manifest, manifest):
+	# Returns the ids of the added, removed and changed mangas
+	previous_rows = previous_manifest["rows"]
+	rows = manifest["rows"]
+	added = [int(id) for id in rows if id not in previous_rows]
+	removed = [int(id) for id in previous_rows if id not in rows]
+	changed = [int(id) for id, row_hash in rows.items() if id in previous_rows and previous_rows[id] != row_hash]
+	return added, removed, changed
+
+def find_affected_cells(changed_ids, previous_mangas_by_id, mangas_by_id):
+	# (tag, year) cells which contain the old or the new version of a changed manga
+	affected_cells = set()
+	for id in changed_ids:
+		for manga in (previous_mangas_by_id.get(id), mangas_by_id.get(id)):
+			if manga is not None:
+				affected_cells.update((tag, manga["year"]) for tag in manga["tags"])
+	return affected_cells
+
+def build_inverted_tag_index(mangas):
+	# tag -> positions of all mangas which have the tag
+	inverted_tag_index = {}
+	for position, manga in enumerate(mangas):
+		for tag in set(manga["tags"]):
+			inverted_tag_index.setdefault(tag, []).append(position)
+	return inverted_tag_index
+
+def find_affected_rows(changed_ids, previous_mangas_by_id, mangas):
+	# Positions of the mangas whose similar mangas could have changed:
+	# - the added and changed mangas itself
+	# - every manga which shares a tag with the old or new version of a changed manga, its score changed
+	# - every manga which has similar mangas with a score of 0. Those are filled up with the first mangas
+	#   of the catalog, any added or removed manga can shift them.
+	# Every other manga only has similar mangas with a positive score which did not change, their order is stable.
+	if len(changed_ids) == 0:
+		return []
+
+	positions_by_id = { manga["id"]: position for position, manga in enumerate(mangas) }
+	inverted_tag_index = build_inverted_tag_index(mangas)
+	affected_rows = set()
+	for id in changed_ids:
+		if id in positions_by_id:
+			affected_rows.add(positions_by_id[id])
+		for manga in (previous_mangas_by_id.get(id), mangas[positions_by_id[id]] if id in positions_by_id else None):
+			if manga is not None:
+				for tag in set(manga["tags"]):
+					affected_rows.update(inverted_tag_index.get(tag, []))
+
+	for position, manga in enumerate(mangas):
+		previous_manga = previous_mangas_by_id.get(manga["id"])
+		if previous_manga is None or any(m["similarity_score"] == 0 for m in previous_manga["similar_mangas"]):
+			affected_rows.add(position)
+	return sorted(affected_rows)
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+
+# Jikan client shared by the live requests of main.py and the offline enrichment (enrichment.py)
+# See here for more information: https://docs.api.jikan.moe/
+JIKAN_BASE_URL = os.environ.get("JIKAN_BASE_URL", "https://api.jikan.moe/v4")
+NUMBER_OF_RECOMMENDATIONS = 3
+
+def get_search_url(base_url=JIKAN_BASE_URL):
+    return f"{base_url}/manga"
+
+def get_search_params(manga_title):
+    return {"q": manga_title, "limit": 1}
+
+def get_recommendations_url(mal_id, base_url=JIKAN_BASE_URL):
+    return f"{base_url}/manga/{mal_id}/recommendations"
+
+def parse_manga_id(data):
+    # Returns the MyAnimeList id of the first search result or None
+    if data["data"]:
+        return data["data"][0]["mal_id"]
+    return None
+
+def parse_recommendations(data):
+    # Returns a list of (title, url) tuples
+    recommendations = [e["entry"] for e in data["data"]]
+    return [(r["title"], r["url"]) for r in recommendations]
+
+class RateLimiter:
+    # Spaces the requests evenly, Jikan allows 3 requests per second and 60 per minute
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second
+        self.next_request_time = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self.next_request_time - now
+            self.next_request_time = max(now, self.next_request_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+class TTLCache:
+    # Least recently used cache whose entries expire after a time to live
+    def __init__(self, max_entries, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (True, value) for a valid entry and (False, None) otherwise
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return (False, None)
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                return (False, None)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return (True, value)
+
+    def put(self, key, value, ttl):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self.clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class JikanClient:
+    # Client shared by all threads of a process:
+    # - one requests.Session per process keeps the connections to Jikan alive
+    # - every request has a connect and read timeout
+    # - title -> mal_id and mal_id -> recommendations are cached, including "not found" results
+    #   which expire earlier
+    # - concurrent lookups of the same key wait for the request which is already in flight
+    # - rate limited (429) and server errors are retried with an exponential backoff
+    # Failed requests raise a requests.RequestException and are not cached.
+    # request_observer is called with (endpoint, status, seconds) after every http request, status is "error"
+    # if the request failed without a response.
+    def __init__(self, base_url=JIKAN_BASE_URL, timeout=(3.05, 10), max_retries=2, max_backoff=4,
+                 cache_size=4096, ttl=24 * 60 * 60, negative_ttl=60 * 60, pool_size=10, rate_limiter=None,
+                 request_observer=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.request_observer = request_observer
+        self.manga_id_cache = TTLCache(cache_size)
+        self.recommendations_cache = TTLCache(cache_size)
+        self.number_of_requests = 0
+        self._session = None
+        self._session_pid = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        # Connections must not be shared with forked processes (gunicorn workers), create a session per process
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _get(self, session, endpoint, url, params):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = session.get(url, params=params, timeout=self.timeout)
+            status = str(response.status_code)
+            return response
+        finally:
+            if self.request_observer is not None:
+                self.request_observer(endpoint, status, time.perf_counter() - start)
+
+    def _request_json(self, endpoint, url, params=None):
+        # Returns the json of the response or None if the resource does not exist
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            self.number_of_requests += 1
+            response = self._get(session, endpoint, url, params)
+            if response.status_code == 404:
+                return None
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    break
+                retry_after = response.headers.get("Retry-After")
+                backoff = float(retry_after) if retry_after is not None and retry_after.isdigit() else 2 ** attempt
+                time.sleep(min(backoff, self.max_backoff))
+                continue
+            response.raise_for_status()
+            return response.json()
+        raise requests.HTTPError(f"Giving up on {url} after {self.max_retries} retries (status {response.status_code})", response=response)
+
+    def _get_cached(self, cache, key, fetch, is_negative):
+        with self._lock:
+            found, value = cache.get(key)
+            if found:
+                return value
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        # Somebody else is already requesting the same key, wait for the result
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = fetch()
+            cache.put(key, value, self.negative_ttl if is_negative(value) else self.ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def get_manga_id(self, manga_title):
+        # Returns the MyAnimeList id of the title or None if Jikan does not know it
+        def fetch():
+            data = self._request_json("search", get_search_url(self.base_url), params=get_search_params(manga_title))
+            return parse_manga_id(data) if data is not None else None
+        return self._get_cached(self.manga_id_cache, ("manga_id", manga_title), fetch, lambda id: id is None)
+
+    def get_recommendations(self, mal_id):
+        # Returns a list of (title, url) tuples
+        def fetch():
+            data = self._request_json("recommendations", get_recommendations_url(mal_id, self.base_url))
+            return parse_recommendations(data) if data is not None else []
+        return self._get_cached(self.recommendations_cache, ("recommendations", mal_id), fetch, lambda r: len(r) == 0)
@@ -0,0 +1,132 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for the Jikan REST API with canned responses, for running enrichment.py and the live
+# recommendations of main.py without calling Jikan. It answers the two requests of jikan.JikanClient:
+# - /v4/manga?q=<title> with the MyAnimeList id of the title (or no result)
+# - /v4/manga/<id>/recommendations with the recommendations of that id
+# Every request is recorded. Errors such as rate limiting (429 with Retry-After) can be queued for the next requests.
+#
+# python3 jikan_stand_in.py --port 8000
+# python3 enrichment.py --base-url http://127.0.0.1:8000/v4
+
+class JikanStandIn:
+    # mangas maps a title to (mal_id, [(title, url), ...])
+    def __init__(self, mangas, host="127.0.0.1", port=0, delay=0):
+        self.mangas = mangas
+        self.recommendations = { mal_id: recommendations for mal_id, recommendations in mangas.values() }
+        self.delay = delay
+        # Titles whose search always fails with a server error, with Retry-After 0 so the retries do not wait
+        self.error_titles = set()
+        # (path, query) of every request
+        self.requests = []
+        self._queued_errors = []
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v4"
+
+    def queue_error(self, status, retry_after=None, times=1):
+        # The next requests are answered with this status
+        with self._lock:
+            self._queued_errors.extend([(status, retry_after)] * times)
+
+    def get_request_paths(self):
+        with self._lock:
+            return [path for path, _ in self.requests]
+
+    def get_searched_titles(self):
+        with self._lock:
+            return [query["q"][0] for path, query in self.requests if path == "/v4/manga"]
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        with self._lock:
+            self.requests.append((url.path, query))
+            queued_error = self._queued_errors.pop(0) if self._queued_errors else None
+        if self.delay > 0:
+            time.sleep(self.delay)
+        if queued_error is not None:
+            status, retry_after = queued_error
+            headers = { "Retry-After": str(retry_after) } if retry_after is not None else {}
+            return self.send_json(handler, status, { "status": status }, headers)
+
+        parts = url.path.strip("/").split("/")
+        if parts == ["v4", "manga"]:
+            title = query.get("q", [""])[0]
+            if title in self.error_titles:
+                return self.send_json(handler, 500, { "status": 500 }, { "Retry-After": "0" })
+            manga = self.mangas.get(title)
+            return self.send_json(handler, 200, { "data": [{ "mal_id": manga[0], "title": title }] if manga is not None else [] })
+        if len(parts) == 4 and parts[:2] == ["v4", "manga"] and parts[3] == "recommendations" and parts[2].isdigit():
+            recommendations = self.recommendations.get(int(parts[2]))
+            if recommendations is None:
+                return self.send_json(handler, 404, { "status": 404 })
+            return self.send_json(handler, 200, { "data": [{ "entry": { "title": title, "url": url } } for title, url in recommendations] })
+        self.send_json(handler, 404, { "status": 404 })
+
+    def send_json(self, handler, status, data, headers={}):
+        body = json.dumps(data).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="jikan-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+def create_mangas(titles, number_of_recommendations=3):
+    # Canned data for the titles: the ids are the positions starting at 1, a title recommends the titles after it
+    return {
+        title: (mal_id, [(titles[(mal_id + i) % len(titles)], f"https://myanimelist.net/manga/{(mal_id + i) % len(titles) + 1}") for i in range(number_of_recommendations)])
+        for mal_id, title in enumerate(titles, start=1)
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve canned Jikan responses for the mangas of the preprocessed data")
+    parser.add_argument("--data-dir", default=".", help="output directory of preprocessing.py (default: .)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--delay", type=float, default=0, help="seconds to wait before every response (default: 0)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    import data_versions
+    from enrichment import load_titles
+    args = parse_args(argv)
+    stand_in = JikanStandIn(create_mangas(load_titles(data_versions.get_data_directory(args.data_dir))), port=args.port, delay=args.delay)
+    print(f"Serving {len(stand_in.mangas)} mangas on {stand_in.base_url}")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
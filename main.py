@@ -1,21 +1,82 @@
-from dash import Dash, dcc, html, Input, Output, callback, no_update, State
-import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
-import pandas as pd
-import json
-import requests
-
-def load_preprocessed_data():
-    with open("./data_preprocessed.json") as f:
+import time
+import startup
+startup_timer = startup.PhaseTimer()
+
+# Only the modules needed to serve the page and the first figures are imported at startup.
+# pandas, plotly.express, requests and the modules using them are imported where they are used, see warm_up.
+with startup_timer.measure("imports"):
+    from dash import Dash, dcc, html, Input, Output, callback, clientside_callback, ClientsideFunction, no_update, State, ALL, ctx
+    import dash_bootstrap_components as dbc
+    import plotly.io as pio
+    import importlib
+    import json
+    import os
+    import sys
+    import threading
+    from functools import lru_cache, wraps
+    import data_versions
+    import figure_patch
+    import metrics
+    import rollups
+    from figure_cache import FigureCache
+    from profiling import RequestProfiler
+
+# Same as artifacts.DEFAULT_DIRECTORY and artifacts.META_FILE_NAME, artifacts is only imported when the data is loaded
+binary_data_directory = "data_columnar"
+binary_data_meta_file_name = "meta.json"
+preprocessed_data_file_name = "data_preprocessed.json"
+manga_data_file_name = "manga.json"
+# Same as artifacts.SEARCH_INDEX_DIRECTORY
+search_index_directory = "search_index"
+# preprocessing.py publishes new data below ./data_versions, see data_versions.py
+output_path = "."
+deferred_modules = ["pandas", "plotly.express", "plotly.graph_objects", "requests"]
+
+def get_binary_data_path(directory):
+    return os.path.join(directory, binary_data_directory)
+
+def has_binary_data(directory):
+    return os.path.isfile(os.path.join(get_binary_data_path(directory), binary_data_meta_file_name))
+
+def load_preprocessed_data(directory):
+    # Prefer the memory mapped binary data and fall back to json if it was not generated
+    import artifacts
+    if has_binary_data(directory):
+        return artifacts.load_preprocessed_data(get_binary_data_path(directory))
+    with open(os.path.join(directory, preprocessed_data_file_name)) as f:
         preprocessed_data = json.load(f)
+    # Keep the rows as columns like the binary data instead of a dict per row
+    preprocessed_data["tags"] = artifacts.rows_to_columns(preprocessed_data["tags"])
+    preprocessed_data["top_ratings"] = artifacts.rows_to_columns(preprocessed_data["top_ratings"])
+    for rollup in preprocessed_data.get("tag_rollups", []):
+        rollup["tags"] = artifacts.rows_to_columns(rollup["tags"])
     return preprocessed_data
 
-def load_manga_data():
-    with open("./manga.json") as f:
-        manga_data = json.load(f)
-    return manga_data 
+def load_manga_store(directory):
+    import artifacts
+    from manga_store import MangaStore
+    if has_binary_data(directory):
+        return MangaStore.from_columns(artifacts.load_manga_columns(get_binary_data_path(directory)))
+    with open(os.path.join(directory, manga_data_file_name)) as f:
+        return MangaStore.from_json(f)
+
+def load_search_index(directory):
+    import artifacts
+    from search_index import SearchIndex
+    search_index_path = os.path.join(directory, search_index_directory)
+    if not artifacts.has_search_index(search_index_path):
+        print(f"No search index found in {search_index_path}, run preprocessing.py to build it")
+        return None
+    return SearchIndex.from_columns(artifacts.load_search_index_columns(search_index_path))
+
+def get_data_signature(directory):
+    # Files the tag dropdown options and the figures of the filter charts are created from
+    if has_binary_data(directory):
+        binary_data_path = get_binary_data_path(directory)
+        paths = [os.path.join(binary_data_path, name) for name in os.listdir(binary_data_path) if name == binary_data_meta_file_name or name.startswith(("tags.", "top_ratings.", "tag_rollups."))]
+    else:
+        paths = [os.path.join(directory, preprocessed_data_file_name)]
+    return startup.get_data_signature(paths)
 
 plotly_theme = "plotly_white"
 
@@ -30,29 +91,207 @@ modal_manga_detail_title_id = "modal-manga-detail-title-id"
 modal_manga_detail_body_id = "modal-manga-detail-body-id"
 modal_manga_detail_loading_spinner_id = "modal-manga-detail-loading-spinner-id"
 modal_manga_detail_loading_spinner_content_id = "modal-manga-detail-loading-spinner-content-id"
+modal_manga_detail_progress_id = "modal-manga-detail-progress-id"
+
+search_input_id = "search-input-id"
+search_results_id = "search-results-id"
+# Type of the pattern matching ids of the search results, the index is the manga id
+search_result_type = "search-result"
+number_of_search_results = 8
 
 timerange_slider_id = "time-ranger-slider-id"
 tags_dropdown_id = "tags-dropdown-id"
+filter_data_store_id = "filter-data-store-id"
+# Keys of the figures the browser currently shows, see get_figure_update
+scatter_number_of_mangas_per_tag_figure_key_id = "scatter-number-of-mangas-per-tag-figure-key-id"
+line_avg_score_for_tags_over_time_figure_key_id = "line-avg-score-for-tags-over-time-figure-key-id"
+bar_top_ratings_for_tags_figure_key_id = "bar-top-ratings-for-tags-figure-key-id"
+
+# Filter the tag/year data in the browser (see assets/clientside_filters.js) instead of rendering the figures on the server
+clientside_filters = os.environ.get("CLIENTSIDE_FILTERS", "0") == "1"
+
+# Upper bound of the points of the scatter and line chart, more tags and years are shown per 5 years or per decade
+max_figure_points = int(os.environ.get("MAX_FIGURE_POINTS", rollups.DEFAULT_MAX_POINTS))
+
+# Start with the prebuilt startup artifact and load the data on first use or in the background, see startup.py
+fast_startup = os.environ.get("FAST_STARTUP", "0") == "1"
+
+# Run the slow callbacks in a process of their own instead of the request thread, see background_callback.
+# Off by default: a job process can not use the caches of the Jikan client of the worker (see get_live_recommendations).
+background_callbacks = os.environ.get("BACKGROUND_CALLBACKS", "0") == "1"
+background_callback_cache_path = os.environ.get("BACKGROUND_CALLBACK_CACHE_DIR", "./background_callback_cache")
+# Live Jikan recommendations are kept for the same time as in the cache of jikan.JikanClient,
+# titles without recommendations for a shorter time like its "not found" results
+live_recommendations_ttl = 24 * 60 * 60
+live_recommendations_negative_ttl = 60 * 60
+
+def create_background_callback_cache():
+    # The jobs, their progress and their results are exchanged through a disk cache shared by all gunicorn workers
+    if not background_callbacks:
+        return None
+    import diskcache
+    return diskcache.Cache(background_callback_cache_path)
+
+def create_background_callback_manager(cache):
+    if cache is None:
+        return None
+    from background_callbacks import JobDiskcacheManager
+    return JobDiskcacheManager(cache)
+
+with startup_timer.measure("background_callbacks"):
+    background_callback_cache = create_background_callback_cache()
+    background_callback_manager = create_background_callback_manager(background_callback_cache)
+
+def create_recommendation_store():
+    from recommendation_store import RecommendationStore
+    # Recommendations precalculated by enrichment.py
+    return RecommendationStore(os.environ.get("RECOMMENDATION_STORE_PATH", "./jikan_recommendations.sqlite"))
+
+def create_tag_year_index(columns):
+    import pandas as pd
+    from tag_year_index import TagYearIndex
+    # copy=False keeps memory mapped columns of the binary data as they are.
+    # Tag ids are stored as categories, this way the column is a numeric array instead of an object column
+    # with a reference to a string per row. When the data is loaded once in the gunicorn master (see gunicorn.conf.py)
+    # the forked workers do not touch the reference counts of those strings and the pages stay shared.
+    df = pd.DataFrame(columns, copy=False)
+    df["tag_id"] = df["tag_id"].astype("category")
+    return TagYearIndex(df)
+
+def create_filter_indexes(preprocessed):
+    return {
+        "tags": create_tag_year_index(preprocessed["tags"]),
+        "top_ratings": create_tag_year_index(preprocessed["top_ratings"]),
+        # Keyed by the years per bucket, data_preprocessed.json of older runs has no rollups
+        "tag_rollups": { r["years_per_bucket"]: create_tag_year_index(r["tags"]) for r in preprocessed.get("tag_rollups", []) },
+    }
 
-preprocessed_data = load_preprocessed_data()
-manga_data = load_manga_data()
-tag_descriptions = preprocessed_data["tag_descriptions"]
-
-tags_df = pd.DataFrame(preprocessed_data["tags"])
-top_ratings_df = pd.DataFrame(preprocessed_data["top_ratings"])
-manga_df = pd.DataFrame(manga_data["mangas"])
-
-years = preprocessed_data["years"]
-# Years are already sorted in descending order
-max_year = years[0]
-min_year = years[-1]
-tag_dropdown_options = [{ "label": f"{t['tag_description']} ({t['num_mangas_total']})", "value": t["tag_id"] } for t in tag_descriptions]
+def create_jikan_client():
+    import jikan
+    # Shared by all threads of a worker, see jikan.JikanClient
+    return jikan.JikanClient(request_observer=metrics.observe_upstream_request("jikan"))
+
+class DataVersion:
+    # The data of one version published by preprocessing.py, every part is loaded on first use.
+    # A new version is loaded into a new object next to the current one and replaces it as a whole (see reload_data).
+    # A callback gets the current version once with get_data, this way it never mixes the data of two versions.
+    def __init__(self, version, directory):
+        self.version = version
+        self.directory = directory
+        self.preprocessed_data = startup.Lazy(lambda: load_preprocessed_data(directory))
+        self.manga_store = startup.Lazy(lambda: load_manga_store(directory))
+        self.search_index = startup.Lazy(lambda: load_search_index(directory))
+        self.filter_indexes = startup.Lazy(lambda: create_filter_indexes(self.preprocessed_data.get()))
+
+    def get_tag_descriptions(self):
+        return self.preprocessed_data.get()["tag_descriptions"]
+
+    def get_years(self):
+        return self.preprocessed_data.get()["years"]
+
+def open_current_data():
+    # The version named by data_versions/CURRENT or the files in the output directory if there is none
+    version = data_versions.read_current_version(output_path)
+    return DataVersion(version, data_versions.get_version_path(output_path, version))
+
+current_data = open_current_data()
+recommendation_store = startup.Lazy(create_recommendation_store)
+jikan_client = startup.Lazy(create_jikan_client)
+
+def get_data():
+    return current_data
+
+def get_tag_descriptions():
+    return get_data().get_tag_descriptions()
+
+def get_years():
+    return get_data().get_years()
+
+def load_startup_data(data):
+    # Tag dropdown options, year range and the figures of the initial page
+    if fast_startup:
+        startup_data = startup.load_artifact(startup.ARTIFACT_PATH, get_data_signature(data.directory))
+        if startup_data is not None:
+            return startup_data
+        print(f"{startup.ARTIFACT_PATH} is missing or outdated, loading the data instead. Run python3 startup.py to build it.")
+    return startup.create_startup_data(data.get_tag_descriptions(), data.get_years())
+
+with startup_timer.measure("startup_data"):
+    startup_data = load_startup_data(current_data)
+tag_dropdown_options = startup_data["tag_dropdown_options"]
+min_year = startup_data["min_year"]
+max_year = startup_data["max_year"]
+
+def prepare_filter_data(data):
+    # Data shipped once to the browser for the clientside filter callbacks.
+    # Columns are sent as lists and the tag ids as codes into tag_ids to keep the payload small.
+    import pandas as pd
+    # The categories of pd.Categorical must be unique, the tag descriptions can list a tag id more than once
+    tag_ids = pd.unique(pd.Series([t["tag_id"] for t in data.get_tag_descriptions()])).tolist()
+    tags_df = data.filter_indexes.get()["tags"].df
+    top_ratings_df = data.filter_indexes.get()["top_ratings"].df
+    rated_tags_df = tags_df.dropna(subset=["average_rating"])
+
+    def get_tag_codes(df):
+        return pd.Categorical(df["tag_id"], categories=tag_ids).codes.tolist()
+
+    return {
+        "tag_ids": tag_ids,
+        "tags": {
+            "tag_code": get_tag_codes(rated_tags_df),
+            "year": rated_tags_df["year"].tolist(),
+            "number_of_mangas": rated_tags_df["number_of_mangas"].tolist(),
+            "average_rating": rated_tags_df["average_rating"].tolist(),
+        },
+        "top_ratings": {
+            "tag_code": get_tag_codes(top_ratings_df),
+            "year": top_ratings_df["year"].tolist(),
+            "rating": top_ratings_df["rating"].tolist(),
+            "manga_id": top_ratings_df["manga_id"].tolist(),
+            "title": top_ratings_df["title"].tolist(),
+        },
+        "template": pio.templates[plotly_theme].to_plotly_json(),
+    }
 
-def get_manga_from_click_data(click_data):
+def filter_callback(*args):
+    # The filter callbacks only run on the server if they are not handled in the browser
+    if clientside_filters:
+        return lambda function: function
+    return callback(*args)
+
+def background_callback(*args, progress=None, cancel=None, running=None):
+    # The callback runs in a job process of background_callback_manager. The request only starts the job,
+    # the browser then polls for the progress and the result, this way a slow callback does not keep a
+    # request thread of the worker busy. A new call of the same callback or a change of a cancel input
+    # terminates the running job. The callback gets a set_progress function as first argument.
+    # Unless BACKGROUND_CALLBACKS=1 it runs in the request and set_progress does nothing.
+    if background_callback_manager is None:
+        def register(function):
+            @wraps(function)
+            def run_in_request(*callback_args):
+                return function(lambda progress_values: None, *callback_args)
+            return callback(*args)(run_in_request)
+        return register
+    return callback(*args, background=True, interval=500, progress=progress, cancel=cancel, running=running)
+
+def get_manga_id_from_click_data(click_data):
     first_point = click_data["points"][0]
     manga_id = first_point["customdata"][0]
-    manga = manga_df[manga_df["id"] == manga_id]
-    return manga
+    return manga_id
+
+def get_selected_manga_id(click_data, data):
+    # The detail dialog opens for a click on a similar manga or on a search result.
+    # Search results which were only (re)rendered trigger the callbacks as well, they have no clicks yet.
+    # A page loaded before a new data version can show mangas which no longer exist, they are ignored.
+    triggered_id = ctx.triggered_id
+    manga_id = None
+    if triggered_id == bar_similar_mangas_id and click_data != None:
+        manga_id = get_manga_id_from_click_data(click_data)
+    elif isinstance(triggered_id, dict) and triggered_id["type"] == search_result_type and ctx.triggered[0]["value"]:
+        manga_id = triggered_id["index"]
+    if manga_id is None or manga_id not in data.manga_store.get():
+        return None
+    return manga_id
 
 def get_dropdown_value_as_list(dropdown_value):
     # The inital value if one element is selected can be a string such as 'action' instead of a list
@@ -61,13 +300,95 @@ def get_dropdown_value_as_list(dropdown_value):
     else:
         return [dropdown_value]
 
-@callback(
+def get_filter_tags(dropdown_value):
+    # The order of the tags does not change the filtered rows, sort them to get the same cache key
+    return tuple(sorted(set(get_dropdown_value_as_list(dropdown_value)), key=str))
+
+# The filtered frames are shared between the callbacks and must not be modified, copy them first.
+# The caches are cleared when a new data version is loaded.
+@lru_cache(maxsize=256)
+def filter_top_ratings(data, tags, min_year, max_year):
+    return data.filter_indexes.get()["top_ratings"].query(tags, min_year, max_year)
+
+# Figures of the filter callbacks keyed by (figure name, sorted tags, min year, max year, data version)
+figure_cache = FigureCache(max_bytes=int(os.environ.get("FIGURE_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+
+@lru_cache(maxsize=256)
+def filter_tags_with_ratings(data, tags, min_year, max_year, years_per_bucket=1):
+    # Rows where the average rating is NAN are removed.
+    # With buckets of several years all buckets overlapping the year range are returned, the year is the start of the bucket.
+    # The buckets at the edges which are only partly inside the year range are summed up again out of the
+    # statistics per year, this way they do not count the years outside of the range.
+    if years_per_bucket == 1:
+        return data.filter_indexes.get()["tags"].query(tags, min_year, max_year).dropna(subset=['average_rating'])
+    index = data.filter_indexes.get()["tag_rollups"][years_per_bucket]
+    df = index.query(tags, rollups.get_bucket_start(min_year, years_per_bucket), max_year)
+    years = data.get_years()
+    partial_bucket_starts = rollups.get_partial_bucket_starts(min_year, max_year, years_per_bucket, min(years), max(years))
+    if len(partial_bucket_starts) == 0:
+        return df.dropna(subset=['average_rating'])
+    # Same as rollups.calculate_rollup, the average rating is weighted by the number of mangas
+    edge_buckets = {}
+    for bucket_start in partial_bucket_starts:
+        yearly_df = data.filter_indexes.get()["tags"].query(tags, max(bucket_start, min_year), min(bucket_start + years_per_bucket - 1, max_year))
+        for tag_id, number_of_mangas, average_rating in zip(yearly_df["tag_id"], yearly_df["number_of_mangas"], yearly_df["average_rating"]):
+            if number_of_mangas > 0:
+                bucket_number_of_mangas, rating_sum = edge_buckets.get((tag_id, bucket_start), (0, 0.0))
+                edge_buckets[(tag_id, bucket_start)] = (bucket_number_of_mangas + number_of_mangas, rating_sum + average_rating * number_of_mangas)
+    is_partial = df["year"].isin(partial_bucket_starts)
+    partial_buckets = [edge_buckets.get(key, (0, 0.0)) for key in zip(df["tag_id"][is_partial], df["year"][is_partial])]
+    df = df.copy()
+    df.loc[is_partial, "number_of_mangas"] = [number_of_mangas for number_of_mangas, _ in partial_buckets]
+    df.loc[is_partial, "average_rating"] = [rating_sum / number_of_mangas if number_of_mangas > 0 else float("nan") for number_of_mangas, rating_sum in partial_buckets]
+    return df.dropna(subset=['average_rating'])
+
+def get_years_per_bucket(data, tags_to_filter, min_year, max_year):
+    # The finest resolution which keeps the chart below max_figure_points points
+    available_years_per_bucket = [1, *data.filter_indexes.get()["tag_rollups"]]
+    return rollups.choose_years_per_bucket(len(tags_to_filter), min_year, max_year, available_years_per_bucket, max_figure_points)
+
+def get_year_label(years_per_bucket):
+    if years_per_bucket == 1:
+        return "Year"
+    return f"Year ({years_per_bucket} years per point)"
+
+def get_figure_key(figure_name, tags_to_filter, min_year, max_year, data):
+    return (figure_name, tags_to_filter, min_year, max_year, data.version)
+
+def get_figure(figure_key, data):
+    # The data version of the key must be the one of data
+    figure_name, tags_to_filter, min_year, max_year, _ = figure_key
+    return figure_cache.get_or_create(figure_key, lambda: figure_creators[figure_name](data, tags_to_filter, min_year, max_year))
+
+def get_figure_update(figure_key, displayed_figure_key, data):
+    # Returns the figure and its key which is stored in the browser.
+    # If the browser already shows a figure of the same chart only the difference is sent as Patch,
+    # the displayed figure is recreated out of its key (usually it is still cached).
+    # A figure of another data version (or with a key without version of an older page) is replaced in full.
+    figure = get_figure(figure_key, data)
+    if displayed_figure_key is None or displayed_figure_key[0] != figure_key[0] or len(displayed_figure_key) != len(figure_key) or displayed_figure_key[4] != figure_key[4]:
+        return (figure, figure_key)
+
+    figure_name, tags_to_filter, min_year, max_year, data_version = displayed_figure_key
+    displayed_figure_key = (figure_name, tuple(tags_to_filter), min_year, max_year, data_version)
+    if displayed_figure_key == figure_key:
+        return (no_update, no_update)
+    displayed_figure = get_figure(displayed_figure_key, data)
+    if displayed_figure == figure:
+        return (no_update, figure_key)
+    with metrics.measure_phase("patch"):
+        return (figure_patch.create_figure_patch(displayed_figure, figure), figure_key)
+
+@filter_callback(
     Output(component_id=bar_top_ratings_for_tags_id, component_property='figure'),
+    Output(component_id=bar_top_ratings_for_tags_figure_key_id, component_property='data'),
     Input(component_id=timerange_slider_id, component_property='value'),
     Input(component_id=tags_dropdown_id, component_property='value'),
     Input(component_id=line_avg_score_for_tags_over_time_id, component_property='relayoutData'),
+    State(component_id=bar_top_ratings_for_tags_figure_key_id, component_property='data'),
 )
-def update_bar_top_ratings_for_tags(timerange_slider_value, tags_dropdown_value, tags_over_time_data):
+@metrics.instrument_callback
+def update_bar_top_ratings_for_tags(timerange_slider_value, tags_dropdown_value, tags_over_time_data, displayed_figure_key):
     min_year = timerange_slider_value[0]
     max_year = timerange_slider_value[1]
 
@@ -76,79 +397,143 @@ def update_bar_top_ratings_for_tags(timerange_slider_value, tags_dropdown_value,
         min_year = int(tags_over_time_data["xaxis.range[0]"])
         max_year = int(tags_over_time_data["xaxis.range[1]"])
 
-    tags_to_filter = get_dropdown_value_as_list(tags_dropdown_value)
+    tags_to_filter = get_filter_tags(tags_dropdown_value)
+    data = get_data()
+    return get_figure_update(get_figure_key("bar_top_ratings_for_tags", tags_to_filter, min_year, max_year, data), displayed_figure_key, data)
 
+def create_bar_top_ratings_for_tags(data, tags_to_filter, min_year, max_year):
+    import plotly.express as px
     # Filter by year and tags
-    bar_df = top_ratings_df[(top_ratings_df["year"] >= min_year) & (top_ratings_df["year"] <= max_year) & (top_ratings_df["tag_id"].isin(tags_to_filter))].copy()
-    fig = px.bar(bar_df,
-        x='year',
-        y='rating',
-        custom_data='manga_id',
-        barmode="group",
-        color='tag_id',
-        text='title', 
-        labels={'rating': 'Manga Rating', 'year': 'Year'},
-        template=plotly_theme
-    )
+    with metrics.measure_phase("filter"):
+        bar_df = filter_top_ratings(data, tags_to_filter, min_year, max_year)
+    with metrics.measure_phase("figure"):
+        fig = px.bar(bar_df,
+            x='year',
+            y='rating',
+            custom_data='manga_id',
+            barmode="group",
+            color='tag_id',
+            text='title', 
+            labels={'rating': 'Manga Rating', 'year': 'Year'},
+            template=plotly_theme
+        )
     return fig
 
 
 
-@callback(
+@filter_callback(
     Output(component_id=scatter_number_of_mangas_per_tag_id, component_property='figure'),
+    Output(component_id=scatter_number_of_mangas_per_tag_figure_key_id, component_property='data'),
     Input(component_id=timerange_slider_id, component_property='value'),
     Input(component_id=tags_dropdown_id, component_property='value'),
+    State(component_id=scatter_number_of_mangas_per_tag_figure_key_id, component_property='data'),
 )
-def update_scatter_number_of_mangas_per_tag(timerange_slider_value, tags_dropdown_value):
+@metrics.instrument_callback
+def update_scatter_number_of_mangas_per_tag(timerange_slider_value, tags_dropdown_value, displayed_figure_key):
     min_year = timerange_slider_value[0]
     max_year = timerange_slider_value[1]
-    tags_to_filter = get_dropdown_value_as_list(tags_dropdown_value)
-
-    # Filter by year and tags
-    scatter_df = tags_df[(tags_df["year"] >= min_year) & (tags_df["year"] <= max_year) & (tags_df["tag_id"].isin(tags_to_filter))].copy()
-    # Remove any rows where the average rating is NAN
-    scatter_df = scatter_df.dropna(subset=['average_rating'])
-
-
-    # Create bubble size column which is a normalized value based on the average_rating
-    # If we did not do that the sizes of each bubble would stay the same if the values of the average ratings are close to each other 
-    scatter_df['bubble_size'] = (scatter_df['average_rating'] - scatter_df['average_rating'].min()) / (scatter_df['average_rating'].max() - scatter_df['average_rating'].min()) * 100 
-    fig = px.scatter(scatter_df,
-        x="year",
-        y="number_of_mangas",
-        size="bubble_size",
-        color="tag_id",
-        hover_name="tag_id",
-        hover_data={"bubble_size": False}, # Remove bubble size from hover data
-        labels={'year': 'Year', 'number_of_mangas': 'Number of Mangas'},
-        template=plotly_theme
-    )
+    tags_to_filter = get_filter_tags(tags_dropdown_value)
+    data = get_data()
+    return get_figure_update(get_figure_key("scatter_number_of_mangas_per_tag", tags_to_filter, min_year, max_year, data), displayed_figure_key, data)
+
+def create_scatter_number_of_mangas_per_tag(data, tags_to_filter, min_year, max_year):
+    import plotly.express as px
+    # Filter by year and tags and remove any rows where the average rating is NAN
+    with metrics.measure_phase("filter"):
+        years_per_bucket = get_years_per_bucket(data, tags_to_filter, min_year, max_year)
+        scatter_df = filter_tags_with_ratings(data, tags_to_filter, min_year, max_year, years_per_bucket).copy()
+
+
+        # Create bubble size column which is a normalized value based on the average_rating
+        # If we did not do that the sizes of each bubble would stay the same if the values of the average ratings are close to each other 
+        scatter_df['bubble_size'] = (scatter_df['average_rating'] - scatter_df['average_rating'].min()) / (scatter_df['average_rating'].max() - scatter_df['average_rating'].min()) * 100 
+    with metrics.measure_phase("figure"):
+        fig = px.scatter(scatter_df,
+            x="year",
+            y="number_of_mangas",
+            size="bubble_size",
+            color="tag_id",
+            hover_name="tag_id",
+            hover_data={"bubble_size": False}, # Remove bubble size from hover data
+            labels={'year': get_year_label(years_per_bucket), 'number_of_mangas': 'Number of Mangas'},
+            template=plotly_theme
+        )
     return fig
 
-@callback(
+@filter_callback(
     Output(component_id=line_avg_score_for_tags_over_time_id, component_property='figure'),
+    Output(component_id=line_avg_score_for_tags_over_time_figure_key_id, component_property='data'),
     Input(component_id=timerange_slider_id, component_property='value'),
     Input(component_id=tags_dropdown_id, component_property='value'),
+    State(component_id=line_avg_score_for_tags_over_time_figure_key_id, component_property='data'),
 )
-def update_line_avg_score_for_tags_over_time(timerange_slider_value, tags_dropdown_value):
+@metrics.instrument_callback
+def update_line_avg_score_for_tags_over_time(timerange_slider_value, tags_dropdown_value, displayed_figure_key):
     min_year = timerange_slider_value[0]
     max_year = timerange_slider_value[1]
-    tags_to_filter = get_dropdown_value_as_list(tags_dropdown_value)
+    tags_to_filter = get_filter_tags(tags_dropdown_value)
+    data = get_data()
+    return get_figure_update(get_figure_key("line_avg_score_for_tags_over_time", tags_to_filter, min_year, max_year, data), displayed_figure_key, data)
+
+def create_line_avg_score_for_tags_over_time(data, tags_to_filter, min_year, max_year):
+    import plotly.express as px
+    # Filter by year and tags and remove any rows where the average rating is NAN
+    with metrics.measure_phase("filter"):
+        years_per_bucket = get_years_per_bucket(data, tags_to_filter, min_year, max_year)
+        line_df = filter_tags_with_ratings(data, tags_to_filter, min_year, max_year, years_per_bucket)
+
+    with metrics.measure_phase("figure"):
+        fig = px.line(
+            line_df,
+            x="year",
+            y="average_rating",
+            color="tag_id",
+            labels={'year': get_year_label(years_per_bucket), 'average_rating': 'Average Rating'},
+            template=plotly_theme
+        )
+    return fig 
 
-    # Filter by year and tags
-    line_df = tags_df[(tags_df["year"] >= min_year) & (tags_df["year"] <= max_year) & (tags_df["tag_id"].isin(tags_to_filter))].copy()
-    # Remove any rows where the average rating is NAN
-    line_df = line_df.dropna(subset=['average_rating'])
-
-    fig = px.line(
-        line_df,
-        x="year",
-        y="average_rating",
-        color="tag_id",
-        labels={'year': 'Year', 'average_rating': 'Average Rating'},
-        template=plotly_theme
+figure_creators = {
+    "bar_top_ratings_for_tags": create_bar_top_ratings_for_tags,
+    "scatter_number_of_mangas_per_tag": create_scatter_number_of_mangas_per_tag,
+    "line_avg_score_for_tags_over_time": create_line_avg_score_for_tags_over_time,
+}
+
+def get_initial_figure_keys(startup_data, data):
+    # Keys of the figures requested by the initial callbacks of a page load (first tag, all years)
+    tags_to_filter = get_filter_tags(startup_data["tag_dropdown_options"][0]["value"])
+    return [get_figure_key(figure_name, tags_to_filter, startup_data["min_year"], startup_data["max_year"], data) for figure_name in figure_creators]
+
+# The figures of the initial page come prerendered out of the startup artifact.
+# The artifact was built from the same files (see get_data_signature), its figures belong to the current version.
+for initial_figure in startup_data["figures"]:
+    figure_name, tags_to_filter, figure_min_year, figure_max_year = initial_figure["key"]
+    figure_cache.put(get_figure_key(figure_name, tuple(tags_to_filter), figure_min_year, figure_max_year, current_data), initial_figure["figure"])
+
+
+if clientside_filters:
+    clientside_callback(
+        ClientsideFunction(namespace="manhuag", function_name="updateBarTopRatingsForTags"),
+        Output(component_id=bar_top_ratings_for_tags_id, component_property='figure'),
+        Input(component_id=timerange_slider_id, component_property='value'),
+        Input(component_id=tags_dropdown_id, component_property='value'),
+        Input(component_id=line_avg_score_for_tags_over_time_id, component_property='relayoutData'),
+        State(component_id=filter_data_store_id, component_property='data'),
+    )
+    clientside_callback(
+        ClientsideFunction(namespace="manhuag", function_name="updateScatterNumberOfMangasPerTag"),
+        Output(component_id=scatter_number_of_mangas_per_tag_id, component_property='figure'),
+        Input(component_id=timerange_slider_id, component_property='value'),
+        Input(component_id=tags_dropdown_id, component_property='value'),
+        State(component_id=filter_data_store_id, component_property='data'),
+    )
+    clientside_callback(
+        ClientsideFunction(namespace="manhuag", function_name="updateLineAvgScoreForTagsOverTime"),
+        Output(component_id=line_avg_score_for_tags_over_time_id, component_property='figure'),
+        Input(component_id=timerange_slider_id, component_property='value'),
+        Input(component_id=tags_dropdown_id, component_property='value'),
+        State(component_id=filter_data_store_id, component_property='data'),
     )
-    return fig 
 
 
 @callback(
@@ -156,42 +541,82 @@ def update_line_avg_score_for_tags_over_time(timerange_slider_value, tags_dropdo
     Output(component_id=bar_similar_mangas_id, component_property='figure'),
     Input(component_id=bar_top_ratings_for_tags_id, component_property='clickData'),
 )
+@metrics.instrument_callback
 def update_bar_similar_mangas(top_results_data):
     if top_results_data == None:
         return no_update
+    import plotly.graph_objects as go
 
     # Extract the manga_id out of the customdata
     first_point = top_results_data["points"][0]
     manga_id = first_point["customdata"][0]
     manga_title = first_point["text"]
-    # Find the matching manga and extract out similar mangas into its own data frame.
-    df_similar_mangas = manga_df[manga_df["id"] == manga_id].explode("similar_mangas")
-    df_similar_mangas = pd.DataFrame(df_similar_mangas['similar_mangas'].tolist())
-    fig = px.bar(
-        df_similar_mangas,
-        custom_data='id',
-        x='title',
-        y='similarity_score',
-        labels={'title': 'Manga Title', 'similarity_score': 'Similarity Score'},
-        template=plotly_theme
-    )
+    data = get_data()
+    if manga_id not in data.manga_store.get():
+        return no_update
+    # Look up the precalculated similar mangas, the bar chart is built directly out of the arrays
+    with metrics.measure_phase("filter"):
+        similar_ids, similar_titles, similarity_scores = data.manga_store.get().get_similar_mangas(manga_id)
+    with metrics.measure_phase("figure"):
+        fig = go.Figure(
+            go.Bar(
+                x=similar_titles,
+                y=similarity_scores,
+                customdata=similar_ids.reshape(-1, 1),
+                hovertemplate="Manga Title=%{x}<br>Similarity Score=%{y}<extra></extra>"
+            ),
+            layout=go.Layout(
+                xaxis_title="Manga Title",
+                yaxis_title="Similarity Score",
+                margin={"t": 60},
+                template=plotly_theme
+            )
+        )
 
     title = f"Liked '{manga_title}' ?"
     return (title, fig)
 
+@callback(
+    Output(component_id=search_results_id, component_property='children'),
+    Input(component_id=search_input_id, component_property='value'),
+)
+@metrics.instrument_callback
+def update_search_results(query):
+    if query == None or query.strip() == "":
+        return []
+    data = get_data()
+    if data.search_index.get() is None:
+        return html.P("The search is not available", className="text-secondary")
+
+    with metrics.measure_phase("search"):
+        manga_ids, _ = data.search_index.get().search(query, k=number_of_search_results)
+    if len(manga_ids) == 0:
+        return html.P("No mangas found", className="text-secondary")
+
+    # A click on a result opens the detail dialog, see get_selected_manga_id
+    return dbc.ListGroup([
+        dbc.ListGroupItem(data.manga_store.get().get_title(manga_id), id={ "type": search_result_type, "index": int(manga_id) }, action=True, n_clicks=0)
+        for manga_id in manga_ids
+    ], flush=True)
+
 @callback(
     Output(component_id=modal_manga_detail_id, component_property='is_open'),
     Output(component_id=modal_manga_detail_title_id, component_property='children'),
     Output(component_id=modal_manga_detail_body_id, component_property='children'),
     Input(component_id=bar_similar_mangas_id, component_property='clickData'),
+    Input(component_id={ "type": search_result_type, "index": ALL }, component_property='n_clicks'),
 )
-def update_manga_detail_modal(click_data):
-    if click_data == None:
+@metrics.instrument_callback
+def update_manga_detail_modal(click_data, search_result_clicks):
+    data = get_data()
+    manga_id = get_selected_manga_id(click_data, data)
+    if manga_id == None:
         return no_update
+    return create_manga_detail(data, manga_id)
 
-    manga = get_manga_from_click_data(click_data)
-    manga_title = manga["title"].iloc[0]
-    manga_description = manga["description"].iloc[0]
+def create_manga_detail(data, manga_id):
+    manga_title = data.manga_store.get().get_title(manga_id)
+    manga_description = data.manga_store.get().get_description(manga_id)
 
     body = html.Div([
         html.H3("Story"),
@@ -199,20 +624,40 @@ def update_manga_detail_modal(click_data):
     ])
     return (True, manga_title, body)
 
-@callback(
+@background_callback(
     Output(component_id=modal_manga_detail_loading_spinner_content_id, component_property='children'),
     Input(component_id=bar_similar_mangas_id, component_property='clickData'),
+    Input(component_id={ "type": search_result_type, "index": ALL }, component_property='n_clicks'),
+    progress=[
+        Output(component_id=modal_manga_detail_progress_id, component_property='value'),
+        Output(component_id=modal_manga_detail_progress_id, component_property='label'),
+    ],
+    # Selecting another manga in the top ratings replaces the similar mangas the dialog was opened from
+    cancel=[Input(component_id=bar_top_ratings_for_tags_id, component_property='clickData')],
+    running=[(Output(component_id=modal_manga_detail_progress_id, component_property='style'), { "display": "flex" }, { "display": "none" })],
 )
-def update_manga_detail_modal_similar_manga_content(click_data):
-    if click_data == None:
+@metrics.instrument_callback
+def update_manga_detail_modal_similar_manga_content(set_progress, click_data, search_result_clicks):
+    data = get_data()
+    manga_id = get_selected_manga_id(click_data, data)
+    if manga_id == None:
         return no_update
+    return create_similar_manga_content(data, manga_id, set_progress)
 
-    manga = get_manga_from_click_data(click_data)
-    manga_title = manga["title"].iloc[0]
+def create_similar_manga_content(data, manga_id, set_progress):
+    import jikan
+    manga_title = data.manga_store.get().get_title(manga_id)
 
-    # Get recommendations via Jikan REST API
+    # Get recommendations out of the local store and fall back to the Jikan REST API
     # See here for more information: https://docs.api.jikan.moe/
-    recommendations = get_jikan_manga_recommendations(manga_title)
+    set_progress((0, "Looking up recommendations"))
+    with metrics.measure_phase("filter"):
+        recommendations = recommendation_store.get().get(manga_title)
+    metrics.cache_requests.inc("recommendation_store", hit=recommendations is not None)
+    if recommendations is None:
+        with metrics.measure_phase("upstream"):
+            recommendations = get_live_recommendations(manga_title, set_progress)
+    recommendations = recommendations[:jikan.NUMBER_OF_RECOMMENDATIONS]
     recommendation_title = "No recommendations found"
     if len(recommendations) > 0:
         recommendation_title = "You may also like"
@@ -229,13 +674,18 @@ def update_manga_detail_modal_similar_manga_content(click_data):
         html.Ul(list_elements)
     ])
 
-def prepare_layout():
+def prepare_layout(startup_data, data):
+    tag_dropdown_options = startup_data["tag_dropdown_options"]
+    min_year = startup_data["min_year"]
+    max_year = startup_data["max_year"]
     header = html.Div([html.H3("Manhuag Explorer", className="text-white fw-bold")], className="p-2 bg-primary")
 
     modal_dialog = dbc.Modal([
         dbc.ModalHeader(dbc.ModalTitle("Header", id=modal_manga_detail_title_id)),
             dbc.ModalBody(html.Div([
                 html.Div(id=modal_manga_detail_body_id),
+                # Shown while the recommendations are loaded in the background, see background_callback
+                dbc.Progress(id=modal_manga_detail_progress_id, value=0, striped=True, animated=True, style={ "display": "none" }),
                 dcc.Loading(
                     id=modal_manga_detail_loading_spinner_id,
                     children=[html.Div([html.Div(id=modal_manga_detail_loading_spinner_content_id)])],
@@ -255,6 +705,12 @@ def prepare_layout():
         multi=True, clearable=False
     )
 
+    search_section = html.Section([
+		html.H6("Search Mangas by title, tag or story", className="text-secondary"),
+        dcc.Input(id=search_input_id, type="search", placeholder="Search ...", debounce=0.3, className="form-control"),
+        html.Div(id=search_results_id, className="pt-1")
+    ], className="py-2")
+
     tags_section = html.Section([
 		html.H6("Select Tags you are interested in", className="text-secondary"),
         tags_dropdown
@@ -274,6 +730,7 @@ def prepare_layout():
 
     filter_settings = html.Aside([
     	html.H3("Filter Settings", className="text-primary"),
+    	search_section,
     	tags_section,
     	timerange_section,
    	], id="filter-settings", className="sticky-top p-1")
@@ -330,52 +787,199 @@ def prepare_layout():
         dbc.Col(main_content, md=9)
     ]))
 
-    return html.Div([header, dashboard, modal_dialog], className="container-fluid px-0 dbc")
-
-
-def get_jikan_manga_id(manga_title):
-    url = f'https://api.jikan.moe/v4/manga?q={manga_title}&limit=1'
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        if data['data']:
-            first_result = data["data"][0]
-            id = first_result["mal_id"]
-            return (True, id)
-        else:
-            print(f"No Jikan Id found for title '{manga_title}'")
-            return (False, None)
-    else:
-        print("Request failed")
-        return (False, None)
-
-def get_jikan_manga_recommendations(manga_title):
-    # TODO: Perhaps do that as a preprocessing step because this can take around a second
-    # which would be noticeable when opening a modal dialog...
-    success, id = get_jikan_manga_id(manga_title)
-    if not success:
+    # The filter data is part of the initial layout and sent only once per page load
+    filter_data_store = dcc.Store(id=filter_data_store_id, data=prepare_filter_data(data) if clientside_filters else None)
+    figure_key_stores = [
+        dcc.Store(id=bar_top_ratings_for_tags_figure_key_id),
+        dcc.Store(id=line_avg_score_for_tags_over_time_figure_key_id),
+        dcc.Store(id=scatter_number_of_mangas_per_tag_figure_key_id),
+    ]
+
+    return html.Div([header, dashboard, modal_dialog, filter_data_store, *figure_key_stores], className="container-fluid px-0 dbc")
+
+
+def get_live_recommendations(manga_title, set_progress):
+    # A background callback runs in a new process every time, the caches of its Jikan client are lost
+    # with the process. The results are kept in the shared disk cache instead, titles without
+    # recommendations as well. Concurrent jobs for the same title are not coalesced.
+    cache_key = ("jikan_recommendations", manga_title)
+    recommendations = background_callback_cache.get(cache_key) if background_callback_cache is not None else None
+    if recommendations is not None:
+        return recommendations
+    recommendations = get_jikan_manga_recommendations(manga_title, set_progress)
+    if recommendations is None:
         return []
-
-    url = f'https://api.jikan.moe/v4/manga/{id}/recommendations'
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        if data["data"]:
-            recommendations = [e["entry"] for e in data["data"][:3]] 
-            titles = [r["title"] for r in recommendations]
-            urls = [r["url"] for r in recommendations]
-            return list(zip(titles, urls))
-        else:
-            print("No recommendations found")
+    if background_callback_cache is not None:
+        background_callback_cache.set(cache_key, recommendations, expire=live_recommendations_ttl if len(recommendations) > 0 else live_recommendations_negative_ttl)
+    return recommendations
+
+def get_jikan_manga_recommendations(manga_title, set_progress=lambda progress_values: None):
+    # This can take around a second, recommendations precalculated by enrichment.py are preferred.
+    # Returns None if the requests failed.
+    import jikan
+    import requests
+    try:
+        set_progress((30, "Searching the manga on Jikan"))
+        id = jikan_client.get().get_manga_id(manga_title)
+        if id is None:
+            print(f"No Jikan Id found for title '{manga_title}'")
             return []
-    else:
-        print("Failed to get recommendations")
-        return []
 
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.title = "Manhuag Explorer"
-app.layout = prepare_layout()
-server = app.server
+        set_progress((65, "Requesting recommendations from Jikan"))
+        recommendations = jikan_client.get().get_recommendations(id)
+        if len(recommendations) == 0:
+            print("No recommendations found")
+        return recommendations[:jikan.NUMBER_OF_RECOMMENDATIONS]
+    except requests.RequestException as e:
+        print(f"Failed to get recommendations: {e}")
+        return None
+
+def get_jikan_cache_hits_and_misses(cache_name):
+    # The client is created on first use, there are no requests to count before
+    if not jikan_client.is_created():
+        return (0, 0)
+    cache = getattr(jikan_client.get(), cache_name)
+    return (cache.hits, cache.misses)
+
+def warm_up(timer):
+    # Imports the deferred modules and loads everything the callbacks need.
+    # Runs at startup unless FAST_STARTUP=1, then in the background after the server started (see start_warm_up).
+    with timer.measure("deferred_imports"):
+        for module in deferred_modules:
+            importlib.import_module(module)
+        pio.templates[plotly_theme]
+    data = get_data()
+    with timer.measure("data"):
+        data.preprocessed_data.get()
+        data.manga_store.get()
+        recommendation_store.get()
+    with timer.measure("indexes"):
+        data.filter_indexes.get()
+        data.search_index.get()
+    jikan_client.get()
+
+def start_warm_up():
+    # Called in every gunicorn worker (see gunicorn.conf.py) and not in the master,
+    # a fork while the thread holds an import lock would leave the lock held in the worker
+    if not fast_startup:
+        return
+    def run_warm_up():
+        timer = startup.PhaseTimer()
+        warm_up(timer)
+        timer.report("Warm up")
+    threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+
+# Seconds between two checks for a new data version published by preprocessing.py, 0 disables the reload
+data_reload_interval = float(os.environ.get("DATA_RELOAD_INTERVAL", "30"))
+# A version which failed to load is not tried again
+failed_data_version = None
+
+def render_figures(figure_keys, data):
+    # Returns the json of the figures. On linux they are rendered in a forked process with a lower priority,
+    # plotly then neither holds the GIL of the worker nor takes the cpu from its requests. The worker only
+    # waits for the result, which releases the GIL. The process gets the loaded data of the version by the fork.
+    def render():
+        return [figure_creators[figure_name](data, tags_to_filter, figure_min_year, figure_max_year).to_json() for figure_name, tags_to_filter, figure_min_year, figure_max_year, _ in figure_keys]
+    if not sys.platform.startswith("linux"):
+        return render()
+    import multiprocessing
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    def render_in_process():
+        os.nice(10)
+        sender.send(render())
+    process = context.Process(target=render_in_process, name="render-figures", daemon=True)
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        raise ValueError(f"Rendering the figures failed with exit code {process.exitcode}")
+    finally:
+        receiver.close()
+        process.join()
+
+def reload_data():
+    # Loads a new data version next to the current one and switches to it once everything is loaded.
+    # Requests in the meantime are answered with the current version, the first ones after the switch
+    # find the figures of the initial page already rendered. Returns True if the version was switched.
+    global current_data, startup_data, tag_dropdown_options, min_year, max_year, failed_data_version
+    version = data_versions.read_current_version(output_path)
+    if version == current_data.version or version == failed_data_version:
+        return False
+    timer = startup.PhaseTimer()
+    data = DataVersion(version, data_versions.get_version_path(output_path, version))
+    try:
+        with timer.measure("data"):
+            data.preprocessed_data.get()
+            data.manga_store.get()
+        with timer.measure("indexes"):
+            data.filter_indexes.get()
+            data.search_index.get()
+        new_startup_data = startup.create_startup_data(data.get_tag_descriptions(), data.get_years())
+        initial_figure_keys = get_initial_figure_keys(new_startup_data, data)
+        with timer.measure("figures"):
+            initial_figures = render_figures(initial_figure_keys, data)
+        with timer.measure("layout"):
+            new_layout = prepare_layout(new_startup_data, data)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Failed to load data version {version}, keeping version {current_data.version}: {e}")
+        failed_data_version = version
+        return False
+
+    # Callbacks running at the moment finish with the data they already got from get_data
+    previous_version = current_data.version
+    current_data = data
+    startup_data = new_startup_data
+    tag_dropdown_options = startup_data["tag_dropdown_options"]
+    min_year = startup_data["min_year"]
+    max_year = startup_data["max_year"]
+    app.layout = new_layout
+    filter_top_ratings.cache_clear()
+    filter_tags_with_ratings.cache_clear()
+    figure_cache.remove_where(lambda figure_key: figure_key[4] == previous_version)
+    for figure_key, figure_json in zip(initial_figure_keys, initial_figures):
+        figure_cache.put(figure_key, figure_json)
+    timer.report(f"Switched from data version {previous_version} to {version}")
+    return True
+
+def start_data_reload():
+    # Called in every gunicorn worker like start_warm_up, each worker checks for new versions on its own
+    if data_reload_interval <= 0:
+        return
+    def run_data_reload():
+        while True:
+            time.sleep(data_reload_interval)
+            reload_data()
+    threading.Thread(target=run_data_reload, name="data-reload", daemon=True).start()
+
+with startup_timer.measure("layout"):
+    layout = prepare_layout(startup_data, current_data)
+with startup_timer.measure("serializer"):
+    # Dash serializes the layout and the responses with the json encoder of plotly, its first use imports numpy.
+    # Done here instead of in the first request.
+    pio.json.to_json_plotly(layout)
+with startup_timer.measure("app"):
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], background_callback_manager=background_callback_manager)
+    app.title = "Manhuag Explorer"
+    app.layout = layout
+    server = app.server
+
+# Prometheus metrics on /metrics, see metrics.py
+metrics.cache_requests.add_cache("figure", lambda: (figure_cache.hits, figure_cache.misses))
+metrics.cache_requests.add_cache("filter_top_ratings", lambda: filter_top_ratings.cache_info()[:2])
+metrics.cache_requests.add_cache("filter_tags_with_ratings", lambda: filter_tags_with_ratings.cache_info()[:2])
+metrics.cache_requests.add_cache("jikan_manga_id", lambda: get_jikan_cache_hits_and_misses("manga_id_cache"))
+metrics.cache_requests.add_cache("jikan_recommendations", lambda: get_jikan_cache_hits_and_misses("recommendations_cache"))
+metrics.install(server)
+if os.environ.get("PROFILE_REQUESTS", "0") == "1":
+    RequestProfiler(os.environ.get("PROFILE_DIR", "./profiles"), float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))).install(server)
+
+if not fast_startup:
+    warm_up(startup_timer)
+startup_timer.report("Startup")
 
 if __name__ == "__main__":
+	start_warm_up()
+	start_data_reload()
 	app.run_server(debug=True)
@@ -0,0 +1,90 @@
+import json
+import numpy as np
+from artifacts import StringTable
+
+def compact_similar_manga(entry):
+    # object_hook for parsing manga.json: every similar manga repeats its title, only the id and
+    # the score are kept while parsing instead of a dict per similar manga
+    if "similarity_score" in entry and "title" in entry and len(entry) == 3:
+        return (entry["id"], entry["similarity_score"])
+    return entry
+
+def get_similar_id_and_score(similar_manga):
+    if isinstance(similar_manga, tuple):
+        return similar_manga
+    return similar_manga["id"], similar_manga["similarity_score"]
+
+class MangaStore:
+    # Read only lookup of the manga details by id.
+    # The position of a manga is found with an id -> position array and the similar mangas of all mangas
+    # are flattened into one array of positions and scores, the ones of a manga are a slice of it.
+    # Titles and descriptions are string tables, each title is stored once and the similar mangas refer to it by position.
+    # similar_positions can be passed instead of similar_ids if they were precalculated (see artifacts.write_binary_data).
+    def __init__(self, ids, titles, descriptions, similar_offsets, similar_ids=None, similar_scores=None, similar_positions=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.titles = titles
+        self.descriptions = descriptions
+        self.positions = np.full(int(self.ids.max()) + 1 if len(self.ids) > 0 else 0, -1, dtype=np.int32)
+        self.positions[self.ids] = np.arange(len(self.ids))
+        self.similar_offsets = np.asarray(similar_offsets, dtype=np.int64)
+        if similar_positions is None:
+            similar_positions = self.positions[np.asarray(similar_ids, dtype=np.int64)]
+        self.similar_positions = np.asarray(similar_positions, dtype=np.int32)
+        self.similar_scores = np.asarray(similar_scores, dtype=np.float64)
+
+    @classmethod
+    def from_mangas(cls, mangas):
+        # Create the store out of the mangas of manga.json, the similar mangas can be dicts or (id, score) tuples
+        similar_offsets = np.zeros(len(mangas) + 1, dtype=np.int64)
+        np.cumsum([len(m["similar_mangas"]) for m in mangas], out=similar_offsets[1:])
+        similar_mangas = [get_similar_id_and_score(s) for m in mangas for s in m["similar_mangas"]]
+        return cls(
+            ids=[m["id"] for m in mangas],
+            titles=StringTable.from_strings([m["title"] for m in mangas]),
+            descriptions=StringTable.from_strings([m["description"] for m in mangas]),
+            similar_offsets=similar_offsets,
+            similar_ids=[s[0] for s in similar_mangas],
+            similar_scores=[s[1] for s in similar_mangas]
+        )
+
+    @classmethod
+    def from_json(cls, f):
+        # Parse manga.json without keeping a dict per similar manga
+        return cls.from_mangas(json.load(f, object_hook=compact_similar_manga)["mangas"])
+
+    @classmethod
+    def from_columns(cls, columns):
+        # Create the store out of the columns of the binary data (see artifacts.load_manga_columns)
+        return cls(
+            ids=columns["id"],
+            titles=columns["title"],
+            descriptions=columns["description"],
+            similar_offsets=columns["similar_mangas.offsets"],
+            similar_scores=columns["similar_mangas.similarity_score"],
+            similar_positions=columns["similar_mangas.position"]
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, manga_id):
+        return 0 <= manga_id < len(self.positions) and self.positions[manga_id] >= 0
+
+    def get_position(self, manga_id):
+        if manga_id < 0 or manga_id >= len(self.positions) or self.positions[manga_id] < 0:
+            raise KeyError(f"Unknown manga id {manga_id}")
+        return int(self.positions[manga_id])
+
+    def get_title(self, manga_id):
+        return self.titles[self.get_position(manga_id)]
+
+    def get_description(self, manga_id):
+        return self.descriptions[self.get_position(manga_id)]
+
+    def get_similar_mangas(self, manga_id):
+        # Returns the ids, titles and similarity scores of the similar mangas
+        position = self.get_position(manga_id)
+        start, stop = self.similar_offsets[position], self.similar_offsets[position + 1]
+        similar_positions = self.similar_positions[start:stop]
+        titles = [self.titles[p] for p in similar_positions]
+        return self.ids[similar_positions], titles, self.similar_scores[start:stop]
@@ -0,0 +1,113 @@
+import argparse
+import gc
+import importlib
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Measures the memory of the gunicorn workers with and without preloading the app (see gunicorn.conf.py).
+# Needs linux because the memory is read from /proc/<pid>/smaps_rollup:
+# - rss: resident memory including pages shared with other processes
+# - pss: proportional set size, shared pages are split between the processes sharing them
+# - uss: private memory of the process, this is what every additional worker costs
+# With --data the private memory of every data structure of main.py is measured in this process instead.
+
+def read_memory_mb(pid):
+	values = {}
+	with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+		for line in f:
+			parts = line.split()
+			if len(parts) == 3 and parts[2] == "kB":
+				values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+	return {
+		"rss": values["Rss"],
+		"pss": values["Pss"],
+		"uss": values["Private_Clean"] + values["Private_Dirty"]
+	}
+
+def find_worker_pids(master_pid):
+	with open(f"/proc/{master_pid}/task/{master_pid}/children", "r") as f:
+		return [int(pid) for pid in f.read().split()]
+
+def wait_for_workers(url, master_pid, num_workers, timeout):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			if len(find_worker_pids(master_pid)) == num_workers:
+				urllib.request.urlopen(url, timeout=5).read()
+				return
+		except OSError:
+			pass
+		time.sleep(0.5)
+	raise TimeoutError(f"gunicorn did not start {num_workers} workers within {timeout}s")
+
+def measure(preload, num_workers, port, num_requests, timeout):
+	env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0", WEB_CONCURRENCY=str(num_workers))
+	command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "main:server"]
+	process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	url = f"http://127.0.0.1:{port}/"
+	try:
+		wait_for_workers(url, process.pid, num_workers, timeout)
+		# Make sure every worker has loaded the app and served some requests
+		time.sleep(2)
+		for _ in range(num_requests):
+			urllib.request.urlopen(url + "_dash-layout", timeout=5).read()
+		master_memory = read_memory_mb(process.pid)
+		worker_memory = [read_memory_mb(pid) for pid in find_worker_pids(process.pid)]
+	finally:
+		process.terminate()
+		process.wait()
+	return master_memory, worker_memory
+
+def measure_data(names):
+	# The app starts without data (see startup.py), every structure is then created one after another
+	# and the growth of the private memory is attributed to it. Run it in the directory of the app.
+	os.environ["FAST_STARTUP"] = "1"
+	sys.path.insert(0, os.getcwd())
+	import main
+	for module in main.deferred_modules:
+		importlib.import_module(module)
+	results = []
+	for name in names:
+		lazy = getattr(main.get_data(), name)
+		if lazy.is_created():
+			print(f"{name} was already loaded at startup (run python3 startup.py first to measure it)")
+			continue
+		gc.collect()
+		before = read_memory_mb(os.getpid())
+		lazy.get()
+		gc.collect()
+		after = read_memory_mb(os.getpid())
+		results.append((name, after["uss"] - before["uss"], after["rss"] - before["rss"]))
+	return results
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Measure the memory of the gunicorn workers with and without preloading")
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--port", type=int, default=8050)
+	parser.add_argument("--requests", type=int, default=20)
+	parser.add_argument("--timeout", type=int, default=120)
+	parser.add_argument("--data", action="store_true", help="Measure the data structures of main.py instead of the workers")
+	parser.add_argument("--structures", nargs="+", default=["preprocessed_data", "filter_indexes", "manga_store", "search_index"])
+	args = parser.parse_args()
+
+	if args.data:
+		print(f"{'structure':>20} {'uss':>9} {'rss':>9}")
+		results = measure_data(args.structures)
+		for name, uss, rss in results:
+			print(f"{name:>20} {uss:8.1f}M {rss:8.1f}M")
+		print(f"{'total':>20} {sum(r[1] for r in results):8.1f}M {sum(r[2] for r in results):8.1f}M")
+		sys.exit(0)
+
+	print(f"{'mode':>10} {'process':>8} {'rss':>9} {'pss':>9} {'uss':>9}")
+	for preload in (False, True):
+		mode = "preload" if preload else "default"
+		master_memory, worker_memory = measure(preload, args.workers, args.port, args.requests, args.timeout)
+		print(f"{mode:>10} {'master':>8} {master_memory['rss']:8.1f}M {master_memory['pss']:8.1f}M {master_memory['uss']:8.1f}M")
+		for memory in worker_memory:
+			print(f"{mode:>10} {'worker':>8} {memory['rss']:8.1f}M {memory['pss']:8.1f}M {memory['uss']:8.1f}M")
+		total_pss = master_memory["pss"] + sum(m["pss"] for m in worker_memory)
+		average_uss = sum(m["uss"] for m in worker_memory) / len(worker_memory)
+		print(f"{mode:>10} total pss {total_pss:.1f}M, average private memory per worker {average_uss:.1f}M")
@@ -0,0 +1,193 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import Response, g, has_request_context, request
+
+# Metrics of the application in the Prometheus text format, served on /metrics (see install).
+# The metrics are kept per process, every sample has the pid of the gunicorn worker as label.
+# Sum them up over the pid label to get the numbers of the whole application.
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DASH_UPDATE_PATH = "/_dash-update-component"
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels.keys(), escaped)) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.type = "counter"
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        # Returns (name suffix, labels, value) of all samples
+        with self._lock:
+            return [("", dict(zip(self.label_names, key)), value) for key, value in self._values.items()]
+
+class Histogram:
+    def __init__(self, name, help, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.type = "histogram"
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            bucket_counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+            self._values[key] = (bucket_counts, total + value)
+
+    def collect(self):
+        samples = []
+        with self._lock:
+            for key, (bucket_counts, total) in self._values.items():
+                labels = dict(zip(self.label_names, key))
+                for upper_bound, count in zip(self.buckets, bucket_counts):
+                    samples.append(("_bucket", { **labels, "le": format_value(upper_bound) }, count))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, bucket_counts[-1]))
+        return samples
+
+class CacheRequests:
+    # Hits and misses of all caches. Caches which keep their own counters are read at scrape time,
+    # lookups of the others are counted with inc.
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.type = "counter"
+        self.counter = Counter(name, help, ["cache", "result"])
+        self._caches = {}
+
+    def add_cache(self, cache, get_hits_and_misses):
+        # get_hits_and_misses returns the (hits, misses) counted by the cache
+        self._caches[cache] = get_hits_and_misses
+
+    def inc(self, cache, hit):
+        self.counter.inc(cache=cache, result="hit" if hit else "miss")
+
+    def collect(self):
+        samples = self.counter.collect()
+        for cache, get_hits_and_misses in list(self._caches.items()):
+            hits, misses = get_hits_and_misses()
+            samples.append(("", { "cache": cache, "result": "hit" }, hits))
+            samples.append(("", { "cache": cache, "result": "miss" }, misses))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        # pid is read again because the registry is created before gunicorn forks the workers
+        constant_labels = { "pid": os.getpid() }
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.collect():
+                lines.append(f"{metric.name}{suffix}{format_labels({ **constant_labels, **labels })} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+callback_duration = registry.register(Histogram(
+    "manhuag_callback_duration_seconds", "Wall time of the callback functions", ["callback"]))
+callback_phase_duration = registry.register(Histogram(
+    "manhuag_callback_phase_duration_seconds", "Wall time of a phase (filter, figure, serialize, ...) within one callback call", ["callback", "phase"]))
+callback_errors = registry.register(Counter(
+    "manhuag_callback_errors_total", "Callback calls which raised an exception", ["callback"]))
+request_duration = registry.register(Histogram(
+    "manhuag_request_duration_seconds", "Wall time of the callback requests including the dispatch of Dash and the serialization of the response", ["callback"]))
+response_size = registry.register(Histogram(
+    "manhuag_response_size_bytes", "Size of the callback responses", ["callback"], buckets=SIZE_BUCKETS))
+upstream_duration = registry.register(Histogram(
+    "manhuag_upstream_request_duration_seconds", "Wall time of the requests to external services", ["service", "endpoint", "status"]))
+cache_requests = registry.register(CacheRequests(
+    "manhuag_cache_requests_total", "Hits and misses of the caches and the recommendation store"))
+
+# Time spent per phase within the running callback call
+current_phase_durations = contextvars.ContextVar("current_phase_durations", default=None)
+
+def instrument_callback(function):
+    # Measures the wall time of a callback and observes the sum of its phases once per call
+    name = function.__name__
+    @wraps(function)
+    def instrumented_callback(*args, **kwargs):
+        phases_token = current_phase_durations.set({})
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            callback_errors.inc(callback=name)
+            raise
+        finally:
+            callback_duration.observe(time.perf_counter() - start, callback=name)
+            for phase, duration in current_phase_durations.get().items():
+                callback_phase_duration.observe(duration, callback=name, phase=phase)
+            current_phase_durations.reset(phases_token)
+            if has_request_context():
+                g.callback_name = name
+    return instrumented_callback
+
+@contextmanager
+def measure_phase(phase):
+    # Adds the time spent in the block to the phase of the running callback, does nothing outside of a callback
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_durations = current_phase_durations.get()
+        if phase_durations is not None:
+            phase_durations[phase] = phase_durations.get(phase, 0) + time.perf_counter() - start
+
+def observe_upstream_request(service):
+    # Returns an observer for jikan.JikanClient(request_observer=...)
+    def observe(endpoint, status, duration):
+        upstream_duration.observe(duration, service=service, endpoint=endpoint, status=status)
+    return observe
+
+def before_request():
+    g.request_start = time.perf_counter()
+
+def after_request(response):
+    # Request time and response size of the Dash callback requests, labeled with the callback which handled them
+    if request.path.endswith(DASH_UPDATE_PATH) and "request_start" in g:
+        name = g.get("callback_name", "unknown")
+        request_duration.observe(time.perf_counter() - g.request_start, callback=name)
+        if not response.direct_passthrough:
+            response_size.observe(len(response.get_data()), callback=name)
+    return response
+
+def install(server, path="/metrics"):
+    server.before_request(before_request)
+    server.after_request(after_request)
+    server.add_url_rule(path, "metrics", lambda: Response(registry.render(), mimetype="text/plain; version=0.0.4"))
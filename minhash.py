@@ -0,0 +1,199 @@
+import argparse
+import json
+import time
+import numpy as np
+from similarity import METRIC_IDF, METRIC_OVERLAP, METRICS, build_tag_matrix, calculate_metric_scores, calculate_tag_weights, calculate_top_k_similar, sum_tag_weights
+
+# Approximate top-k similar mangas for catalogs which are too large to compare every manga with every other one.
+# Every manga gets a MinHash signature of its tag set, two signatures agree in a value with the probability of the
+# jaccard similarity of the tag sets. The signatures are split into bands, mangas whose band values are all equal
+# land in the same bucket (locality sensitive hashing). Only the mangas sharing a bucket with a manga are scored,
+# exactly and with the same metrics as similarity.py. Similar mangas can be missed, the scores are never wrong.
+
+SEARCH_MINHASH = "minhash"
+DEFAULT_NUM_PERMUTATIONS = 64
+DEFAULT_NUM_BANDS = 32
+# Mangas with a very common band (e.g. a single popular tag) all land in one bucket,
+# only this many of them around the position of a manga in the bucket become its candidates
+DEFAULT_MAX_BUCKET_CANDIDATES = 64
+# Number of mangas whose candidates are scored at once
+BLOCK_SIZE = 1024
+# Odd 64 bit constant, the values of a band are combined into one bucket key like a polynomial string hash
+BUCKET_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def calculate_minhash_signatures(tag_matrix, num_permutations=DEFAULT_NUM_PERMUTATIONS, seed=0):
+	# Signature (mangas x num_permutations) of the tag set of every manga. The value of a permutation is the
+	# smallest permuted tag id of the manga. Mangas without tags get -1.
+	rng = np.random.default_rng(seed)
+	num_mangas, num_tags = tag_matrix.shape
+	has_tags = np.diff(tag_matrix.indptr) > 0
+	signatures = np.full((num_mangas, num_permutations), -1, dtype=np.int32)
+	if not has_tags.any():
+		return signatures
+	for permutation in range(num_permutations):
+		permuted_tags = rng.permutation(num_tags).astype(np.int32)[tag_matrix.indices]
+		signatures[has_tags, permutation] = np.minimum.reduceat(permuted_tags, tag_matrix.indptr[:-1][has_tags])
+	return signatures
+
+def expand_ranges(starts, stops):
+	# (index of the range, value) for all values of the ranges [start, stop), in the order of the ranges
+	lengths = stops - starts
+	range_ids = np.repeat(np.arange(len(lengths)), lengths)
+	offsets = np.arange(len(range_ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+	return range_ids, np.repeat(starts, lengths) + offsets
+
+def score_pairs(tag_matrix, tag_counts, rows, columns, metric=METRIC_OVERLAP, tag_weights=None):
+	# Matching counts and scores of the pairs (rows[i], columns[i]), the same values score_rows calculates
+	query_rows = tag_matrix[rows]
+	# Both matrices are binary, the elementwise product only keeps the shared tags
+	intersections = query_rows.multiply(tag_matrix[columns]).tocsr()
+	matching_counts = np.diff(intersections.indptr).astype(tag_matrix.dtype)
+	matching_weights = None
+	query_weights = None
+	if metric == METRIC_IDF:
+		matching_weights = (intersections @ tag_weights)[:, None]
+		query_weights = sum_tag_weights(query_rows, tag_weights)
+
+	unique_tag_counts = np.diff(tag_matrix.indptr)
+	scores = calculate_metric_scores(
+		metric, matching_counts[:, None], tag_counts[rows], unique_tag_counts[rows], unique_tag_counts[columns][:, None],
+		matching_weights, query_weights
+	)
+	return matching_counts, scores[:, 0]
+
+class MinHashIndex:
+	# LSH buckets of all mangas, answers the top-k of any manga with the candidates of its buckets
+	def __init__(self, tag_matrix, tag_counts, num_permutations=DEFAULT_NUM_PERMUTATIONS, num_bands=DEFAULT_NUM_BANDS, max_bucket_candidates=DEFAULT_MAX_BUCKET_CANDIDATES, seed=0):
+		if num_bands <= 0 or num_permutations % num_bands != 0:
+			raise ValueError(f"The number of permutations ({num_permutations}) has to be a multiple of the number of bands ({num_bands})")
+		self.tag_matrix = tag_matrix
+		self.tag_counts = np.asarray(tag_counts, dtype=np.int64)
+		self.tag_weights = None
+		signatures = calculate_minhash_signatures(tag_matrix, num_permutations, seed).astype(np.uint64)
+		rows_per_band = num_permutations // num_bands
+
+		# Per band the mangas sorted by bucket and the range of the sorted mangas every manga is compared with
+		num_mangas = tag_matrix.shape[0]
+		self.orders = []
+		self.candidate_starts = []
+		self.candidate_stops = []
+		for band in range(num_bands):
+			# The bucket is a hash of the values of the band, a collision only adds a few candidates which are scored
+			# exactly like all others. Mangas without tags all land in one bucket, they score 0 with every manga.
+			buckets = np.zeros(num_mangas, dtype=np.uint64)
+			for column in range(band * rows_per_band, (band + 1) * rows_per_band):
+				buckets = buckets * BUCKET_HASH_MULTIPLIER + signatures[:, column]
+			order = np.argsort(buckets, kind="stable")
+			sorted_buckets = buckets[order]
+			ranks = np.empty(num_mangas, dtype=np.int64)
+			ranks[order] = np.arange(num_mangas)
+			bucket_starts = np.searchsorted(sorted_buckets, buckets, side="left")
+			bucket_stops = np.searchsorted(sorted_buckets, buckets, side="right")
+			# A window of max_bucket_candidates around the manga, moved inside of its bucket
+			starts = np.maximum(np.minimum(ranks - max_bucket_candidates // 2, bucket_stops - max_bucket_candidates), bucket_starts)
+			self.orders.append(order)
+			self.candidate_starts.append(starts)
+			self.candidate_stops.append(np.minimum(starts + max_bucket_candidates, bucket_stops))
+
+	@classmethod
+	def from_mangas(cls, mangas, **kwargs):
+		tag_matrix, tag_counts = build_tag_matrix(mangas)
+		return cls(tag_matrix, tag_counts, **kwargs)
+
+	def find_candidate_pairs(self, rows, k):
+		# Unique (index into rows, position) pairs of the rows and their candidates, sorted by row and position.
+		# The first k mangas are candidates of every row, like in the exact search they fill up the top-k
+		# with mangas which do not share a tag if there are not enough candidates sharing one.
+		num_mangas = self.tag_matrix.shape[0]
+		pair_rows = [np.repeat(np.arange(len(rows)), k)]
+		pair_columns = [np.tile(np.arange(k), len(rows))]
+		for order, starts, stops in zip(self.orders, self.candidate_starts, self.candidate_stops):
+			range_ids, ranks = expand_ranges(starts[rows], stops[rows])
+			pair_rows.append(range_ids)
+			pair_columns.append(order[ranks])
+		keys = np.unique(np.concatenate(pair_rows) * num_mangas + np.concatenate(pair_columns))
+		return keys // num_mangas, keys % num_mangas
+
+	def top_k(self, rows, k=10, metric=METRIC_OVERLAP):
+		# Returns (columns, matching_counts, scores) of the given rows like similarity.calculate_top_k_similar
+		if metric not in METRICS:
+			raise ValueError(f"Unknown similarity metric '{metric}', expected one of {', '.join(METRICS)}")
+		if metric == METRIC_IDF and self.tag_weights is None:
+			self.tag_weights = calculate_tag_weights(self.tag_matrix)
+		rows = np.asarray(rows, dtype=np.int64)
+		k = max(0, min(k, self.tag_matrix.shape[0]))
+		results = ([], [], [])
+		for block_start in range(0, len(rows), BLOCK_SIZE):
+			block_rows = rows[block_start:block_start + BLOCK_SIZE]
+			pair_rows, pair_columns = self.find_candidate_pairs(block_rows, k)
+			matching_counts, scores = score_pairs(self.tag_matrix, self.tag_counts, block_rows[pair_rows], pair_columns, metric, self.tag_weights)
+
+			# Best k candidates of every row, ties are resolved by the lower position like in select_top_k
+			order = np.lexsort((pair_columns, -scores, pair_rows))
+			row_starts = np.searchsorted(pair_rows, np.arange(len(block_rows)))
+			order = order[np.arange(len(order)) - row_starts[pair_rows[order]] < k]
+			for result, values in zip(results, (pair_columns, matching_counts, scores)):
+				result.append(values[order].reshape(len(block_rows), k))
+		if len(rows) == 0:
+			return (np.empty((0, k), dtype=np.int64), np.empty((0, k), dtype=self.tag_matrix.dtype), np.empty((0, k), dtype=np.float64))
+		return tuple(np.concatenate(result) for result in results)
+
+def calculate_recall(exact_scores, approximate_scores):
+	# Share of the exact top-k which the approximate top-k found. Mangas with the same score as the k-th
+	# exact one are interchangeable, finding any of them counts. Both are sorted by descending score.
+	if exact_scores.shape[1] == 0:
+		return 1.0
+	kth_scores = exact_scores[:, -1:]
+	found = (approximate_scores > kth_scores).sum(axis=1)
+	found += np.minimum((approximate_scores == kth_scores).sum(axis=1), (exact_scores == kth_scores).sum(axis=1))
+	return found.sum() / exact_scores.size
+
+def sample_rows(num_mangas, sample_size, seed=0):
+	rng = np.random.default_rng(seed)
+	return np.sort(rng.choice(num_mangas, size=min(sample_size, num_mangas), replace=False))
+
+def measure_recall(minhash_index, rows, k=10, metric=METRIC_OVERLAP):
+	# recall@k of the index for the given rows against the exact search
+	_, _, exact_scores = calculate_top_k_similar(minhash_index.tag_matrix, minhash_index.tag_counts, k=k, rows=rows, metric=metric)
+	_, _, approximate_scores = minhash_index.top_k(rows, k, metric)
+	return calculate_recall(exact_scores, approximate_scores)
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Compare the recall@k and speed of MinHash/LSH settings against the exact similarity search")
+	parser.add_argument("--manga-data", default="manga.json", help="path of manga.json (default: manga.json)")
+	parser.add_argument("--permutations", type=int, nargs="+", default=[32, DEFAULT_NUM_PERMUTATIONS, 128], help="signature sizes to compare")
+	parser.add_argument("--bands", type=int, nargs="+", default=[16, DEFAULT_NUM_BANDS, 64], help="band counts to compare, only used where they divide the signature size")
+	parser.add_argument("--max-bucket-candidates", type=int, default=DEFAULT_MAX_BUCKET_CANDIDATES, help=f"candidates taken out of a bucket (default: {DEFAULT_MAX_BUCKET_CANDIDATES})")
+	parser.add_argument("--metric", choices=METRICS, default=METRIC_OVERLAP, help=f"similarity metric (default: {METRIC_OVERLAP})")
+	parser.add_argument("--k", type=int, default=10, help="number of similar mangas (default: 10)")
+	parser.add_argument("--sample", type=int, default=1000, help="number of mangas the recall is measured for (default: 1000)")
+	return parser.parse_args(argv)
+
+def main(argv=None):
+	args = parse_args(argv)
+	with open(args.manga_data, "r", encoding="utf-8") as f:
+		mangas = json.load(f)["mangas"]
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	rows = sample_rows(len(mangas), args.sample)
+
+	t1 = time.perf_counter()
+	_, _, exact_scores = calculate_top_k_similar(tag_matrix, tag_counts, k=args.k, rows=rows, metric=args.metric)
+	exact_ms = (time.perf_counter() - t1) * 1000 / max(1, len(rows))
+	print(f"{len(mangas)} mangas, recall@{args.k} of {len(rows)} sampled mangas, exact search {exact_ms:.3f} ms per manga")
+	print(f"{'permutations':>12} {'bands':>5} {'rows/band':>9} {'build s':>8} {'ms/manga':>8} {'recall':>7}")
+	for num_permutations in args.permutations:
+		for num_bands in args.bands:
+			if num_permutations % num_bands != 0:
+				continue
+			t1 = time.perf_counter()
+			minhash_index = MinHashIndex(tag_matrix, tag_counts, num_permutations, num_bands, args.max_bucket_candidates)
+			t2 = time.perf_counter()
+			_, _, approximate_scores = minhash_index.top_k(rows, args.k, args.metric)
+			t3 = time.perf_counter()
+			recall = calculate_recall(exact_scores, approximate_scores)
+			query_ms = (t3 - t2) * 1000 / max(1, len(rows))
+			print(f"{num_permutations:>12} {num_bands:>5} {num_permutations // num_bands:>9} {t2 - t1:>8.2f} {query_ms:>8.3f} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,21 @@
+import argparse
 import json
 import os
 import sys
 import csv
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
+from incremental import MANIFEST_FILE_NAME, create_manifest, save_manifest, load_previous_run, find_changed_mangas, find_affected_cells, find_affected_rows
+from artifacts import DEFAULT_DIRECTORY, SEARCH_INDEX_DIRECTORY, write_binary_data, write_search_index, load_preprocessed_data, load_manga_columns
+from data_versions import DEFAULT_KEEP_VERSIONS, create_version_name, create_temporary_directory, get_data_directory, publish_version, remove_old_versions, start_writing_json_files
+from similarity import SEARCH_DENSE, SEARCH_PRUNED, SEARCHES, build_tag_matrix, calculate_top_k_similar, format_similar_mangas
+from rollups import calculate_rollups
+from search_index import SearchIndex
+from minhash import DEFAULT_NUM_BANDS, DEFAULT_NUM_PERMUTATIONS, SEARCH_MINHASH, MinHashIndex, measure_recall, sample_rows
 
 def create_tag_id(tag):
 	# Tag Name: My super fancy tag
@@ -22,159 +35,413 @@ def calculate_similarity_score(manga_a, manga_b):
 	similarity_percentage = (100 / max_number_of_matching_elements) * number_of_matched_elements
 	return similarity_percentage / 100
 
-def main():
-	src_data_path = "data.csv" 
-	dest_data_path = "data_preprocessed.json" 
-	if not os.path.isfile(src_data_path):
-		print(f"Error could not find expected data file {src_data_path}!")
-		sys.exit(-1)
+TAG_BRACKETS_TRANSLATION = str.maketrans("", "", "[]")
 
-	# Load file	and clean up data
-	preprocessed_data = {
-		"tag_descriptions" : [],
-		"years": [],
-		"tags": []
-	}
+# Read only inputs of the sharded stages. They are handed to every worker once by the pool initializer
+# (with the fork start method they are simply inherited) so the shards itself only contain row ranges.
+worker_inputs = {}
 
+def init_worker(inputs):
+	worker_inputs.update(inputs)
 
-	mangas = []
-	tags = []
-	years = []
-	print("Starting Preprocessing")
-	print("Cleaning up manga data...")
-	with open(src_data_path, "r", encoding="utf-8") as f:
-		reader = csv.DictReader(f)
-		for index, line in enumerate(reader):
+def split_into_shards(num_elements, num_shards):
+	# Split range(num_elements) into at most num_shards contiguous (start, stop) ranges
+	num_shards = max(1, min(num_shards, num_elements))
+	shard_size, remainder = divmod(num_elements, num_shards)
+	shards = []
+	start = 0
+	for shard_index in range(num_shards):
+		stop = start + shard_size + (1 if shard_index < remainder else 0)
+		shards.append((start, stop))
+		start = stop
+	return shards
+
+def run_sharded(executor, function, num_elements, num_shards):
+	# Results are returned in shard order, concatenating them gives the same result as a single process run
+	if executor is None:
+		return [function((0, num_elements))]
+	return list(executor.map(function, split_into_shards(num_elements, num_shards)))
+
+@contextmanager
+def measure_stage(stage_name, stage_times):
+	start = time.perf_counter()
+	yield
+	stage_times[stage_name] = time.perf_counter() - start
+
+def parse_tags(tags_str):
+	# Tags is currently a string "['tag1', 'tag2']"
+	# We need to convert it into a list (we can simply split by ,)
+	current_tags = tags_str.translate(TAG_BRACKETS_TRANSLATION).split(',')
+	# Replace single quote character and remove any whitespace
+	return [t.strip().replace("'", "") for t in current_tags]
+
+def iter_mangas(src_data_path):
+	# Streams the cleaned up mangas of the csv file one row at a time
+	with open(src_data_path, "r", encoding="utf-8", newline="") as f:
+		reader = csv.reader(f)
+		header = next(reader, [])
+		columns = { column: position for position, column in enumerate(header) }
+		title_column, description_column, rating_column = columns["title"], columns["description"], columns["rating"]
+		year_column, cover_column, tags_column = columns["year"], columns["cover"], columns["tags"]
+		# Blank lines are skipped without counting them, the same way csv.DictReader does
+		for index, line in enumerate(line for line in reader if line != []):
 			# Only keep mangas with ratings and year
-			if line["rating"] == "" or line["year"] == "nan":
+			if line[rating_column] == "" or line[year_column] == "nan":
 				continue
 
-			# Tags is currently a string "['tag1', 'tag2']"
-			# We need to convert it into a list (we can simply split by ,)
-			tags_str = line["tags"]
-			current_tags = tags_str.replace('[', "").replace(']', "").split(',')
-			# Replace single quote character and remove any whitespace
-			current_tags = [t.strip().replace("'", "") for t in current_tags]
-
-
-			title = line["title"]
-			description = line["description"]
-			rating = float(line["rating"])
-			cover =  line["cover"]
-			year = int(line["year"])
-			years.append(year)
-			manga_obj = {
+			yield {
 				"id": index,
-				"title": title,
-				"description": description,
-				"rating": rating,
-				"year": year,
-				"cover": cover,
-				"tags":  current_tags
+				"title": line[title_column],
+				"description": line[description_column],
+				"rating": float(line[rating_column]),
+				"year": int(line[year_column]),
+				"cover": line[cover_column],
+				"tags": parse_tags(line[tags_column])
 			}
-			mangas.append(manga_obj)
 
-			# Only add tags which do not exist already
-			new_tags = [t for t in current_tags if t not in tags]
-			new_tag_descriptions = [{ "tag_id": create_tag_id(t), "tag_description": t } for t in new_tags ]
-			tags = tags + new_tags
-			preprocessed_data["tag_descriptions"] = preprocessed_data["tag_descriptions"] + new_tag_descriptions
+def read_mangas(src_data_path):
+	# Load file	and clean up data.
+	# Tags are interned, every manga references the same string instance of a tag and each tag
+	# gets an integer id in the order it was seen first.
+	mangas = []
+	tag_ids = {}
+	tag_names = []
+	years = set()
+	for manga in iter_mangas(src_data_path):
+		current_tags = manga["tags"]
+		for position, tag in enumerate(current_tags):
+			tag_id = tag_ids.get(tag)
+			if tag_id is None:
+				tag_id = len(tag_names)
+				tag_ids[tag] = tag_id
+				tag_names.append(tag)
+			current_tags[position] = tag_names[tag_id]
+		years.add(manga["year"])
+		mangas.append(manga)
+
+	tag_descriptions = [{ "tag_id": create_tag_id(t), "tag_description": t } for t in tag_names]
 
 	# Make years unique
-	years = list(set(years))
-	years.sort(reverse=True)
-	preprocessed_data["years"] = years
+	years = sorted(years, reverse=True)
+	return mangas, tag_descriptions, years, tag_ids
 
-	preprocessed_data["top_ratings"] = []
+def explode_tags(manga_df):
+	# One row per manga and tag, the mangas keep their original order.
+	# A manga only counts once per tag even if the tag is listed twice.
+	exploded_df = manga_df[["id", "title", "rating", "year", "tags"]].explode("tags").rename(columns={"tags": "tag"})
+	exploded_df = exploded_df.reset_index(names="position").drop_duplicates(subset=["position", "tag"])
+	return exploded_df.drop(columns="position").reset_index(drop=True)
 
+def calculate_tag_statistics(exploded_df, tag_descriptions, years):
+	# Calculate number of mangas, average rating and top rated manga for each tag and year.
+	# Returns the statistic per tag and year, the top ratings and the overall number of mangas per tag.
+	current_tags = [t["tag_description"] for t in tag_descriptions]
+	tag_df = exploded_df[exploded_df["tag"].isin(current_tags)]
+	grouped = tag_df.groupby(["tag", "year"], sort=False)
+	statistics = grouped["rating"].agg(number_of_mangas="size", top_rating_index="idxmax").to_dict("index")
 
-	# Initialize dataframe in order to easily calculate some values for each tag such as average score per year etc.
-	manga_df = pd.DataFrame.from_dict(mangas)
-	print("Precalculating statistical values ...")
-	for tag_description in preprocessed_data["tag_descriptions"]:
+	# The average rating is summed up per group in the original row order, this way it is
+	# exactly the same float Series.mean() of the filtered mangas would return
+	tag_rating_values = tag_df["rating"].to_numpy()
+	average_ratings = { key: tag_rating_values[positions].sum() / len(positions) for key, positions in grouped.indices.items() }
+
+	# idxmax returns labels of exploded_df which are the same as the positions
+	rating_values = exploded_df["rating"].to_numpy()
+	id_values = exploded_df["id"].to_numpy()
+	title_values = exploded_df["title"].to_numpy()
+	tags = []
+	top_ratings = []
+	num_mangas_totals = []
+	for tag_description in tag_descriptions:
 		current_tag_id = tag_description["tag_id"]
 		current_tag = tag_description["tag_description"]
 		num_mangas_total = 0
-		for year in preprocessed_data["years"]:
-			# Filter by year and specific tag
-			filtered_df = manga_df[(manga_df["year"] == year)]
-			filtered_df = filtered_df[filtered_df["tags"].apply(lambda x: current_tag in x)]
-			num_elements = len(filtered_df)
-			avg_rating = None 
-			if num_elements > 0:
-				# Debug Purpose
-				# print(f"Searching for Tag {current_tag} for Year {year} and found {num_elements} results")
-				avg_rating = filtered_df["rating"].mean()
-
-			tag_data_per_year = {
+		for year in years:
+			num_elements = 0
+			avg_rating = None
+			statistic = statistics.get((current_tag, year))
+			if statistic is not None:
+				num_elements = int(statistic["number_of_mangas"])
+				avg_rating = average_ratings[(current_tag, year)]
+
+				# Top rated manga, the first one wins if multiple mangas have the same rating
+				top_rating_index = statistic["top_rating_index"]
+				top_ratings.append({
+					"tag_id": current_tag_id,
+					"manga_id": int(id_values[top_rating_index]),
+					"rating": float(rating_values[top_rating_index]),
+					"title": title_values[top_rating_index],
+					"year": year
+				})
+
+			tags.append({
 				"tag_id": current_tag_id,
 				"year": year,
 				"average_rating" : avg_rating,
 				"number_of_mangas": num_elements,
-			}
-
+			})
 
 			# Keep track of number of mangas total overall.
 			num_mangas_total = num_mangas_total + num_elements
 
-			# Add ids of mangas
-			ratings = []
-			for index, row in filtered_df.iterrows():
-				rating = row["rating"]
-				id = row["id"]
-				title = row["title"]
-				rating = {
-					"tag_id": current_tag_id,
-					"manga_id": id,
-					"rating": rating,
-					"title": title,
-					"year": year
-				}
-				ratings.append(rating)
+		num_mangas_totals.append(num_mangas_total)
+	return tags, top_ratings, num_mangas_totals
+
+def merge_tag_statistics(exploded_df, tag_descriptions, years, affected_cells, previous_preprocessed_data):
+	# Only recalculate the affected (tag, year) cells, all the other cells are taken over from the previous run
+	affected_tags = { tag for tag, _ in affected_cells }
+	affected_tag_descriptions = [t for t in tag_descriptions if t["tag_description"] in affected_tags]
+	in_affected_cell = pd.MultiIndex.from_arrays([exploded_df["tag"], exploded_df["year"]]).isin(list(affected_cells))
+	changed_tags, changed_top_ratings, _ = calculate_tag_statistics(exploded_df[in_affected_cell].reset_index(drop=True), affected_tag_descriptions, years)
+
+	affected_cell_ids = { (create_tag_id(tag), year) for tag, year in affected_cells }
+	changed_statistics = ({ (t["tag_id"], t["year"]): t for t in changed_tags }, { (t["tag_id"], t["year"]): t for t in changed_top_ratings })
+	previous_statistics = (
+		{ (t["tag_id"], t["year"]): t for t in previous_preprocessed_data["tags"] },
+		{ (t["tag_id"], t["year"]): t for t in previous_preprocessed_data["top_ratings"] }
+	)
 
-			# Find Top Ratings
-			sorted_ratings = sorted(ratings, key=lambda d: d['rating'], reverse=True)
-			if (len(sorted_ratings) > 0):
-				preprocessed_data["top_ratings"].append(sorted_ratings[0]) 
-			preprocessed_data["tags"].append(tag_data_per_year)
+	tags = []
+	top_ratings = []
+	num_mangas_totals = []
+	for tag_description in tag_descriptions:
+		num_mangas_total = 0
+		for year in years:
+			key = (tag_description["tag_id"], year)
+			tag_statistics, top_rating_statistics = changed_statistics if key in affected_cell_ids else previous_statistics
+			tag_data_per_year = tag_statistics.get(key, {
+				"tag_id": tag_description["tag_id"],
+				"year": year,
+				"average_rating" : None,
+				"number_of_mangas": 0,
+			})
+			tags.append(tag_data_per_year)
+			if key in top_rating_statistics:
+				top_ratings.append(top_rating_statistics[key])
+			num_mangas_total = num_mangas_total + tag_data_per_year["number_of_mangas"]
+		num_mangas_totals.append(num_mangas_total)
+	return tags, top_ratings, num_mangas_totals
+
+def calculate_tag_statistics_shard(shard):
+	start, stop = shard
+	return calculate_tag_statistics(worker_inputs["exploded_df"], worker_inputs["tag_descriptions"][start:stop], worker_inputs["years"])
+
+def calculate_similarity_shard(rows):
+	if worker_inputs["similarity_search"] == SEARCH_MINHASH:
+		return worker_inputs["minhash_index"].top_k(rows, k=worker_inputs["k"])
+	return calculate_top_k_similar(worker_inputs["tag_matrix"], worker_inputs["tag_counts"], k=worker_inputs["k"], rows=rows, search=worker_inputs["similarity_search"])
+
+def create_executor(num_workers, inputs):
+	if num_workers <= 1:
+		init_worker(inputs)
+		return None
+	# Prefer fork on linux so the workers share the inputs with the parent process instead of unpickling them
+	mp_context = multiprocessing.get_context("fork") if sys.platform.startswith("linux") else None
+	return ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context, initializer=init_worker, initargs=(inputs,))
+
+def preprocess(mangas, tag_descriptions, years, exploded_df, executor, num_shards, stage_times, previous_run=None):
+	# Calculates the content of data_preprocessed.json and manga.json.
+	# If the previous run is given only the parts affected by changed mangas are recalculated.
+	# Tag descriptions are copied and mangas are not modified so the function can be called multiple times.
+	tag_descriptions = [dict(t) for t in tag_descriptions]
+	preprocessed_data = {
+		"tag_descriptions" : tag_descriptions,
+		"years": years,
+		"tags": [],
+		"top_ratings": [],
+		"tag_rollups": []
+	}
+
+	changed_ids = None
+	if previous_run is not None:
+		previous_manifest, previous_preprocessed_data, previous_manga_data = previous_run
+		added, removed, changed = find_changed_mangas(previous_manifest, create_manifest(mangas))
+		changed_ids = added + removed + changed
+		print(f"Found {len(added)} added, {len(removed)} removed and {len(changed)} changed mangas")
+		previous_mangas_by_id = { manga["id"]: manga for manga in previous_manga_data["mangas"] }
+		mangas_by_id = { manga["id"]: manga for manga in mangas }
+
+	print("Precalculating statistical values ...")
+	with measure_stage("tag_statistics", stage_times):
+		# Previous statistics can only be matched if the tag ids are unique
+		tag_ids_are_unique = len({ t["tag_id"] for t in tag_descriptions }) == len(tag_descriptions)
+		if changed_ids is not None and tag_ids_are_unique:
+			affected_cells = find_affected_cells(changed_ids, previous_mangas_by_id, mangas_by_id)
+			print(f"Recalculating {len(affected_cells)} (tag, year) cells")
+			preprocessed_data["tags"], preprocessed_data["top_ratings"], num_mangas_totals = merge_tag_statistics(exploded_df, tag_descriptions, years, affected_cells, previous_preprocessed_data)
+		else:
+			num_mangas_totals = []
+			for shard_tags, shard_top_ratings, shard_num_mangas_totals in run_sharded(executor, calculate_tag_statistics_shard, len(tag_descriptions), num_shards):
+				preprocessed_data["tags"].extend(shard_tags)
+				preprocessed_data["top_ratings"].extend(shard_top_ratings)
+				num_mangas_totals.extend(shard_num_mangas_totals)
 
 		# Add overall number of mangas total to tag_description
-		tag_description["num_mangas_total"] = num_mangas_total
+		for tag_description, num_mangas_total in zip(tag_descriptions, num_mangas_totals):
+			tag_description["num_mangas_total"] = num_mangas_total
+
+		# Sort tag description by num_mangas_total
+		sorted_tag_descriptions = sorted(preprocessed_data["tag_descriptions"], key=lambda d: d['num_mangas_total'], reverse=True)
+		preprocessed_data["tag_descriptions"] = sorted_tag_descriptions
 
-	# Sort tag description by num_mangas_total
-	sorted_tag_descriptions = sorted(preprocessed_data["tag_descriptions"], key=lambda d: d['num_mangas_total'], reverse=True)
-	preprocessed_data["tag_descriptions"] = sorted_tag_descriptions
+		# Statistics per 5 years and per decade for wide selections, see rollups.py
+		preprocessed_data["tag_rollups"] = calculate_rollups(preprocessed_data["tags"])
 
 	# Calculate similarty rating between mangas
-	print("Calculating similarity ratings between mangas (grab a coffee this might take a while) ...")
-	for index, manga in enumerate(mangas):
-		similar_mangas = []
-		# Go trough each manga again and calcualte how similar those are to the current one
-		for compare_manga in mangas:
-			similar_manga = {
-				"id": compare_manga["id"],
-				"title": compare_manga["title"],
-				"similarity_score":  calculate_similarity_score(manga, compare_manga)
-			}
-			similar_mangas.append(similar_manga)
+	print("Calculating similarity ratings between mangas ...")
+	with measure_stage("similarity", stage_times):
+		if changed_ids is not None:
+			rows = np.asarray(find_affected_rows(changed_ids, previous_mangas_by_id, mangas), dtype=np.int64)
+			print(f"Recalculating similar mangas of {len(rows)} mangas")
+		else:
+			rows = np.arange(len(mangas))
+
+		similar_mangas = {}
+		shards = np.array_split(rows, max(1, min(num_shards, len(rows))))
+		results = map(calculate_similarity_shard, shards) if executor is None else executor.map(calculate_similarity_shard, shards)
+		for shard_rows, (columns, matching_counts, scores) in zip(shards, results):
+			similar_mangas.update(zip(shard_rows.tolist(), format_similar_mangas(mangas, columns, matching_counts, scores)))
+
+		manga_data = {
+			"mangas": []
+		}
+		for position, manga in enumerate(mangas):
+			if position in similar_mangas:
+				most_similar_mangas = similar_mangas[position]
+			else:
+				most_similar_mangas = previous_mangas_by_id[manga["id"]]["similar_mangas"]
+			manga_data["mangas"].append({ **manga, "similar_mangas": most_similar_mangas })
+	return preprocessed_data, manga_data
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Preprocess the Anime Planet manga dataset for the Manhuag Explorer")
+	parser.add_argument("--data", default="data.csv", help="path of the source csv file (default: data.csv)")
+	parser.add_argument("--output-dir", default=".", help="directory whose data_versions/ receives the output of the run (default: .)")
+	parser.add_argument("--keep-versions", type=int, default=DEFAULT_KEEP_VERSIONS, help=f"number of versions kept in data_versions/ including the new one (default: {DEFAULT_KEEP_VERSIONS})")
+	parser.add_argument("--workers", type=int, default=1, help="number of worker processes, 0 uses all cores (default: 1)")
+	parser.add_argument("--format", choices=["json", "binary", "both"], default="both", help=f"write json files, the memory mappable binary data in {DEFAULT_DIRECTORY}/ or both (default: both)")
+	parser.add_argument("--incremental", action="store_true", help="only recalculate what changed since the last run in the output directory")
+	parser.add_argument("--verify", action="store_true", help="check the incremental result against a full rebuild")
+	parser.add_argument("--similarity-search", choices=SEARCHES + (SEARCH_MINHASH,), default=SEARCH_DENSE, help=f"compare every manga with all others ({SEARCH_DENSE}) or only with the mangas sharing a tag ({SEARCH_PRUNED}), the result is the same. {SEARCH_MINHASH} is approximate and only compares mangas with similar tags, for very large catalogs (default: {SEARCH_DENSE})")
+	parser.add_argument("--minhash-permutations", type=int, default=DEFAULT_NUM_PERMUTATIONS, help=f"signature size of the {SEARCH_MINHASH} search (default: {DEFAULT_NUM_PERMUTATIONS})")
+	parser.add_argument("--minhash-bands", type=int, default=DEFAULT_NUM_BANDS, help=f"number of bands the signature is split into, more bands find more similar mangas but take longer (default: {DEFAULT_NUM_BANDS})")
+	parser.add_argument("--recall-sample", type=int, default=1000, help=f"number of mangas the recall@10 of the {SEARCH_MINHASH} search is measured for against the exact search, 0 disables it (default: 1000)")
+	args = parser.parse_args(argv)
+	if args.minhash_bands <= 0 or args.minhash_permutations % args.minhash_bands != 0:
+		parser.error("--minhash-permutations has to be a multiple of --minhash-bands")
+	return args
+
+def validate_binary_data(directory, preprocessed_data, manga_data):
+	# The written columns are read back before the version is published
+	binary_preprocessed_data = load_preprocessed_data(directory)
+	manga_columns = load_manga_columns(directory)
+	if len(binary_preprocessed_data["tags"]["year"]) != len(preprocessed_data["tags"]) or len(binary_preprocessed_data["top_ratings"]["year"]) != len(preprocessed_data["top_ratings"]) or len(manga_columns["id"]) != len(manga_data["mangas"]):
+		raise ValueError(f"{directory} does not contain the written data")
 
-		# Only keep top 10 results
-		most_similar_mangas = sorted(similar_mangas, key=lambda d: d['similarity_score'], reverse=True)[0:10]
-		manga["similar_mangas"] = most_similar_mangas 
+def main(argv=None):
+	args = parse_args(argv)
+	src_data_path = args.data
+	num_workers = args.workers if args.workers > 0 else os.cpu_count()
+	if not os.path.isfile(src_data_path):
+		print(f"Error could not find expected data file {src_data_path}!")
+		sys.exit(-1)
+
+	stage_times = {}
 
-	# Save preprocessed data file
-	with open(dest_data_path, 'w', encoding='utf-8') as f:
-		json.dump(preprocessed_data, f, indent=4)
+	print(f"Starting Preprocessing with {num_workers} worker(s)")
+	print("Cleaning up manga data...")
+	with measure_stage("read", stage_times):
+		mangas, tag_descriptions, years, tag_ids = read_mangas(src_data_path)
+
+		# Initialize dataframe in order to easily calculate some values for each tag such as average score per year etc.
+		manga_df = pd.DataFrame.from_dict(mangas)
+		exploded_df = explode_tags(manga_df)
+		tag_matrix, tag_counts = build_tag_matrix(mangas, tag_ids)
 
-	# Save cleaned up version of mangas
-	manga_data = {
-		"mangas": mangas
+		previous_run = None
+		if args.incremental:
+			previous_run = load_previous_run(get_data_directory(args.output_dir))
+			if previous_run is None:
+				print("No previous run found, doing a full rebuild")
+
+	inputs = {
+		"exploded_df": exploded_df,
+		"tag_descriptions": tag_descriptions,
+		"years": years,
+		"tag_matrix": tag_matrix,
+		"tag_counts": tag_counts,
+		"k": 10,
+		"similarity_search": args.similarity_search
 	}
-	cleaned_manga_data_path = "manga.json"
-	with open("manga.json", 'w', encoding='utf-8') as f:
-		json.dump(manga_data, f, indent=4)
-	print(f"Finished processing, generated: {cleaned_manga_data_path} and {dest_data_path}")
+	if args.similarity_search == SEARCH_MINHASH:
+		with measure_stage("minhash_index", stage_times):
+			inputs["minhash_index"] = MinHashIndex(tag_matrix, tag_counts, args.minhash_permutations, args.minhash_bands)
+
+	# Use more shards than workers so that slow shards do not keep the other workers idle
+	num_shards = num_workers * 4
+	executor = create_executor(num_workers, inputs)
+	try:
+		preprocessed_data, manga_data = preprocess(mangas, tag_descriptions, years, exploded_df, executor, num_shards, stage_times, previous_run)
+
+		if args.verify:
+			print("Verifying result against a full rebuild ...")
+			with measure_stage("verify", stage_times):
+				full_preprocessed_data, full_manga_data = preprocess(mangas, tag_descriptions, years, exploded_df, executor, num_shards, {})
+				if json.dumps(preprocessed_data) != json.dumps(full_preprocessed_data) or json.dumps(manga_data) != json.dumps(full_manga_data):
+					print("Error result does not match a full rebuild, nothing was written!")
+					sys.exit(-1)
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+	if args.similarity_search == SEARCH_MINHASH and args.recall_sample > 0:
+		with measure_stage("recall", stage_times):
+			rows = sample_rows(len(mangas), args.recall_sample)
+			recall = measure_recall(inputs["minhash_index"], rows, k=inputs["k"])
+		print(f"recall@{inputs['k']} of the {SEARCH_MINHASH} search for {len(rows)} sampled mangas: {recall:.3f}")
+
+	# Full text search over titles, tags and descriptions, always built from all mangas
+	print("Building search index ...")
+	with measure_stage("search_index", stage_times):
+		search_index = SearchIndex.from_mangas(manga_data["mangas"])
+
+	# Everything is written into a temporary directory which becomes the current version once it is complete, see data_versions.py
+	version = create_version_name()
+	version_path = create_temporary_directory(args.output_dir, version)
+	generated_names = []
+	with measure_stage("write", stage_times):
+		try:
+			wait_for_json_files = lambda: None
+			if args.format in ("json", "both"):
+				# The preprocessed data and the cleaned up version of mangas are saved in the background while the other files are written
+				wait_for_json_files = start_writing_json_files({
+					os.path.join(version_path, "data_preprocessed.json"): preprocessed_data,
+					os.path.join(version_path, "manga.json"): manga_data,
+				})
+				generated_names.extend(["manga.json", "data_preprocessed.json"])
+
+			if args.format in ("binary", "both"):
+				binary_data_path = os.path.join(version_path, DEFAULT_DIRECTORY)
+				write_binary_data(binary_data_path, preprocessed_data, manga_data)
+				validate_binary_data(binary_data_path, preprocessed_data, manga_data)
+				generated_names.append(DEFAULT_DIRECTORY)
+
+			write_search_index(os.path.join(version_path, SEARCH_INDEX_DIRECTORY), search_index.to_columns())
+			generated_names.append(SEARCH_INDEX_DIRECTORY)
+
+			save_manifest(os.path.join(version_path, MANIFEST_FILE_NAME), create_manifest(mangas))
+			wait_for_json_files()
+		except (OSError, ValueError) as e:
+			print(f"Error writing the output failed, the current version was not changed: {e}")
+			sys.exit(-1)
+		publish_version(args.output_dir, version, version_path)
+		removed_versions = remove_old_versions(args.output_dir, args.keep_versions)
+	print(f"Finished processing, published version {version} in {os.path.dirname(version_path)} with: {' and '.join(generated_names)}")
+	if len(removed_versions) > 0:
+		print(f"Removed old versions: {', '.join(removed_versions)}")
+	for stage_name, stage_time in stage_times.items():
+		print(f"{stage_name:>16}: {stage_time:8.2f}s")
 
 
 if __name__ == "__main__":
-    main()
+	main()
@@ -0,0 +1,47 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from flask import g, request
+from metrics import DASH_UPDATE_PATH
+
+# Opt-in cProfile of single callback requests, installed by main.py if PROFILE_REQUESTS=1.
+# A request is profiled if it has the header "X-Profile: 1" or otherwise with the probability PROFILE_SAMPLE_RATE.
+# The profiles are written to PROFILE_DIR as <time>-<callback>.prof, open them with pstats or snakeviz.
+# Only one request per process is profiled at a time, the others run as usual.
+
+PROFILE_HEADER = "X-Profile"
+
+class RequestProfiler:
+    def __init__(self, directory, sample_rate=0.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+
+    def should_profile(self):
+        if not request.path.endswith(DASH_UPDATE_PATH):
+            return False
+        return request.headers.get(PROFILE_HEADER) == "1" or random.random() < self.sample_rate
+
+    def before_request(self):
+        if self.should_profile() and self._lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def after_request(self, response):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            try:
+                profiler.disable()
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{g.get('callback_name', 'unknown')}.prof")
+                profiler.dump_stats(path)
+                print(f"Wrote profile of {request.path} to {path}")
+            finally:
+                self._lock.release()
+        return response
+
+    def install(self, server):
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
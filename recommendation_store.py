@@ -0,0 +1,74 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Local store of the Jikan recommendations per manga title, written by enrichment.py and read by main.py.
+# A title is either "found" (with its MyAnimeList id and recommendations), "not_found" if Jikan does not
+# know the title or "error" if the requests failed. Errors are retried by the next enrichment run.
+DEFAULT_STORE_PATH = "jikan_recommendations.sqlite"
+
+STATUS_FOUND = "found"
+STATUS_NOT_FOUND = "not_found"
+STATUS_ERROR = "error"
+
+class RecommendationStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, read_only=True):
+        self.path = path
+        self.read_only = read_only
+        # sqlite connections can not be shared between threads and forked processes, every thread opens
+        # its own connection on first use. A forked process (such as the job of a background callback)
+        # inherits the connection of the forking thread and opens a new one, see _connect.
+        self._local = threading.local()
+        if not read_only:
+            with self._connect() as connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS recommendations (
+                        title TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        mal_id INTEGER,
+                        recommendations TEXT NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            if self.read_only:
+                connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            else:
+                connection = sqlite3.connect(self.path)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def get(self, title):
+        # Returns the list of (title, url) recommendations or None if the title was not enriched (successfully)
+        if not self.exists():
+            return None
+        row = self._connect().execute(
+            "SELECT status, recommendations FROM recommendations WHERE title = ?", (title,)
+        ).fetchone()
+        if row is None or row[0] == STATUS_ERROR:
+            return None
+        return [tuple(r) for r in json.loads(row[1])]
+
+    def get_completed_titles(self):
+        rows = self._connect().execute("SELECT title FROM recommendations WHERE status != ?", (STATUS_ERROR,))
+        return { row[0] for row in rows }
+
+    def put(self, title, status, mal_id=None, recommendations=()):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO recommendations (title, status, mal_id, recommendations, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (title, status, mal_id, json.dumps([list(r) for r in recommendations]), time.time())
+            )
+
+    def count_by_status(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM recommendations GROUP BY status")
+        return dict(rows.fetchall())
@@ -0,0 +1,54 @@
+# Tag statistics summed up over several years, written by preprocessing.py next to the statistics per year.
+# Many tags over a wide year range produce thousands of points per chart. main.py then switches to
+# coarser buckets so the number of points (and the size of the figures) stays bounded.
+
+ROLLUP_YEARS_PER_BUCKET = (5, 10)
+DEFAULT_MAX_POINTS = 1000
+
+def get_bucket_start(year, years_per_bucket):
+	# Buckets start at multiples of years_per_bucket, e.g. 1990-1999 for decades
+	return year // years_per_bucket * years_per_bucket
+
+def get_partial_bucket_starts(min_year, max_year, years_per_bucket, first_year, last_year):
+	# Starts of the buckets at the edges of the year range which are only partly inside of it.
+	# The years before first_year and after last_year have no data and do not make a bucket partial.
+	partial_bucket_starts = set()
+	if min_year > max(get_bucket_start(min_year, years_per_bucket), first_year):
+		partial_bucket_starts.add(get_bucket_start(min_year, years_per_bucket))
+	if max_year < min(get_bucket_start(max_year, years_per_bucket) + years_per_bucket - 1, last_year):
+		partial_bucket_starts.add(get_bucket_start(max_year, years_per_bucket))
+	return partial_bucket_starts
+
+def count_buckets(min_year, max_year, years_per_bucket):
+	return max_year // years_per_bucket - min_year // years_per_bucket + 1
+
+def calculate_rollup(tags, years_per_bucket):
+	# Sums up the statistics per tag and year (the "tags" of data_preprocessed.json) into buckets of years.
+	# The average rating of a bucket is the mean of its years weighted by their number of mangas,
+	# this is the average rating of all mangas of the bucket. The rows keep the order of tags.
+	buckets = {}
+	for row in tags:
+		key = (row["tag_id"], get_bucket_start(row["year"], years_per_bucket))
+		number_of_mangas, rating_sum = buckets.get(key, (0, 0.0))
+		if row["number_of_mangas"] > 0:
+			number_of_mangas += row["number_of_mangas"]
+			rating_sum += row["average_rating"] * row["number_of_mangas"]
+		buckets[key] = (number_of_mangas, rating_sum)
+
+	return [{
+		"tag_id": tag_id,
+		"year": bucket_start,
+		"average_rating": rating_sum / number_of_mangas if number_of_mangas > 0 else None,
+		"number_of_mangas": number_of_mangas,
+	} for (tag_id, bucket_start), (number_of_mangas, rating_sum) in buckets.items()]
+
+def calculate_rollups(tags):
+	return [{ "years_per_bucket": years_per_bucket, "tags": calculate_rollup(tags, years_per_bucket) } for years_per_bucket in ROLLUP_YEARS_PER_BUCKET]
+
+def choose_years_per_bucket(num_tags, min_year, max_year, available_years_per_bucket, max_points=DEFAULT_MAX_POINTS):
+	# The finest resolution where the selected tags and years give at most max_points points,
+	# the coarsest one if even that gives more
+	for years_per_bucket in sorted(available_years_per_bucket):
+		if num_tags * count_buckets(min_year, max_year, years_per_bucket) <= max_points:
+			return years_per_bucket
+	return max(available_years_per_bucket)
@@ -0,0 +1,139 @@
+import re
+from bisect import bisect_left
+import numpy as np
+
+# Full text search over the titles, tags and descriptions of the mangas, built by preprocessing.py
+# and queried by the search box of main.py.
+# The index maps every term to its postings (the positions of the mangas containing it) together with
+# the BM25 score of the term in that manga, which is calculated when the index is built. A query only
+# sums up the postings of its terms. The terms are sorted, this way the last term of a query is also
+# matched as prefix of longer terms with a binary search while the user is still typing.
+
+# A term in the title counts as much as three in the description
+FIELD_WEIGHTS = (("title", 3), ("tags", 2), ("description", 1))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# The prefix of the last term is expanded to the most common matching terms only
+MAX_PREFIX_TERMS = 16
+PREFIX_MATCH_WEIGHT = 0.8
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text):
+	return TOKEN_PATTERN.findall(text.casefold())
+
+def get_field_texts(manga, field):
+	return manga["tags"] if field == "tags" else [manga[field]]
+
+def calculate_bm25_scores(term_frequencies, document_frequencies, document_lengths, num_documents, average_length, k1=BM25_K1, b=BM25_B):
+	# document_lengths are the lengths of the documents of the postings, average_length the one of all documents
+	idf = np.log(1 + (num_documents - document_frequencies + 0.5) / (document_frequencies + 0.5))
+	return idf * term_frequencies * (k1 + 1) / (term_frequencies + k1 * (1 - b + b * document_lengths / average_length))
+
+class SearchIndex:
+	# terms is a sorted sequence of strings (a list or a string table of the binary data),
+	# the postings of the term i are positions[offsets[i]:offsets[i + 1]] with their scores.
+	# positions refer to manga_ids.
+	def __init__(self, terms, offsets, positions, scores, manga_ids):
+		self.terms = terms
+		self.offsets = np.asarray(offsets, dtype=np.int64)
+		self.positions = np.asarray(positions, dtype=np.int32)
+		self.scores = np.asarray(scores, dtype=np.float32)
+		self.manga_ids = np.asarray(manga_ids, dtype=np.int64)
+
+	@classmethod
+	def from_mangas(cls, mangas):
+		# Weighted term frequencies per manga, the fields are weighted by FIELD_WEIGHTS
+		term_ids = {}
+		posting_terms = []
+		posting_positions = []
+		posting_frequencies = []
+		document_lengths = np.zeros(len(mangas), dtype=np.float64)
+		for position, manga in enumerate(mangas):
+			frequencies = {}
+			for field, field_weight in FIELD_WEIGHTS:
+				for text in get_field_texts(manga, field):
+					for token in tokenize(text):
+						frequencies[token] = frequencies.get(token, 0) + field_weight
+						document_lengths[position] += field_weight
+			for token, frequency in frequencies.items():
+				posting_terms.append(term_ids.setdefault(token, len(term_ids)))
+				posting_positions.append(position)
+				posting_frequencies.append(frequency)
+
+		# Renumber the terms in sorted order and group the postings by term
+		terms = sorted(term_ids)
+		sorted_term_ids = np.empty(len(terms), dtype=np.int64)
+		sorted_term_ids[[term_ids[term] for term in terms]] = np.arange(len(terms))
+		posting_terms = sorted_term_ids[np.asarray(posting_terms, dtype=np.int64)]
+		posting_positions = np.asarray(posting_positions, dtype=np.int64)
+		order = np.lexsort((posting_positions, posting_terms))
+		posting_terms = posting_terms[order]
+		posting_positions = posting_positions[order]
+		posting_frequencies = np.asarray(posting_frequencies, dtype=np.float64)[order]
+
+		document_frequencies = np.bincount(posting_terms, minlength=len(terms))
+		offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+		np.cumsum(document_frequencies, out=offsets[1:])
+		average_length = max(document_lengths.mean(), 1) if len(mangas) > 0 else 1
+		scores = calculate_bm25_scores(posting_frequencies, document_frequencies[posting_terms], document_lengths[posting_positions], len(mangas), average_length)
+		return cls(terms, offsets, posting_positions, scores, [m["id"] for m in mangas])
+
+	@classmethod
+	def from_columns(cls, columns):
+		# Create the index out of the columns written by artifacts.write_search_index
+		return cls(columns["terms"], columns["offsets"], columns["positions"], columns["scores"], columns["manga_ids"])
+
+	def to_columns(self):
+		return {
+			"terms": self.terms,
+			"offsets": self.offsets,
+			"positions": self.positions,
+			"scores": self.scores,
+			"manga_ids": self.manga_ids,
+		}
+
+	def find_prefix_terms(self, prefix):
+		# Positions of the terms starting with prefix, the term equal to prefix (if any) is the first one
+		start = bisect_left(self.terms, prefix)
+		stop = bisect_left(self.terms, prefix + "\U0010ffff", lo=start)
+		return start, stop
+
+	def add_term_scores(self, term_scores, term, weight):
+		start, stop = self.offsets[term], self.offsets[term + 1]
+		positions = self.positions[start:stop]
+		# A manga matching several terms of the same prefix keeps the best one
+		term_scores[positions] = np.maximum(term_scores[positions], self.scores[start:stop] * weight)
+
+	def search(self, query, k=10):
+		# Returns the manga ids and scores of the k best matches, best first.
+		# Mangas matching more terms of the query are ranked before mangas matching fewer.
+		tokens = list(dict.fromkeys(tokenize(query)))
+		total_scores = np.zeros(len(self.manga_ids), dtype=np.float64)
+		matched_tokens = np.zeros(len(self.manga_ids), dtype=np.int64)
+		for token_index, token in enumerate(tokens):
+			term_scores = np.zeros(len(self.manga_ids), dtype=np.float32)
+			start, stop = self.find_prefix_terms(token)
+			if start < stop and self.terms[start] == token:
+				self.add_term_scores(term_scores, start, 1.0)
+				start += 1
+			if token_index == len(tokens) - 1 and start < stop:
+				prefix_terms = np.arange(start, stop)
+				if len(prefix_terms) > MAX_PREFIX_TERMS:
+					document_frequencies = np.diff(self.offsets[start:stop + 1])
+					prefix_terms = prefix_terms[np.argpartition(-document_frequencies, MAX_PREFIX_TERMS)[:MAX_PREFIX_TERMS]]
+				for term in prefix_terms:
+					self.add_term_scores(term_scores, term, PREFIX_MATCH_WEIGHT)
+			total_scores += term_scores
+			matched_tokens += term_scores > 0
+
+		candidates = np.flatnonzero(matched_tokens)
+		if k <= 0 or len(candidates) == 0:
+			return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+		# The number of matched tokens first, the score second
+		ranks = matched_tokens[candidates] * (total_scores[candidates].max() + 1) + total_scores[candidates]
+		if len(candidates) > k:
+			top = np.argpartition(-ranks, k - 1)[:k]
+		else:
+			top = np.arange(len(candidates))
+		top = top[np.lexsort((candidates[top], -ranks[top]))]
+		return self.manga_ids[candidates[top]], total_scores[candidates[top]]
@@ -0,0 +1,407 @@
+import numpy as np
+from scipy import sparse
+
+# Upper bound for the dense score block that is materialized at once.
+# Every cell of a block needs the intersection count, the score and a few masks.
+DEFAULT_MAX_BLOCK_BYTES = 256 * 1024 * 1024
+BYTES_PER_BLOCK_CELL = 32
+
+# Share of the tags of a manga the other manga has as well, same as preprocessing.calculate_similarity_score
+METRIC_OVERLAP = "overlap"
+# Number of shared tags divided by the number of tags of both mangas together
+METRIC_JACCARD = "jaccard"
+# Like overlap but every tag is weighted by its inverse document frequency, sharing a rare tag counts more
+METRIC_IDF = "idf"
+METRICS = (METRIC_OVERLAP, METRIC_JACCARD, METRIC_IDF)
+
+# Scores a block of mangas against all mangas at once, the default
+SEARCH_DENSE = "dense"
+# Only visits the mangas sharing a tag per manga (see search_top_k). Slower than dense for whole catalogs,
+# popular tags are shared by most mangas and the loop per manga costs more than the pruning saves.
+SEARCH_PRUNED = "pruned"
+SEARCHES = (SEARCH_DENSE, SEARCH_PRUNED)
+
+def build_tag_matrix(mangas, tag_ids=None):
+	# Encode the tags of every manga as a row of a binary manga x tag matrix.
+	# Returns the matrix (CSR) together with the number of tags per manga, which
+	# is the denominator of the similarity score (duplicates included, like calculate_similarity_score).
+	# Already interned tag ids can be passed in, unknown tags get the next free id.
+	tag_ids = {} if tag_ids is None else dict(tag_ids)
+	indptr = [0]
+	indices = []
+	tag_counts = np.empty(len(mangas), dtype=np.int64)
+	for position, manga in enumerate(mangas):
+		row = set()
+		for tag in manga["tags"]:
+			row.add(tag_ids.setdefault(tag, len(tag_ids)))
+		indices.extend(sorted(row))
+		indptr.append(len(indices))
+		tag_counts[position] = len(manga["tags"])
+
+	data = np.ones(len(indices), dtype=np.int32)
+	tag_matrix = sparse.csr_matrix(
+		(data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+		shape=(len(mangas), len(tag_ids))
+	)
+	return tag_matrix, tag_counts
+
+def calculate_similarity_scores(matching_counts, tag_counts):
+	# Vectorized version of calculate_similarity_score, uses the exact same arithmetic
+	# so the resulting floats are identical to the ones of the python implementation.
+	tag_counts = np.asarray(tag_counts, dtype=np.float64)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		scores = (100 / tag_counts)[:, None] * matching_counts / 100
+	scores[matching_counts == 0] = 0
+	return scores
+
+def calculate_tag_weights(tag_matrix):
+	# Smoothed inverse document frequency of every tag, tags of all mangas still get a weight of 1
+	num_mangas = tag_matrix.shape[0]
+	document_frequencies = np.bincount(tag_matrix.indices, minlength=tag_matrix.shape[1])
+	return np.log((1 + num_mangas) / (1 + document_frequencies)) + 1
+
+def build_inverted_index(tag_matrix):
+	# Transposed tag matrix (tag x manga), the row of a tag is its posting list of sorted manga positions
+	inverted_index = tag_matrix.T.tocsr()
+	inverted_index.sort_indices()
+	return inverted_index
+
+def sum_tag_weights(query_rows, tag_weights):
+	# Sum of the weights of the tags of every row. bincount adds them one after the other in the order of the tags,
+	# the same order the sparse products add the weights of the matching tags.
+	row_ids = np.repeat(np.arange(query_rows.shape[0]), np.diff(query_rows.indptr))
+	return np.bincount(row_ids, weights=tag_weights[query_rows.indices], minlength=query_rows.shape[0])
+
+def calculate_metric_scores(metric, matching_counts, query_tag_counts, query_unique_tag_counts, compared_unique_tag_counts, matching_weights=None, query_weights=None):
+	# Scores of query rows x compared mangas out of the number (and for idf the weights) of the matching tags.
+	# The query values are per row, the compared values have to broadcast against matching_counts.
+	# A score is always 0 if the mangas do not share any tag.
+	if metric == METRIC_OVERLAP:
+		return calculate_similarity_scores(matching_counts, query_tag_counts)
+	if metric == METRIC_JACCARD:
+		numerators = matching_counts
+		denominators = query_unique_tag_counts[:, None] + compared_unique_tag_counts - matching_counts
+	elif metric == METRIC_IDF:
+		numerators = matching_weights
+		denominators = query_weights[:, None]
+	else:
+		raise ValueError(f"Unknown similarity metric '{metric}', expected one of {', '.join(METRICS)}")
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		scores = numerators / denominators
+	scores[matching_counts == 0] = 0
+	return scores
+
+def score_rows(tag_matrix, tag_matrix_transposed, tag_counts, rows, metric=METRIC_OVERLAP, tag_weights=None):
+	# Returns the matching counts and the scores of the given rows against all mangas (rows x mangas)
+	query_rows = tag_matrix[rows]
+	matching_counts = (query_rows @ tag_matrix_transposed).toarray()
+	matching_weights = None
+	query_weights = None
+	if metric == METRIC_IDF:
+		if tag_weights is None:
+			tag_weights = calculate_tag_weights(tag_matrix)
+		weighted_query_rows = sparse.csr_matrix(query_rows.multiply(tag_weights[None, :]))
+		matching_weights = (weighted_query_rows @ tag_matrix_transposed).toarray()
+		query_weights = sum_tag_weights(query_rows, tag_weights)
+
+	unique_tag_counts = np.diff(tag_matrix.indptr)
+	scores = calculate_metric_scores(
+		metric, matching_counts, tag_counts[rows], unique_tag_counts[rows], unique_tag_counts[None, :], matching_weights, query_weights
+	)
+	return matching_counts, scores
+
+def select_top_k(scores, k):
+	# Select the k highest scores of every row. Ties are resolved by the lower column first,
+	# which is the same order a stable descending sort over the whole row would produce.
+	num_rows, num_columns = scores.shape
+	k = min(k, num_columns)
+	if k == 0:
+		return np.empty((num_rows, 0), dtype=np.int64)
+
+	# The k-th largest value of each row is the threshold
+	kth_values = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+	above_threshold = scores > kth_values[:, None]
+	at_threshold = scores == kth_values[:, None]
+	# Only keep as many threshold values as needed to fill up k, prefer lower columns
+	missing = k - above_threshold.sum(axis=1)
+	selected = above_threshold | (at_threshold & (np.cumsum(at_threshold, axis=1) <= missing[:, None]))
+
+	# Exactly k columns are selected per row and np.nonzero returns them in column order
+	columns = np.nonzero(selected)[1].reshape(num_rows, k)
+	selected_scores = np.take_along_axis(scores, columns, axis=1)
+	order = np.argsort(-selected_scores, axis=1, kind="stable")
+	return np.take_along_axis(columns, order, axis=1)
+
+def get_postings(inverted_index, tag):
+	return inverted_index.indices[inverted_index.indptr[tag]:inverted_index.indptr[tag + 1]]
+
+def get_row_tags(tag_matrix, rows):
+	# The tags of the given rows as (index into rows, tag) pairs, in the order of the rows and their tags
+	starts = tag_matrix.indptr[rows]
+	lengths = tag_matrix.indptr[np.asarray(rows) + 1] - starts
+	row_ids = np.repeat(np.arange(len(lengths)), lengths)
+	offsets = np.arange(len(row_ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+	return row_ids, tag_matrix.indices[np.repeat(starts, lengths) + offsets]
+
+def intersect_postings(posting_lists):
+	# Positions which are part of all sorted posting lists, the first list should be the shortest
+	positions = posting_lists[0]
+	for postings in posting_lists[1:]:
+		positions = positions[postings[np.minimum(np.searchsorted(postings, positions), len(postings) - 1)] == positions]
+	return positions
+
+def get_score_bounds(metric, matching, query_unique_tag_count, candidate_unique_tag_counts):
+	# Values which order the candidates like their scores would if they matched the given number (or weight) of tags
+	if metric == METRIC_JACCARD:
+		return matching / (query_unique_tag_count + candidate_unique_tag_counts - matching)
+	return matching
+
+def find_candidates(tag_matrix, inverted_index, position, k, metric=METRIC_OVERLAP, tag_weights=None, excluded=None):
+	# Sorted positions of the mangas which can be part of the top-k of the manga at position, all of them share
+	# at least one tag with it. The posting lists of its tags are merged from the shortest to the longest,
+	# the contributions accumulated so far are lower bounds of the scores of the candidates found so far.
+	# As soon as the k-th best candidate scores at least as high as a manga which is only part of the remaining
+	# lists could, the remaining (long) lists are skipped. Such a manga can then only tie with the k-th candidate
+	# if it is part of all remaining lists, the intersection of those lists is added to not lose a tie which
+	# is won by a lower position. At the end the candidates which can not reach the k-th best candidate,
+	# even if they are part of all skipped lists, are dropped.
+	unique_tag_counts = np.diff(tag_matrix.indptr)
+	query_unique_tag_count = unique_tag_counts[position]
+	query_tags = tag_matrix.indices[tag_matrix.indptr[position]:tag_matrix.indptr[position + 1]]
+	query_tags = query_tags[np.argsort(np.diff(inverted_index.indptr)[query_tags], kind="stable")]
+	contributions = tag_weights[query_tags] if metric == METRIC_IDF else np.ones(len(query_tags))
+	# remaining_contributions[j] is the upper bound of the contributions of the lists from j on
+	remaining_contributions = np.append(np.cumsum(contributions[::-1])[::-1], 0)
+
+	accumulated = np.zeros(tag_matrix.shape[0])
+	candidate_parts = [np.empty(0, dtype=inverted_index.indices.dtype)]
+	num_candidates = 0
+	num_merged_lists = 0
+	kth_lower_bound = None
+	for tag, contribution in zip(query_tags, contributions):
+		postings = get_postings(inverted_index, tag)
+		new_candidates = postings[accumulated[postings] == 0]
+		if excluded is not None:
+			new_candidates = new_candidates[~excluded[new_candidates]]
+		accumulated[postings] += contribution
+		candidate_parts.append(new_candidates)
+		num_candidates += len(new_candidates)
+		num_merged_lists += 1
+		if num_candidates < k:
+			continue
+
+		candidates = np.concatenate(candidate_parts)
+		candidate_parts = [candidates]
+		lower_bounds = get_score_bounds(metric, accumulated[candidates], query_unique_tag_count, unique_tag_counts[candidates])
+		kth_lower_bound = np.partition(lower_bounds, len(lower_bounds) - k)[len(lower_bounds) - k]
+		if num_merged_lists == len(query_tags):
+			break
+
+		# A manga which is not a candidate yet can at most match all remaining lists, its jaccard score is
+		# highest if it has no other tags
+		upper_bound = remaining_contributions[num_merged_lists]
+		if metric == METRIC_JACCARD:
+			upper_bound /= query_unique_tag_count
+		# The margins cover the rounding of the weights, which are added in another order than for the scores
+		if kth_lower_bound > upper_bound * (1 + 1e-9):
+			break
+		if kth_lower_bound >= upper_bound * (1 - 1e-9):
+			tied_candidates = intersect_postings([get_postings(inverted_index, t) for t in query_tags[num_merged_lists:]])
+			tied_candidates = tied_candidates[accumulated[tied_candidates] == 0]
+			if excluded is not None:
+				tied_candidates = tied_candidates[~excluded[tied_candidates]]
+			candidate_parts.append(tied_candidates)
+			break
+
+	candidates = np.concatenate(candidate_parts)
+	if kth_lower_bound is None:
+		return np.sort(candidates)
+
+	candidate_unique_tag_counts = unique_tag_counts[candidates]
+	if metric == METRIC_IDF:
+		upper_bounds = accumulated[candidates] + remaining_contributions[num_merged_lists]
+		return np.sort(candidates[upper_bounds >= kth_lower_bound * (1 - 1e-9)])
+
+	# Scores out of tag counts are exact and tie a lot. A candidate which can at most tie with the k-th best
+	# candidate is only kept if its position is lower than the one of k candidates which score at least as high.
+	lower_bounds = get_score_bounds(metric, accumulated[candidates], query_unique_tag_count, candidate_unique_tag_counts)
+	matching = np.minimum(accumulated[candidates] + remaining_contributions[num_merged_lists], candidate_unique_tag_counts)
+	upper_bounds = get_score_bounds(metric, matching, query_unique_tag_count, candidate_unique_tag_counts)
+	kth_position = np.partition(candidates[lower_bounds >= kth_lower_bound], k - 1)[k - 1]
+	is_candidate = (upper_bounds > kth_lower_bound) | ((upper_bounds == kth_lower_bound) & (candidates <= kth_position))
+	return np.sort(candidates[is_candidate])
+
+def search_top_k(tag_matrix, inverted_index, tag_counts, position, k=10, metric=METRIC_OVERLAP, tag_weights=None, excluded=None):
+	# Top-k of a single manga which only visits the mangas sharing at least one tag with it (see find_candidates).
+	# Returns (columns, matching_counts, scores) like one row of calculate_top_k_similar, with identical scores,
+	# mangas marked in the excluded mask are left out.
+	num_mangas = tag_matrix.shape[0]
+	if k <= 0:
+		return (np.empty(0, dtype=np.int64), np.empty(0, dtype=tag_matrix.dtype), np.empty(0, dtype=np.float64))
+	if metric == METRIC_IDF and tag_weights is None:
+		tag_weights = calculate_tag_weights(tag_matrix)
+	candidates = find_candidates(tag_matrix, inverted_index, position, k, metric, tag_weights, excluded)
+
+	# Count the matching tags of the candidates out of their (short) rows of the tag matrix. The weights of the
+	# matching tags are added in the order of the tags, the same order the sparse products of score_rows use.
+	query_row = tag_matrix[[position]]
+	is_query_tag = np.zeros(tag_matrix.shape[1], dtype=bool)
+	is_query_tag[query_row.indices] = True
+	row_ids, row_tags = get_row_tags(tag_matrix, candidates)
+	is_matching = is_query_tag[row_tags]
+	matching_counts = np.bincount(row_ids[is_matching], minlength=len(candidates)).astype(tag_matrix.dtype)
+	matching_weights = None
+	query_weights = None
+	if metric == METRIC_IDF:
+		matching_weights = np.bincount(row_ids[is_matching], weights=tag_weights[row_tags[is_matching]], minlength=len(candidates))[None, :]
+		query_weights = sum_tag_weights(query_row, tag_weights)
+
+	unique_tag_counts = np.diff(tag_matrix.indptr)
+	scores = calculate_metric_scores(
+		metric, matching_counts[None, :], tag_counts[[position]], unique_tag_counts[[position]], unique_tag_counts[candidates][None, :],
+		matching_weights, query_weights
+	)
+	selected = select_top_k(scores, k)[0]
+	columns = candidates[selected].astype(np.int64)
+	matching_counts = matching_counts[selected]
+	scores = scores[0, selected]
+
+	# Fill up with mangas which do not share any tag, like select_top_k they come in the order of their position
+	if len(columns) < k:
+		fillers = np.ones(num_mangas, dtype=bool)
+		fillers[candidates] = False
+		if excluded is not None:
+			fillers &= ~excluded
+		fillers = np.flatnonzero(fillers)[:k - len(columns)]
+		columns = np.concatenate([columns, fillers])
+		matching_counts = np.concatenate([matching_counts, np.zeros(len(fillers), dtype=tag_matrix.dtype)])
+		scores = np.concatenate([scores, np.zeros(len(fillers))])
+	return (columns, matching_counts, scores)
+
+def iter_top_k_similar(tag_matrix, tag_counts, k=10, rows=None, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES, metric=METRIC_OVERLAP, search=SEARCH_DENSE):
+	# Yields (rows, columns, matching_counts, scores) for blocks of the given rows (default all rows).
+	# Intersection counts are the sparse product of a row block with the transposed tag matrix,
+	# the block size is chosen so that the dense block stays below max_block_bytes.
+	# Both searches return identical results.
+	num_mangas = tag_matrix.shape[0]
+	if rows is None:
+		rows = np.arange(num_mangas)
+	if search not in SEARCHES:
+		raise ValueError(f"Unknown similarity search '{search}', expected one of {', '.join(SEARCHES)}")
+	block_size = max(1, max_block_bytes // max(1, num_mangas * BYTES_PER_BLOCK_CELL))
+	tag_matrix_transposed = build_inverted_index(tag_matrix)
+	tag_weights = calculate_tag_weights(tag_matrix) if metric == METRIC_IDF else None
+
+	for block_start in range(0, len(rows), block_size):
+		block_rows = rows[block_start:block_start + block_size]
+		if search == SEARCH_PRUNED:
+			results = [search_top_k(tag_matrix, tag_matrix_transposed, tag_counts, row, k, metric, tag_weights) for row in block_rows]
+			yield (
+				block_rows,
+				*(np.array([result[i] for result in results]).reshape(len(block_rows), -1) for i in range(3))
+			)
+			continue
+
+		matching_counts, scores = score_rows(tag_matrix, tag_matrix_transposed, tag_counts, block_rows, metric, tag_weights)
+		columns = select_top_k(scores, k)
+		yield (
+			block_rows,
+			columns,
+			np.take_along_axis(matching_counts, columns, axis=1),
+			np.take_along_axis(scores, columns, axis=1)
+		)
+
+def calculate_top_k_similar(tag_matrix, tag_counts, k=10, rows=None, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES, metric=METRIC_OVERLAP, search=SEARCH_DENSE):
+	# Same as iter_top_k_similar but returns the (columns, matching_counts, scores) of all rows at once
+	blocks = list(iter_top_k_similar(tag_matrix, tag_counts, k=k, rows=rows, max_block_bytes=max_block_bytes, metric=metric, search=search))
+	if len(blocks) == 0:
+		k = min(k, tag_matrix.shape[0])
+		return (np.empty((0, k), dtype=np.int64), np.empty((0, k), dtype=np.int64), np.empty((0, k), dtype=np.float64))
+	return tuple(np.concatenate([block[i] for block in blocks]) for i in range(1, 4))
+
+def format_similar_mangas(mangas, columns, matching_counts, scores):
+	# Converts the result of calculate_top_k_similar into the format preprocessing stores in manga.json
+	similar_mangas = []
+	for row_columns, row_counts, row_scores in zip(columns.tolist(), matching_counts.tolist(), scores.tolist()):
+		similar_mangas.append([
+			{
+				"id": mangas[column]["id"],
+				"title": mangas[column]["title"],
+				# calculate_similarity_score returns an integer 0 if nothing matches, the other metrics do the same
+				"similarity_score": score if count > 0 else 0
+			}
+			for column, count, score in zip(row_columns, row_counts, row_scores)
+		])
+	return similar_mangas
+
+def calculate_similar_mangas(mangas, k=10, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES, metric=METRIC_OVERLAP):
+	# Returns the k most similar mangas for every manga
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	columns, matching_counts, scores = calculate_top_k_similar(tag_matrix, tag_counts, k=k, max_block_bytes=max_block_bytes, metric=metric)
+	return format_similar_mangas(mangas, columns, matching_counts, scores)
+
+class SimilarityIndex:
+	# Top-k similar mangas of a single manga for any k and metric, computed at query time instead of
+	# looking up the precalculated top 10. Only the mangas sharing a tag with the queried manga are
+	# visited (see search_top_k) and the k best are selected with a partition instead of a full sort.
+	def __init__(self, ids, titles, tag_matrix, tag_counts):
+		self.ids = np.asarray(ids, dtype=np.int64)
+		self.titles = titles
+		self.positions = { manga_id: position for position, manga_id in enumerate(self.ids.tolist()) }
+		self.tag_matrix = tag_matrix
+		self.inverted_index = build_inverted_index(tag_matrix)
+		self.tag_counts = np.asarray(tag_counts, dtype=np.int64)
+		self.tag_weights = calculate_tag_weights(tag_matrix)
+		self._title_codes = None
+
+	@classmethod
+	def from_mangas(cls, mangas):
+		# Create the index out of the mangas of manga.json
+		tag_matrix, tag_counts = build_tag_matrix(mangas)
+		return cls([m["id"] for m in mangas], [m["title"] for m in mangas], tag_matrix, tag_counts)
+
+	@classmethod
+	def from_columns(cls, columns):
+		# Create the index out of the columns of the binary data (see artifacts.load_manga_columns)
+		# Copies, the memory mapped columns are read only and the matrix sorts its indices in place
+		offsets = np.array(columns["tags.offsets"], dtype=np.int64)
+		codes = np.array(columns["tags.codes"], dtype=np.int32)
+		tag_matrix = sparse.csr_matrix(
+			(np.ones(len(codes), dtype=np.int32), codes, offsets),
+			shape=(len(offsets) - 1, len(columns["tags.categories"]))
+		)
+		# A tag listed twice for a manga is a single entry of the matrix but still counts for the denominator
+		tag_matrix.sum_duplicates()
+		tag_matrix.data[:] = 1
+		return cls(columns["id"], columns["title"], tag_matrix, np.diff(offsets))
+
+	def __len__(self):
+		return len(self.ids)
+
+	def get_title_codes(self):
+		# Mangas with the same title share a code, created on first use
+		if self._title_codes is None:
+			codes = {}
+			self._title_codes = np.array([codes.setdefault(title, len(codes)) for title in self.titles], dtype=np.int64)
+		return self._title_codes
+
+	def query(self, manga_id, k=10, metric=METRIC_OVERLAP, exclude_self=False, exclude_duplicates=False):
+		# Returns the ids, titles and scores of the k most similar mangas, the most similar first.
+		# exclude_self leaves out the queried manga itself, exclude_duplicates all mangas with its title.
+		position = self.positions.get(manga_id)
+		if position is None:
+			raise KeyError(f"Unknown manga id {manga_id}")
+
+		excluded = None
+		if exclude_self or exclude_duplicates:
+			excluded = np.zeros(len(self.ids), dtype=bool)
+			excluded[position] = exclude_self
+		if exclude_duplicates:
+			title_codes = self.get_title_codes()
+			excluded |= title_codes == title_codes[position]
+		similar_positions, _, similar_scores = search_top_k(
+			self.tag_matrix, self.inverted_index, self.tag_counts, position, k, metric, self.tag_weights, excluded
+		)
+		titles = [self.titles[p] for p in similar_positions]
+		return self.ids[similar_positions], titles, similar_scores
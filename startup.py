@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Fast startup path of main.py, enabled with FAST_STARTUP=1.
+# The page and the first figures only need the tag dropdown options, the year range and the figures
+# of the initial selection. They are read from a prebuilt artifact (written by running this script)
+# instead of importing pandas and plotly.express and loading the data before the first request.
+# Everything else is created on first use (see Lazy) or warmed up in the background after startup.
+
+ARTIFACT_PATH = "./startup_artifact.json"
+FORMAT_VERSION = 1
+
+class Lazy:
+    # Value which is created on first use and shared by all threads
+    def __init__(self, create):
+        self.create = create
+        self._value = None
+        self._created = False
+        self._lock = threading.Lock()
+        lazy_values.add(self)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self._created:
+            with self._lock:
+                if not self._created:
+                    self._value = self.create()
+                    self._created = True
+        return self._value
+
+    def is_created(self):
+        return self._created
+
+# A process forked while another thread creates a value (such as the job of a background callback
+# during the warm up) would inherit the held lock and wait forever, it creates the value on its own instead.
+# One hook resets the locks of all Lazy values. A hook per value can not be unregistered and would keep
+# the value alive, together with the data of every replaced data version of main.py.
+lazy_values = weakref.WeakSet()
+
+def reset_lazy_locks():
+    for lazy in list(lazy_values):
+        lazy._reset_lock()
+
+os.register_at_fork(after_in_child=reset_lazy_locks)
+
+class PhaseTimer:
+    # Wall time per phase of the startup, printed as one line by report
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = {}
+
+    @contextmanager
+    def measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[phase] = self.durations.get(phase, 0) + time.perf_counter() - start
+
+    def report(self, title):
+        phases = ", ".join(f"{phase} {duration:.3f}s" for phase, duration in self.durations.items())
+        print(f"{title} took {time.perf_counter() - self.start:.3f}s ({phases})", flush=True)
+
+def get_data_signature(paths):
+    # Hash of the files the startup artifact is built from, a changed file makes the artifact outdated
+    signature = hashlib.sha1()
+    for path in sorted(paths):
+        signature.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                signature.update(block)
+    return signature.hexdigest()
+
+def create_tag_dropdown_options(tag_descriptions):
+    return [{ "label": f"{t['tag_description']} ({t['num_mangas_total']})", "value": t["tag_id"] } for t in tag_descriptions]
+
+def create_startup_data(tag_descriptions, years):
+    # Years are already sorted in descending order
+    return {
+        "tag_dropdown_options": create_tag_dropdown_options(tag_descriptions),
+        "min_year": years[-1],
+        "max_year": years[0],
+        "figures": [],
+    }
+
+def load_artifact(path, data_signature):
+    # Returns the startup data or None if the artifact is missing or was built from other data
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        artifact = json.load(f)
+    if artifact.get("format_version") != FORMAT_VERSION or artifact.get("data_signature") != data_signature:
+        return None
+    return artifact
+
+def write_artifact(path, startup_data, data_signature):
+    artifact = { "format_version": FORMAT_VERSION, "data_signature": data_signature, **startup_data }
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f)
+    os.replace(temporary_path, path)
+
+def main():
+    # Imports the app with the full startup and stores the data of the initial page.
+    # Run it in the directory of the app after the data was preprocessed.
+    os.environ["FAST_STARTUP"] = "0"
+    sys.path.insert(0, os.getcwd())
+    import main as app_main
+
+    data = app_main.get_data()
+    startup_data = create_startup_data(data.get_tag_descriptions(), data.get_years())
+    for figure_key in app_main.get_initial_figure_keys(startup_data, data):
+        app_main.get_figure(figure_key, data)
+        # The key is stored without the data version, the data signature stands for the data
+        figure_name, tags_to_filter, min_year, max_year, _ = figure_key
+        startup_data["figures"].append({
+            "key": [figure_name, list(tags_to_filter), min_year, max_year],
+            "figure": app_main.figure_cache.get(figure_key),
+        })
+    write_artifact(ARTIFACT_PATH, startup_data, app_main.get_data_signature(data.directory))
+    print(f"Wrote {ARTIFACT_PATH} with {len(startup_data['figures'])} figures")
+
+if __name__ == "__main__":
+    main()
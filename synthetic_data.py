@@ -0,0 +1,75 @@
+import argparse
+import csv
+import numpy as np
+
+# Generates a data.csv in the format of the Anime Planet dataset for benchmarks and load tests.
+# The catalog is shaped like the real one so the costs scale the same way:
+# - the number of distinct tags grows with the square root of the catalog (Heaps' law), about 600 for 70'000 mangas
+# - tag popularity follows a Zipf distribution, a few tags (e.g. Action) are part of many mangas
+# - most mangas have 3 to 10 tags, a few have none or list a tag twice
+# - most mangas are recent, some have no rating or no year and are dropped by preprocessing
+
+TAGS_PER_SQRT_MANGA = 2.3
+MIN_TAGS = 20
+MEAN_TAGS_PER_MANGA = 6
+ZIPF_EXPONENT = 1.1
+LATEST_YEAR = 2024
+MISSING_RATING_SHARE = 0.12
+MISSING_YEAR_SHARE = 0.05
+DUPLICATE_TITLE_SHARE = 0.02
+DUPLICATE_TAG_SHARE = 0.01
+
+def get_default_num_tags(num_mangas):
+	return max(MIN_TAGS, int(TAGS_PER_SQRT_MANGA * num_mangas ** 0.5))
+
+def create_tag_names(num_tags):
+	# Two word names with spaces and upper case letters like the real tags, e.g. "Tag 12 Fantasy"
+	genres = ["Action", "Romance", "Fantasy", "Comedy", "Drama", "Horror", "Isekai", "School Life", "Based on a Web Novel"]
+	return [genres[index] if index < len(genres) else f"Tag {index} {genres[index % len(genres)]}" for index in range(num_tags)]
+
+def iter_synthetic_rows(num_mangas, num_tags=None, seed=0):
+	# Yields the csv rows (title, description, rating, year, tags, cover) of a synthetic catalog
+	rng = np.random.default_rng(seed)
+	num_tags = get_default_num_tags(num_mangas) if num_tags is None else num_tags
+	tag_names = create_tag_names(num_tags)
+	tag_probabilities = 1 / np.arange(1, num_tags + 1) ** ZIPF_EXPONENT
+	tag_probabilities /= tag_probabilities.sum()
+
+	tags_per_manga = np.minimum(rng.poisson(MEAN_TAGS_PER_MANGA, num_mangas), num_tags)
+	ratings = np.clip(rng.normal(3.8, 0.5, num_mangas), 0.5, 5)
+	years = LATEST_YEAR - np.minimum(rng.geometric(0.08, num_mangas) - 1, 90)
+	missing_ratings = rng.random(num_mangas) < MISSING_RATING_SHARE
+	missing_years = rng.random(num_mangas) < MISSING_YEAR_SHARE
+	duplicate_titles = rng.random(num_mangas) < DUPLICATE_TITLE_SHARE
+	duplicate_tags = rng.random(num_mangas) < DUPLICATE_TAG_SHARE
+	for index in range(num_mangas):
+		tag_positions = rng.choice(num_tags, size=tags_per_manga[index], replace=False, p=tag_probabilities)
+		tags = [tag_names[position] for position in tag_positions]
+		if duplicate_tags[index] and len(tags) > 0:
+			tags.append(tags[0])
+		title_index = int(rng.integers(index)) if duplicate_titles[index] and index > 0 else index
+		yield [
+			f"Manga {title_index}",
+			" ".join([f"Story number {index} about {' and '.join(tags)}."] * 3),
+			"" if missing_ratings[index] else f"{ratings[index]:.3f}",
+			"nan" if missing_years[index] else str(years[index]),
+			str(tags),
+			f"https://example.com/covers/{index}.jpg"
+		]
+
+def write_synthetic_data(path, num_mangas, num_tags=None, seed=0):
+	with open(path, "w", encoding="utf-8", newline="") as f:
+		writer = csv.writer(f)
+		writer.writerow(["title", "description", "rating", "year", "tags", "cover"])
+		writer.writerows(iter_synthetic_rows(num_mangas, num_tags, seed))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Generate a synthetic data.csv")
+	parser.add_argument("--mangas", type=int, default=10000, help="number of mangas (default: 10000)")
+	parser.add_argument("--tags", type=int, default=None, help="number of distinct tags (default: grows with the square root of the number of mangas)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", default="data.csv", help="path of the generated csv file (default: data.csv)")
+	args = parser.parse_args()
+	write_synthetic_data(args.output, args.mangas, args.tags, args.seed)
+	print(f"Generated {args.mangas} mangas in {args.output}")
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+class TagYearIndex:
+    # Answers "all rows of these tags within a year range" without scanning the whole frame.
+    # The row positions are sorted by (tag, year) once, the rows of a tag form a bucket and
+    # the year range within a bucket is found with a binary search.
+    def __init__(self, df, tag_column="tag_id", year_column="year"):
+        self.df = df
+        tag_codes, tags = pd.factorize(df[tag_column])
+        self.tag_codes = { tag: code for code, tag in enumerate(tags) }
+        years = df[year_column].to_numpy()
+        self.sorted_positions = np.lexsort((years, tag_codes))
+        self.sorted_years = years[self.sorted_positions]
+        # Rows without a tag have the code -1 and are sorted in front of the first bucket
+        self.bucket_offsets = np.searchsorted(tag_codes[self.sorted_positions], np.arange(len(tags) + 1))
+
+    def query_positions(self, tags, min_year, max_year):
+        # Positions of the matching rows in the order of the frame
+        slices = []
+        for tag in set(tags):
+            code = self.tag_codes.get(tag)
+            if code is None:
+                continue
+            start, stop = self.bucket_offsets[code], self.bucket_offsets[code + 1]
+            bucket_years = self.sorted_years[start:stop]
+            first = start + np.searchsorted(bucket_years, min_year, side="left")
+            last = start + np.searchsorted(bucket_years, max_year, side="right")
+            slices.append(self.sorted_positions[first:last])
+        if len(slices) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices))
+
+    def query(self, tags, min_year, max_year):
+        # Same rows as df[(year >= min_year) & (year <= max_year) & tag.isin(tags)]
+        return self.df.take(self.query_positions(tags, min_year, max_year))
@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+import pytest
+import artifacts
+import preprocessing
+from data_versions import get_data_directory
+from synthetic_data import write_synthetic_data
+
+def columns_to_rows(columns):
+	# Rows like in data_preprocessed.json, NaN ratings are null there
+	rows = [dict(zip(columns, values)) for values in zip(*[list(column) for column in columns.values()])]
+	for row in rows:
+		for name, value in row.items():
+			if isinstance(value, np.generic):
+				row[name] = value.item()
+		if "average_rating" in row and np.isnan(row["average_rating"]):
+			row["average_rating"] = None
+	return rows
+
+def manga_columns_to_mangas(columns):
+	tag_categories = columns["tags.categories"].to_list()
+	ids = columns["id"].tolist()
+	titles = columns["title"].to_list()
+	mangas = []
+	for position, id in enumerate(ids):
+		tags_start, tags_stop = columns["tags.offsets"][position:position + 2]
+		similar_start, similar_stop = columns["similar_mangas.offsets"][position:position + 2]
+		mangas.append({
+			"id": id,
+			"title": titles[position],
+			"description": columns["description"][position],
+			"rating": float(columns["rating"][position]),
+			"year": int(columns["year"][position]),
+			"cover": columns["cover"][position],
+			"tags": [tag_categories[code] for code in columns["tags.codes"][tags_start:tags_stop]],
+			"similar_mangas": [{
+				"id": int(columns["similar_mangas.id"][index]),
+				"title": titles[columns["similar_mangas.position"][index]],
+				"similarity_score": float(columns["similar_mangas.similarity_score"][index])
+			} for index in range(similar_start, similar_stop)]
+		})
+	return mangas
+
+def assert_round_trip(directory, preprocessed_data, manga_data):
+	artifacts.write_binary_data(directory, preprocessed_data, manga_data)
+	assert artifacts.has_binary_data(directory)
+
+	binary_preprocessed_data = artifacts.load_preprocessed_data(directory)
+	assert binary_preprocessed_data["tag_descriptions"] == preprocessed_data["tag_descriptions"]
+	assert binary_preprocessed_data["years"] == preprocessed_data["years"]
+	assert columns_to_rows(binary_preprocessed_data["tags"]) == preprocessed_data["tags"]
+	assert columns_to_rows(binary_preprocessed_data["top_ratings"]) == preprocessed_data["top_ratings"]
+	assert [(r["years_per_bucket"], columns_to_rows(r["tags"])) for r in binary_preprocessed_data["tag_rollups"]] == [(r["years_per_bucket"], r["tags"]) for r in preprocessed_data["tag_rollups"]]
+	assert manga_columns_to_mangas(artifacts.load_manga_columns(directory)) == manga_data["mangas"]
+
+def test_round_trip_of_small_data(tmp_path):
+	preprocessed_data = {
+		"tag_descriptions": [{ "tag_id": "action", "tag_name": "Action", "num_mangas_total": 2 }],
+		"years": [2020, 2021],
+		"tags": [
+			{ "tag_id": "action", "year": 2020, "average_rating": 4.5, "number_of_mangas": 1 },
+			{ "tag_id": "action", "year": 2021, "average_rating": None, "number_of_mangas": 0 }
+		],
+		"top_ratings": [{ "tag_id": "action", "manga_id": 3, "rating": 4.5, "title": "Kōhai ☆", "year": 2020 }],
+		"tag_rollups": [{ "years_per_bucket": 5, "tags": [{ "tag_id": "action", "year": 2020, "average_rating": 4.5, "number_of_mangas": 1 }] }]
+	}
+	manga_data = {
+		"mangas": [
+			{ "id": 3, "title": "Kōhai ☆", "description": "", "rating": 4.5, "year": 2020, "cover": "https://example.com/3.jpg", "tags": ["Action", "Action"], "similar_mangas": [{ "id": 7, "title": "No tags", "similarity_score": 0.0 }] },
+			{ "id": 7, "title": "No tags", "description": "Über", "rating": 3.25, "year": 2021, "cover": "", "tags": [], "similar_mangas": [] }
+		]
+	}
+	assert_round_trip(str(tmp_path / "binary"), preprocessed_data, manga_data)
+
+def test_round_trip_of_preprocessed_data(tmp_path):
+	data_path = tmp_path / "data.csv"
+	write_synthetic_data(str(data_path), 300, seed=2)
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(tmp_path), "--format", "json"])
+	data_directory = get_data_directory(str(tmp_path))
+	assert not artifacts.has_binary_data(os.path.join(data_directory, artifacts.DEFAULT_DIRECTORY))
+	with open(os.path.join(data_directory, "data_preprocessed.json"), encoding="utf-8") as f:
+		preprocessed_data = json.load(f)
+	with open(os.path.join(data_directory, "manga.json"), encoding="utf-8") as f:
+		manga_data = json.load(f)
+	assert_round_trip(str(tmp_path / "binary"), preprocessed_data, manga_data)
+
+def test_other_format_version_is_rejected(tmp_path):
+	directory = str(tmp_path)
+	artifacts.write_binary_data(directory, { "tag_descriptions": [], "years": [], "tags": [], "top_ratings": [], "tag_rollups": [] }, { "mangas": [] })
+	meta_path = os.path.join(directory, artifacts.META_FILE_NAME)
+	with open(meta_path, encoding="utf-8") as f:
+		meta = json.load(f)
+	meta["format_version"] = artifacts.FORMAT_VERSION - 1
+	with open(meta_path, "w", encoding="utf-8") as f:
+		json.dump(meta, f)
+	with pytest.raises(ValueError):
+		artifacts.load_preprocessed_data(directory)
+	with pytest.raises(ValueError):
+		artifacts.load_manga_columns(directory)
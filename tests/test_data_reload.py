@@ -0,0 +1,31 @@
+import gc
+import importlib
+import weakref
+import preprocessing
+from synthetic_data import write_synthetic_data
+
+def publish_version(directory, num_mangas, seed):
+	data_path = directory / "data.csv"
+	write_synthetic_data(str(data_path), num_mangas, seed=seed)
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(directory)])
+
+def test_replaced_data_version_is_collected(tmp_path, monkeypatch):
+	publish_version(tmp_path, 200, seed=0)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	previous_data = weakref.ref(main.get_data())
+	previous_data().manga_store.get()
+	previous_data().search_index.get()
+
+	publish_version(tmp_path, 150, seed=1)
+	assert main.reload_data()
+	data = main.get_data()
+	assert len(data.manga_store.get()) < 150
+	# The initial figures of the new version are rendered in a forked process
+	for figure_key in main.get_initial_figure_keys(main.startup_data, data):
+		figure_name, tags_to_filter, min_year, max_year, _ = figure_key
+		assert main.figure_cache.get(figure_key) == main.figure_creators[figure_name](data, tags_to_filter, min_year, max_year).to_json()
+	gc.collect()
+	assert previous_data() is None
@@ -0,0 +1,62 @@
+import time
+import pytest
+import enrichment
+from jikan_stand_in import JikanStandIn, create_mangas
+from recommendation_store import STATUS_ERROR, STATUS_FOUND, STATUS_NOT_FOUND, RecommendationStore
+
+TITLES = ["Manga A", "Manga B", "Manga C", "Manga D", "Manga E"]
+
+@pytest.fixture
+def stand_in():
+	# "Manga E" is unknown to the stand-in
+	stand_in = JikanStandIn(create_mangas(TITLES[:4], number_of_recommendations=2)).start()
+	yield stand_in
+	stand_in.stop()
+
+@pytest.fixture
+def store(tmp_path):
+	return RecommendationStore(str(tmp_path / "recommendations.sqlite"), read_only=False)
+
+def test_second_run_resumes_without_repeating_requests(stand_in, store):
+	assert enrichment.enrich(TITLES, store, stand_in.base_url, requests_per_second=100, limit=2) == { STATUS_FOUND: 2 }
+	assert stand_in.get_searched_titles() == ["Manga A", "Manga B"]
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/1/recommendations", "/v4/manga", "/v4/manga/2/recommendations"]
+
+	counts = enrichment.enrich(TITLES, store, stand_in.base_url, requests_per_second=100)
+	assert counts == { STATUS_FOUND: 4, STATUS_NOT_FOUND: 1 }
+	assert stand_in.get_searched_titles() == TITLES
+	assert len(stand_in.requests) == 4 * 2 + 1
+	assert store.get("Manga A") == [("Manga B", "https://myanimelist.net/manga/2"), ("Manga C", "https://myanimelist.net/manga/3")]
+	assert store.get("Manga E") == []
+
+	# Everything is enriched, a third run does not send any request
+	enrichment.enrich(TITLES, store, stand_in.base_url, requests_per_second=100)
+	assert len(stand_in.requests) == 4 * 2 + 1
+
+def test_rate_limited_requests_are_retried_after_retry_after(stand_in, store):
+	stand_in.queue_error(429, retry_after=1, times=2)
+	start = time.monotonic()
+	assert enrichment.enrich(TITLES[:1], store, stand_in.base_url, requests_per_second=100) == { STATUS_FOUND: 1 }
+	# Two rate limited responses, each followed by waiting the Retry-After second
+	assert time.monotonic() - start >= 2
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga", "/v4/manga", "/v4/manga/1/recommendations"]
+	assert store.get("Manga A") is not None
+
+def test_requests_are_spaced_by_the_rate_limiter(stand_in, store):
+	start = time.monotonic()
+	enrichment.enrich(TITLES[:3], store, stand_in.base_url, requests_per_second=10)
+	# 6 requests, at most 10 per second
+	assert len(stand_in.requests) == 6
+	assert time.monotonic() - start >= 0.5
+
+def test_failed_titles_are_retried_by_the_next_run(stand_in, store):
+	stand_in.error_titles.add("Manga B")
+	counts = enrichment.enrich(TITLES[:3], store, stand_in.base_url, requests_per_second=100)
+	assert counts == { STATUS_FOUND: 2, STATUS_ERROR: 1 }
+	assert store.get("Manga B") is None
+
+	stand_in.error_titles.clear()
+	searched_before = len(stand_in.get_searched_titles())
+	assert enrichment.enrich(TITLES[:3], store, stand_in.base_url, requests_per_second=100) == { STATUS_FOUND: 3 }
+	assert stand_in.get_searched_titles()[searched_before:] == ["Manga B"]
+	assert store.get("Manga B") == [("Manga C", "https://myanimelist.net/manga/3"), ("Manga D", "https://myanimelist.net/manga/4")]
@@ -0,0 +1,86 @@
+import json
+import threading
+from figure_cache import FigureCache
+
+class StubFigure:
+	def __init__(self, value):
+		self.value = value
+
+	def to_json(self):
+		return json.dumps({ "value": self.value })
+
+def test_least_recently_used_figures_are_evicted():
+	cache = FigureCache(max_bytes=30)
+	cache.put("a", "a" * 10)
+	cache.put("b", "b" * 10)
+	cache.put("c", "c" * 10)
+	# Reading "a" makes "b" the least recently used figure
+	assert cache.get("a") == "a" * 10
+	cache.put("d", "d" * 10)
+	assert cache.get("b") is None
+	assert [cache.get(key) for key in ("a", "c", "d")] == ["a" * 10, "c" * 10, "d" * 10]
+	assert cache.stats() == { "hits": 4, "misses": 1, "entries": 3, "size_bytes": 30, "max_bytes": 30 }
+
+	# Replacing a figure only counts its new size and makes it the most recently used one,
+	# a larger figure evicts as many of the least recently used figures as needed
+	cache.put("a", "a" * 5)
+	assert cache.stats()["size_bytes"] == 25
+	cache.put("e", "e" * 24)
+	assert [key for key in "acde" if cache.get(key) is not None] == ["a", "e"]
+	assert cache.stats()["size_bytes"] == 29
+
+def test_size_is_counted_in_utf8_bytes_and_too_large_figures_are_not_stored():
+	cache = FigureCache(max_bytes=10)
+	cache.put("a", "ä" * 5)
+	assert cache.stats()["size_bytes"] == 10
+	cache.put("b", "b" * 11)
+	assert cache.get("b") is None
+	assert cache.get("a") == "ä" * 5
+
+def test_remove_where_and_clear():
+	cache = FigureCache(max_bytes=100)
+	for key in [("bar", 1), ("bar", 2), ("line", 1)]:
+		cache.put(key, "x" * 10)
+	cache.remove_where(lambda key: key[0] == "bar")
+	assert cache.stats()["entries"] == 1 and cache.stats()["size_bytes"] == 10
+	assert cache.get(("line", 1)) == "x" * 10
+	cache.clear()
+	assert cache.stats()["entries"] == 0 and cache.stats()["size_bytes"] == 0
+
+def test_get_or_create_only_creates_on_a_miss():
+	cache = FigureCache(max_bytes=1000)
+	created = []
+	def create_figure():
+		created.append(1)
+		return StubFigure(len(created))
+	assert cache.get_or_create("a", create_figure) == { "value": 1 }
+	assert cache.get_or_create("a", create_figure) == { "value": 1 }
+	assert len(created) == 1
+
+def test_concurrent_access_keeps_the_size_consistent():
+	# Without the lock the size and the entries get out of sync when threads evict at the same time
+	cache = FigureCache(max_bytes=200)
+	start = threading.Barrier(8)
+	errors = []
+	def run(thread_index):
+		start.wait()
+		try:
+			for i in range(2000):
+				key = (thread_index * 7 + i) % 50
+				if cache.get(key) is None:
+					cache.put(key, str(key) * (1 + key % 10))
+				if i % 500 == 0:
+					cache.remove_where(lambda k: k % 7 == thread_index)
+		except Exception as e:
+			errors.append(e)
+	threads = [threading.Thread(target=run, args=(thread_index,)) for thread_index in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert errors == []
+	stats = cache.stats()
+	assert stats["size_bytes"] == sum(len(figure_json) for figure_json, _ in cache._entries.values())
+	assert stats["size_bytes"] <= stats["max_bytes"]
+	assert stats["hits"] + stats["misses"] == 8 * 2000
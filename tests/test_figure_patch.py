@@ -0,0 +1,68 @@
+import copy
+import importlib
+import json
+import plotly
+import pytest
+import data_versions
+from figure_patch import create_figure_patch
+from test_data_reload import publish_version
+
+def apply_patch(figure, patch):
+	# Applies the operations of a Patch like the browser does, after sending them as json
+	figure = copy.deepcopy(figure)
+	update = json.loads(json.dumps(patch.to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder))
+	for operation in update["operations"]:
+		*parents, last = operation["location"]
+		target = figure
+		for key in parents:
+			target = target[key]
+		if operation["operation"] == "Assign":
+			target[last] = operation["params"]["value"]
+		elif operation["operation"] == "Delete":
+			del target[last]
+		elif operation["operation"] == "Insert":
+			target[last].insert(operation["params"]["index"], operation["params"]["value"])
+		else:
+			raise ValueError(f"Unexpected operation {operation['operation']}")
+	return figure
+
+def create_figure(traces, title="Title", **layout):
+	return { "data": [{ "name": name, "x": x, "y": [2 * v for v in x] } for name, x in traces], "layout": { "title": { "text": title }, "template": { "data": "large" }, **layout } }
+
+@pytest.mark.parametrize("old_figure, new_figure", [
+	(create_figure([("a", [1, 2]), ("b", [3])]), create_figure([("a", [1, 2, 3]), ("b", [3, 4])], title="Other")),
+	(create_figure([("a", [1]), ("c", [3])]), create_figure([("a", [1]), ("b", [2]), ("c", [3])])),
+	(create_figure([("a", [1]), ("b", [2]), ("c", [3])]), create_figure([("a", [1]), ("c", [3])])),
+	(create_figure([("a", [1]), ("b", [2])]), create_figure([("b", [2]), ("a", [1]), ("c", [3])])),
+	(create_figure([("a", [1])], xaxis={ "range": [0, 1] }), create_figure([])),
+])
+def test_patch_turns_the_old_figure_into_the_new_one(old_figure, new_figure):
+	patch = create_figure_patch(old_figure, new_figure)
+	assert apply_patch(old_figure, patch) == new_figure
+	# The template is never resent
+	assert "large" not in json.dumps(patch.to_plotly_json())
+
+def test_patch_of_the_charts_equals_the_full_figure(tmp_path, monkeypatch):
+	publish_version(tmp_path, 300, seed=3)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	version = data_versions.read_current_version(str(tmp_path))
+	data = main.DataVersion(version, data_versions.get_version_path(str(tmp_path), version))
+	tags = [t["tag_id"] for t in data.get_tag_descriptions()]
+	years = data.get_years()
+	min_year, max_year = min(years), max(years)
+	# Changing the years, adding a tag in the middle, removing it again and changing several tags at once
+	filters = [
+		((tags[0], tags[2]), min_year, max_year),
+		((tags[0], tags[2]), max_year - 20, max_year),
+		((tags[0], tags[1], tags[2]), max_year - 20, max_year),
+		((tags[0], tags[2]), max_year - 20, max_year - 5),
+		((tags[3], tags[4]), min_year, max_year),
+	]
+	for figure_name, create in main.figure_creators.items():
+		figures = [json.loads(create(data, tuple(sorted(tags_to_filter)), start, stop).to_json()) for tags_to_filter, start, stop in filters]
+		for old_figure, new_figure in zip(figures, figures[1:]):
+			assert old_figure != new_figure
+			assert apply_patch(old_figure, create_figure_patch(old_figure, new_figure)) == new_figure
@@ -0,0 +1,41 @@
+import importlib
+import data_versions
+from test_data_reload import publish_version
+
+def test_filter_data_with_repeated_tag_ids(tmp_path, monkeypatch):
+	publish_version(tmp_path, 200, seed=0)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	version = data_versions.read_current_version(str(tmp_path))
+	data = main.DataVersion(version, data_versions.get_version_path(str(tmp_path), version))
+	tag_descriptions = data.get_tag_descriptions()
+	monkeypatch.setattr(data, "get_tag_descriptions", lambda: tag_descriptions + tag_descriptions[:2])
+
+	filter_data = main.prepare_filter_data(data)
+	assert filter_data["tag_ids"] == [t["tag_id"] for t in tag_descriptions]
+	tags_df = data.filter_indexes.get()["tags"].df.dropna(subset=["average_rating"])
+	assert [filter_data["tag_ids"][code] for code in filter_data["tags"]["tag_code"]] == tags_df["tag_id"].tolist()
+
+def test_partial_buckets_only_count_the_years_in_range(tmp_path, monkeypatch):
+	publish_version(tmp_path, 2000, seed=0)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	version = data_versions.read_current_version(str(tmp_path))
+	data = main.DataVersion(version, data_versions.get_version_path(str(tmp_path), version))
+	tags = tuple(t["tag_id"] for t in data.get_tag_descriptions()[:5])
+	years = data.get_years()
+	min_year, max_year = min(years) + 3, max(years) - 4
+
+	df = main.filter_tags_with_ratings(data, tags, min_year, max_year, 10)
+	yearly_df = data.filter_indexes.get()["tags"].query(tags, min_year, max_year)
+	yearly_df = yearly_df[yearly_df["number_of_mangas"] > 0].assign(bucket=yearly_df["year"] // 10 * 10)
+	for (tag_id, bucket_start), bucket in yearly_df.groupby(["tag_id", "bucket"], observed=True):
+		row = df[(df["tag_id"] == tag_id) & (df["year"] == bucket_start)]
+		assert row["number_of_mangas"].item() == bucket["number_of_mangas"].sum()
+		expected_rating = (bucket["average_rating"] * bucket["number_of_mangas"]).sum() / bucket["number_of_mangas"].sum()
+		assert abs(row["average_rating"].item() - expected_rating) < 1e-9
+	assert len(df) == yearly_df.groupby(["tag_id", "bucket"], observed=True).ngroups
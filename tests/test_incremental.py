@@ -0,0 +1,51 @@
+import csv
+import json
+import os
+import preprocessing
+from data_versions import get_data_directory
+from synthetic_data import write_synthetic_data
+
+def read_output(directory):
+	data_directory = get_data_directory(str(directory))
+	output = {}
+	for file_name in ("data_preprocessed.json", "manga.json"):
+		with open(os.path.join(data_directory, file_name), "r", encoding="utf-8") as f:
+			output[file_name] = json.load(f)
+	return output
+
+def change_data(data_path):
+	# Changes the rating of one manga and the tags of another, drops the last manga and adds a new one
+	with open(data_path, "r", encoding="utf-8", newline="") as f:
+		rows = list(csv.reader(f))
+	rows[5][2] = "4.900"
+	rows[10][4] = str(["Action", "Isekai"])
+	rows[-1] = ["Manga new", "A new story.", "3.500", "2024", str(["Romance"]), "https://example.com/covers/new.jpg"]
+	with open(data_path, "w", encoding="utf-8", newline="") as f:
+		csv.writer(f).writerows(rows)
+
+def test_incremental_run_matches_full_rebuild(tmp_path, capsys):
+	incremental_path = tmp_path / "incremental"
+	full_path = tmp_path / "full"
+	incremental_path.mkdir()
+	full_path.mkdir()
+	data_path = tmp_path / "data.csv"
+	write_synthetic_data(str(data_path), 300, seed=0)
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(incremental_path)])
+
+	change_data(data_path)
+	capsys.readouterr()
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(incremental_path), "--incremental"])
+	assert "Recalculating similar mangas of" in capsys.readouterr().out
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(full_path)])
+	assert read_output(incremental_path) == read_output(full_path)
+
+def test_unchanged_data_recalculates_nothing(tmp_path, capsys):
+	data_path = tmp_path / "data.csv"
+	write_synthetic_data(str(data_path), 200, seed=1)
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(tmp_path)])
+	previous_output = read_output(tmp_path)
+
+	capsys.readouterr()
+	preprocessing.main(["--data", str(data_path), "--output-dir", str(tmp_path), "--incremental", "--verify"])
+	assert "Found 0 added, 0 removed and 0 changed mangas" in capsys.readouterr().out
+	assert read_output(tmp_path) == previous_output
@@ -0,0 +1,128 @@
+import threading
+import pytest
+import requests
+from jikan import JikanClient, TTLCache
+from jikan_stand_in import JikanStandIn, create_mangas
+
+TITLES = ["Manga A", "Manga B", "Manga C"]
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0
+
+	def __call__(self):
+		return self.now
+
+@pytest.fixture
+def stand_in():
+	stand_in = JikanStandIn(create_mangas(TITLES, number_of_recommendations=2)).start()
+	yield stand_in
+	stand_in.stop()
+
+def create_client(stand_in, clock=None, **kwargs):
+	client = JikanClient(base_url=stand_in.base_url, max_backoff=0, **kwargs)
+	if clock is not None:
+		client.manga_id_cache.clock = clock
+		client.recommendations_cache.clock = clock
+	return client
+
+def test_ttl_cache_expires_and_evicts_entries():
+	clock = FakeClock()
+	cache = TTLCache(max_entries=2, clock=clock)
+	cache.put("a", 1, ttl=10)
+	cache.put("b", 2, ttl=5)
+	assert cache.get("a") == (True, 1)
+	# "b" is the least recently used entry
+	cache.put("c", 3, ttl=10)
+	assert cache.get("b") == (False, None)
+	clock.now = 10
+	assert cache.get("a") == (False, None)
+	assert cache.get("c") == (False, None)
+	assert (cache.hits, cache.misses) == (1, 3)
+
+def test_results_are_cached_until_their_ttl_expires(stand_in):
+	clock = FakeClock()
+	client = create_client(stand_in, clock, ttl=100, negative_ttl=10)
+	assert client.get_manga_id("Manga B") == 2
+	assert client.get_recommendations(2) == [("Manga C", "https://myanimelist.net/manga/3"), ("Manga A", "https://myanimelist.net/manga/1")]
+	clock.now = 99
+	assert client.get_manga_id("Manga B") == 2
+	assert client.get_recommendations(2) == [("Manga C", "https://myanimelist.net/manga/3"), ("Manga A", "https://myanimelist.net/manga/1")]
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/2/recommendations"]
+
+	clock.now = 100
+	assert client.get_manga_id("Manga B") == 2
+	assert client.get_recommendations(2) == [("Manga C", "https://myanimelist.net/manga/3"), ("Manga A", "https://myanimelist.net/manga/1")]
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/2/recommendations"] * 2
+	assert client.number_of_requests == 4
+
+def test_not_found_results_expire_with_the_negative_ttl(stand_in):
+	clock = FakeClock()
+	client = create_client(stand_in, clock, ttl=100, negative_ttl=10)
+	assert client.get_manga_id("Unknown") is None
+	assert client.get_recommendations(99) == []
+	clock.now = 9
+	assert client.get_manga_id("Unknown") is None
+	assert client.get_recommendations(99) == []
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/99/recommendations"]
+
+	clock.now = 10
+	assert client.get_manga_id("Unknown") is None
+	assert client.get_recommendations(99) == []
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/99/recommendations"] * 2
+
+def test_failed_requests_are_retried_and_not_cached(stand_in):
+	client = create_client(stand_in, max_retries=1)
+	stand_in.queue_error(429, retry_after=0)
+	assert client.get_manga_id("Manga A") == 1
+	assert stand_in.get_searched_titles() == ["Manga A", "Manga A"]
+
+	stand_in.error_titles.add("Manga C")
+	with pytest.raises(requests.RequestException):
+		client.get_manga_id("Manga C")
+	stand_in.error_titles.clear()
+	assert client.get_manga_id("Manga C") == 3
+	assert stand_in.get_searched_titles() == ["Manga A", "Manga A", "Manga C", "Manga C", "Manga C"]
+
+def test_concurrent_lookups_of_the_same_title_send_one_request():
+	stand_in = JikanStandIn(create_mangas(TITLES), delay=0.3).start()
+	try:
+		client = create_client(stand_in)
+		start = threading.Barrier(5)
+		results = []
+		def look_up():
+			start.wait()
+			results.append(client.get_manga_id("Manga C"))
+		threads = [threading.Thread(target=look_up) for _ in range(5)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert results == [3] * 5
+		assert stand_in.get_searched_titles() == ["Manga C"]
+		assert client._in_flight == {}
+	finally:
+		stand_in.stop()
+
+def test_concurrent_lookups_share_a_failure():
+	stand_in = JikanStandIn(create_mangas(TITLES), delay=0.3).start()
+	try:
+		client = create_client(stand_in, max_retries=0)
+		stand_in.error_titles.add("Manga A")
+		start = threading.Barrier(3)
+		errors = []
+		def look_up():
+			start.wait()
+			try:
+				client.get_manga_id("Manga A")
+			except requests.RequestException as e:
+				errors.append(e)
+		threads = [threading.Thread(target=look_up) for _ in range(3)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert len(errors) == 3
+		assert stand_in.get_searched_titles() == ["Manga A"]
+	finally:
+		stand_in.stop()
@@ -0,0 +1,50 @@
+import importlib
+import time
+import diskcache
+import jikan
+from jikan_stand_in import JikanStandIn, create_mangas
+from test_data_reload import publish_version
+
+class JobJikanClient:
+	# Every job of a background callback is a new process with a new Jikan client
+	def __init__(self, base_url):
+		self.base_url = base_url
+
+	def get(self):
+		return jikan.JikanClient(self.base_url)
+
+	def is_created(self):
+		return False
+
+def test_live_recommendations_of_jobs_are_kept_in_the_disk_cache(tmp_path, monkeypatch):
+	publish_version(tmp_path, 200, seed=0)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	stand_in = JikanStandIn(create_mangas(["Manga A", "Manga B", "Manga C"], number_of_recommendations=2)).start()
+	try:
+		cache = diskcache.Cache(str(tmp_path / "background_callback_cache"))
+		monkeypatch.setattr(main, "background_callback_cache", cache)
+		monkeypatch.setattr(main, "jikan_client", JobJikanClient(stand_in.base_url))
+		set_progress = lambda progress_values: None
+
+		for _ in range(2):
+			assert main.get_live_recommendations("Manga A", set_progress) == [("Manga B", "https://myanimelist.net/manga/2"), ("Manga C", "https://myanimelist.net/manga/3")]
+		assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/1/recommendations"]
+
+		# Titles unknown to Jikan are kept for a shorter time
+		for _ in range(2):
+			assert main.get_live_recommendations("Unknown", set_progress) == []
+		assert stand_in.get_searched_titles() == ["Manga A", "Unknown"]
+		_, expire_time = cache.get(("jikan_recommendations", "Unknown"), expire_time=True)
+		assert expire_time - time.time() <= main.live_recommendations_negative_ttl
+
+		# Failed requests are not cached
+		stand_in.error_titles.add("Manga B")
+		for _ in range(2):
+			assert main.get_live_recommendations("Manga B", set_progress) == []
+		assert stand_in.get_searched_titles().count("Manga B") == 2 * 3
+		assert cache.get(("jikan_recommendations", "Manga B")) is None
+	finally:
+		stand_in.stop()
@@ -0,0 +1,56 @@
+import importlib
+import jikan
+import metrics
+import startup
+from jikan_stand_in import JikanStandIn, create_mangas
+from test_data_reload import publish_version
+
+def get_sample(metrics_text, name, **labels):
+	# Value of the sample with these labels (besides pid), 0 if there is none
+	for line in metrics_text.splitlines():
+		if line.startswith(name + "{") and all(f'{label}="{value}"' in line for label, value in labels.items()):
+			return float(line.rsplit(" ", 1)[1])
+	return 0
+
+def test_jikan_requests_of_the_detail_dialog_are_exported(tmp_path, monkeypatch):
+	# The requests to Jikan are only exported if the recommendations are loaded in the worker, which
+	# is the default (BACKGROUND_CALLBACKS=0). Jobs of background callbacks record them in their own process.
+	publish_version(tmp_path, 200, seed=0)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv("BACKGROUND_CALLBACKS", "0")
+	monkeypatch.setenv("DATA_RELOAD_INTERVAL", "0")
+	main = importlib.import_module("main")
+	assert main.background_callback_manager is None
+	manga_store = main.get_data().manga_store.get()
+	manga_id = int(manga_store.ids[0])
+	stand_in = JikanStandIn(create_mangas([manga_store.get_title(manga_id), "Manga B", "Manga C"], number_of_recommendations=2)).start()
+	try:
+		# Same as main.create_jikan_client with the stand-in as Jikan
+		monkeypatch.setattr(main, "jikan_client", startup.Lazy(lambda: jikan.JikanClient(stand_in.base_url, request_observer=metrics.observe_upstream_request("jikan"))))
+		client = main.server.test_client()
+		before = client.get("/metrics").get_data(as_text=True)
+
+		for _ in range(2):
+			response = client.post("/_dash-update-component", json={
+				"output": f"{main.modal_manga_detail_loading_spinner_content_id}.children",
+				"outputs": { "id": main.modal_manga_detail_loading_spinner_content_id, "property": "children" },
+				"inputs": [
+					{ "id": main.bar_similar_mangas_id, "property": "clickData", "value": { "points": [{ "customdata": [manga_id] }] } },
+					[],
+				],
+				"changedPropIds": [f"{main.bar_similar_mangas_id}.clickData"],
+			})
+			assert response.status_code == 200
+			assert "Manga B" in response.get_data(as_text=True)
+		after = client.get("/metrics").get_data(as_text=True)
+	finally:
+		stand_in.stop()
+
+	assert stand_in.get_request_paths() == ["/v4/manga", "/v4/manga/1/recommendations"]
+	upstream_count = "manhuag_upstream_request_duration_seconds_count"
+	for endpoint in ("search", "recommendations"):
+		assert get_sample(after, upstream_count, service="jikan", endpoint=endpoint, status="200") - get_sample(before, upstream_count, service="jikan", endpoint=endpoint, status="200") == 1
+	# The second click is answered by the caches of the Jikan client
+	for cache in ("jikan_manga_id", "jikan_recommendations"):
+		assert get_sample(after, "manhuag_cache_requests_total", cache=cache, result="hit") == 1
+		assert get_sample(after, "manhuag_cache_requests_total", cache=cache, result="miss") == 1
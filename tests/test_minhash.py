@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from minhash import MinHashIndex, calculate_recall, measure_recall
+from similarity import METRICS, build_inverted_index, build_tag_matrix, calculate_tag_weights, calculate_top_k_similar, score_rows
+from test_similarity import create_mangas
+
+def find_all_pairs(self, rows, k):
+	num_mangas = self.tag_matrix.shape[0]
+	return np.repeat(np.arange(len(rows)), num_mangas), np.tile(np.arange(num_mangas), len(rows))
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_scores_of_the_found_mangas_are_exact(metric):
+	mangas = create_mangas(300, 30, seed=5)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	index = MinHashIndex(tag_matrix, tag_counts, num_permutations=16, num_bands=4, max_bucket_candidates=8)
+	rows = np.arange(0, 300, 7)
+	columns, matching_counts, scores = index.top_k(rows, k=10, metric=metric)
+	dense_matching_counts, dense_scores = score_rows(tag_matrix, build_inverted_index(tag_matrix), tag_counts, rows, metric, calculate_tag_weights(tag_matrix))
+	assert np.array_equal(matching_counts, np.take_along_axis(dense_matching_counts, columns, axis=1))
+	assert np.array_equal(scores, np.take_along_axis(dense_scores, columns, axis=1))
+	# Sorted by descending score, ties by the lower position, without duplicates
+	for row_columns, row_scores in zip(columns.tolist(), scores.tolist()):
+		assert len(set(row_columns)) == len(row_columns)
+		assert sorted(zip(row_scores, row_columns), key=lambda pair: (-pair[0], pair[1])) == list(zip(row_scores, row_columns))
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_all_pairs_as_candidates_match_the_exact_search(metric, monkeypatch):
+	# The selection out of the candidates is the one of the exact search, ties included
+	monkeypatch.setattr(MinHashIndex, "find_candidate_pairs", find_all_pairs)
+	mangas = create_mangas(200, 8, seed=6)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	index = MinHashIndex(tag_matrix, tag_counts)
+	rows = np.arange(200)
+	for k in (1, 10, 250):
+		exact = calculate_top_k_similar(tag_matrix, tag_counts, k=k, rows=rows, metric=metric)
+		approximate = index.top_k(rows, k=k, metric=metric)
+		for exact_values, approximate_values in zip(exact, approximate):
+			assert np.array_equal(exact_values, approximate_values)
+
+def test_recall_of_similar_mangas():
+	mangas = create_mangas(2000, 60, seed=7)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	rows = np.arange(0, 2000, 10)
+	assert measure_recall(MinHashIndex(tag_matrix, tag_counts), rows) >= 0.9
+	# More bands find more of the similar mangas
+	assert measure_recall(MinHashIndex(tag_matrix, tag_counts, num_permutations=64, num_bands=64), rows) >= measure_recall(MinHashIndex(tag_matrix, tag_counts, num_permutations=64, num_bands=4), rows)
+
+def test_calculate_recall_counts_ties_with_the_kth_score():
+	exact_scores = np.array([[1.0, 0.5, 0.5], [0.75, 0.5, 0.25]])
+	assert calculate_recall(exact_scores, exact_scores) == 1.0
+	# Another manga with the k-th score is as good as the one of the exact search
+	assert calculate_recall(exact_scores, np.array([[1.0, 0.5, 0.5], [0.75, 0.25, 0.25]])) == 5 / 6
+	assert calculate_recall(exact_scores, np.array([[0.5, 0.5, 0.5], [0.5, 0.25, 0.0]])) == 4 / 6
+	assert calculate_recall(np.empty((2, 0)), np.empty((2, 0))) == 1.0
+
+def test_invalid_bands_and_empty_rows():
+	tag_matrix, tag_counts = build_tag_matrix(create_mangas(20, 5))
+	with pytest.raises(ValueError):
+		MinHashIndex(tag_matrix, tag_counts, num_permutations=10, num_bands=4)
+	columns, matching_counts, scores = MinHashIndex(tag_matrix, tag_counts).top_k([], k=5)
+	assert columns.shape == matching_counts.shape == scores.shape == (0, 5)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from similarity import METRICS, SEARCH_DENSE, SEARCH_PRUNED, build_inverted_index, build_tag_matrix, calculate_tag_weights, calculate_top_k_similar, score_rows, search_top_k
+from test_similarity import create_mangas
+
+@pytest.mark.parametrize("metric", METRICS)
+@pytest.mark.parametrize("num_tags, k", [(6, 10), (12, 10), (12, 1), (40, 25), (12, 300)])
+def test_pruned_search_matches_dense_search(metric, num_tags, k):
+	# Identical columns in the same order, counts and scores, ties included
+	mangas = create_mangas(300, num_tags, seed=num_tags + k)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	dense = calculate_top_k_similar(tag_matrix, tag_counts, k=k, metric=metric, search=SEARCH_DENSE)
+	pruned = calculate_top_k_similar(tag_matrix, tag_counts, k=k, metric=metric, search=SEARCH_PRUNED)
+	for dense_values, pruned_values in zip(dense, pruned):
+		assert dense_values.dtype == pruned_values.dtype
+		assert np.array_equal(dense_values, pruned_values)
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_pruned_search_leaves_out_excluded_mangas(metric):
+	mangas = create_mangas(200, 10, seed=4)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	inverted_index = build_inverted_index(tag_matrix)
+	tag_weights = calculate_tag_weights(tag_matrix)
+	rng = np.random.default_rng(0)
+	k = 15
+	for position in (0, 3, 50, 199):
+		excluded = rng.random(len(mangas)) < 0.3
+		excluded[position] = True
+		matching_counts, scores = score_rows(tag_matrix, build_inverted_index(tag_matrix), tag_counts, [position], metric, tag_weights)
+		# The dense order of all mangas without the excluded ones
+		order = np.argsort(-scores[0], kind="stable")
+		order = order[~excluded[order]][:k]
+		columns, pruned_matching_counts, pruned_scores = search_top_k(tag_matrix, inverted_index, tag_counts, position, k, metric, tag_weights, excluded)
+		assert columns.tolist() == order.tolist()
+		assert pruned_matching_counts.tolist() == matching_counts[0, order].tolist()
+		assert pruned_scores.tolist() == scores[0, order].tolist()
+
+def test_unknown_search_is_rejected():
+	tag_matrix, tag_counts = build_tag_matrix(create_mangas(10, 4))
+	with pytest.raises(ValueError):
+		calculate_top_k_similar(tag_matrix, tag_counts, search="brute")
@@ -0,0 +1,26 @@
+import multiprocessing
+from recommendation_store import STATUS_FOUND, RecommendationStore
+
+forked_store = None
+parent_connection = None
+
+def connect_in_forked_store(title):
+	# Returns the recommendations and whether the connection of the parent was reused
+	connection = forked_store._connect()
+	return forked_store.get(title), connection is parent_connection
+
+def test_forked_process_opens_its_own_connection(tmp_path):
+	global forked_store, parent_connection
+	path = str(tmp_path / "recommendations.sqlite")
+	RecommendationStore(path, read_only=False).put("Manga A", STATUS_FOUND, 1, [("Manga B", "https://example.org/b")])
+	store = RecommendationStore(path)
+	assert store.get("Manga A") == [("Manga B", "https://example.org/b")]
+
+	# The store is passed to the process by the fork, like the data of a background callback job
+	forked_store = store
+	parent_connection = store._connect()
+	with multiprocessing.get_context("fork").Pool(1) as pool:
+		recommendations, reused_connection = pool.apply(connect_in_forked_store, ("Manga A",))
+	assert recommendations == [("Manga B", "https://example.org/b")]
+	assert not reused_connection
+	assert store._connect() is parent_connection
@@ -0,0 +1,82 @@
+import math
+import numpy as np
+import pytest
+from artifacts import load_search_index_columns, write_search_index
+from search_index import BM25_B, BM25_K1, PREFIX_MATCH_WEIGHT, SearchIndex
+
+MANGAS = [
+	{ "id": 10, "title": "The Dragon King", "tags": ["Fantasy"], "description": "A king rules." },
+	{ "id": 11, "title": "Cooking Club", "tags": ["Comedy", "School Life"], "description": "A dragon joins the cooking club." },
+	{ "id": 12, "title": "Dragonfly", "tags": ["Drama"], "description": "Summer at the lake." },
+	{ "id": 13, "title": "Knight and King", "tags": ["Fantasy", "Action"], "description": "A knight serves the king." },
+	{ "id": 14, "title": "Quiet Days", "tags": ["Slice of Life"], "description": "Nothing happens." },
+]
+
+@pytest.fixture
+def index():
+	return SearchIndex.from_mangas(MANGAS)
+
+def test_title_matches_rank_before_description_matches(index):
+	ids, scores = index.search("dragon")
+	# The short title "Dragonfly" matches as prefix of the last term, "Cooking Club" only has the term in its description
+	assert ids.tolist() == [12, 10, 11]
+	assert np.all(np.diff(scores) < 0)
+
+def test_mangas_matching_more_terms_rank_first(index):
+	ids, _ = index.search("king knight")
+	assert ids.tolist() == [13, 10]
+	# Upper and lower case do not matter, repeated terms count once
+	assert index.search("KING Knight king")[0].tolist() == [13, 10]
+	# Matching both terms beats a higher score of a single term
+	mangas = [
+		{ "id": 1, "title": "Vampire", "tags": ["Horror"], "description": "" },
+		{ "id": 2, "title": "Long Story", "tags": ["Drama"], "description": "A long tale of a vampire and a hunter in a small town." },
+		{ "id": 3, "title": "Hunter", "tags": ["Action"], "description": "" },
+	]
+	ids, scores = SearchIndex.from_mangas(mangas).search("vampire hunter")
+	assert ids.tolist() == [2, 1, 3]
+	assert scores[0] < scores[1]
+
+def test_only_the_last_term_matches_as_prefix(index):
+	assert index.search("dra")[0].tolist() == [12, 10, 11]
+	assert index.search("cook")[0].tolist() == [11]
+	# "dra" and "cook" are not the last term anymore, they have to match exactly
+	assert index.search("dra cooking")[0].tolist() == [11]
+	assert index.search("cook dragon")[0].tolist() == index.search("dragon")[0].tolist()
+
+def test_scores_are_bm25_of_the_weighted_fields(index):
+	# "summer" is only part of the description of one manga, "fantasy" is a tag of two.
+	# The length of a manga is the weighted number of terms of its title, tags and description.
+	document_lengths = [3 * 3 + 2 * 1 + 3, 3 * 2 + 2 * 3 + 6, 3 * 1 + 2 * 1 + 4, 3 * 3 + 2 * 2 + 5, 3 * 2 + 2 * 3 + 2]
+	average_length = sum(document_lengths) / len(document_lengths)
+	def bm25(term_frequency, document_frequency, document_length):
+		idf = math.log(1 + (len(MANGAS) - document_frequency + 0.5) / (document_frequency + 0.5))
+		return idf * term_frequency * (BM25_K1 + 1) / (term_frequency + BM25_K1 * (1 - BM25_B + BM25_B * document_length / average_length))
+
+	ids, scores = index.search("summer")
+	assert ids.tolist() == [12]
+	assert scores[0] == pytest.approx(bm25(1, 1, document_lengths[2]), rel=1e-6)
+	ids, scores = index.search("fantasy")
+	assert dict(zip(ids.tolist(), scores.tolist())) == pytest.approx({ 10: bm25(2, 2, document_lengths[0]), 13: bm25(2, 2, document_lengths[3]) }, rel=1e-6)
+
+def test_prefix_matches_count_less_than_exact_matches(index):
+	ids, scores = index.search("dragonfly")
+	assert ids.tolist() == [12]
+	prefix_ids, prefix_scores = index.search("dragonf")
+	assert prefix_ids.tolist() == [12]
+	assert prefix_scores[0] == pytest.approx(scores[0] * PREFIX_MATCH_WEIGHT, rel=1e-6)
+
+def test_no_match_and_k(index):
+	assert index.search("vampire")[0].tolist() == []
+	assert index.search("")[0].tolist() == []
+	assert len(index.search("king", k=1)[0]) == 1
+	assert index.search("king", k=0)[0].tolist() == []
+
+def test_index_read_from_the_binary_data_returns_the_same_results(index, tmp_path):
+	write_search_index(str(tmp_path), index.to_columns())
+	loaded_index = SearchIndex.from_columns(load_search_index_columns(str(tmp_path)))
+	for query in ("dragon", "king knight", "dra", "fantasy act", "vampire"):
+		ids, scores = index.search(query)
+		loaded_ids, loaded_scores = loaded_index.search(query)
+		assert loaded_ids.tolist() == ids.tolist()
+		assert loaded_scores.tolist() == scores.tolist()
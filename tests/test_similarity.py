@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from preprocessing import calculate_similarity_score
+from similarity import METRIC_IDF, METRIC_JACCARD, METRIC_OVERLAP, METRICS, SimilarityIndex, build_tag_matrix, calculate_similar_mangas, calculate_tag_weights, calculate_top_k_similar
+
+def create_mangas(num_mangas, num_tags, seed=0):
+	# Few tags so that many mangas tie, some mangas have no tags or list a tag twice, every third title is shared
+	rng = np.random.default_rng(seed)
+	mangas = []
+	for position in range(num_mangas):
+		tags = [f"Tag {tag}" for tag in rng.choice(num_tags, size=rng.integers(0, min(6, num_tags + 1)), replace=False, p=np.arange(num_tags, 0, -1) / (num_tags * (num_tags + 1) / 2))]
+		if position % 17 == 0 and len(tags) > 0:
+			tags.append(tags[0])
+		mangas.append({ "id": 2 * position + 1, "title": f"Manga {position - position % 3 if position % 3 == 1 else position}", "tags": tags })
+	return mangas
+
+def calculate_reference_scores(mangas, position, metric):
+	# Scores of the manga at position against all mangas, one pair after the other
+	tag_matrix, _ = build_tag_matrix(mangas)
+	tag_weights = calculate_tag_weights(tag_matrix)
+	tag_ids = {}
+	for manga in mangas:
+		for tag in manga["tags"]:
+			tag_ids.setdefault(tag, len(tag_ids))
+	query = mangas[position]
+	query_tags = set(query["tags"])
+	scores = []
+	for manga in mangas:
+		matching = query_tags.intersection(manga["tags"])
+		if len(matching) == 0:
+			scores.append(0)
+		elif metric == METRIC_OVERLAP:
+			scores.append(calculate_similarity_score(query, manga))
+		elif metric == METRIC_JACCARD:
+			scores.append(len(matching) / len(query_tags.union(manga["tags"])))
+		else:
+			# The weights are added in the order of the tag ids like the sparse products do, this way equal sums are equal floats
+			scores.append(sum(tag_weights[tag_id] for tag_id in sorted(tag_ids[tag] for tag in matching)) / sum(tag_weights[tag_id] for tag_id in sorted(tag_ids[tag] for tag in query_tags)))
+	return scores
+
+def get_reference_top_k(scores, k, excluded=()):
+	# The highest scores first, ties go to the lower position
+	return sorted([column for column in range(len(scores)) if column not in excluded], key=lambda column: -scores[column])[:k]
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_top_k_matches_scoring_every_pair(metric):
+	mangas = create_mangas(150, 12)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	k = 10
+	columns, matching_counts, scores = calculate_top_k_similar(tag_matrix, tag_counts, k=k, metric=metric)
+	for position in range(len(mangas)):
+		reference_scores = calculate_reference_scores(mangas, position, metric)
+		reference_columns = get_reference_top_k(reference_scores, k)
+		assert columns[position].tolist() == reference_columns
+		assert scores[position].tolist() == [reference_scores[column] for column in reference_columns]
+		assert matching_counts[position].tolist() == [len(set(mangas[position]["tags"]).intersection(mangas[column]["tags"])) for column in reference_columns]
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_blocks_do_not_change_the_result(metric):
+	mangas = create_mangas(120, 8, seed=1)
+	tag_matrix, tag_counts = build_tag_matrix(mangas)
+	rows = np.array([5, 0, 119, 60])
+	full_result = calculate_top_k_similar(tag_matrix, tag_counts, k=7, metric=metric)
+	# A block of a single row
+	block_result = calculate_top_k_similar(tag_matrix, tag_counts, k=7, rows=rows, max_block_bytes=1, metric=metric)
+	for full, block in zip(full_result, block_result):
+		assert np.array_equal(full[rows], block)
+
+def test_overlap_scores_are_the_ones_of_calculate_similarity_score():
+	mangas = create_mangas(80, 10, seed=2)
+	for position, similar_mangas in enumerate(calculate_similar_mangas(mangas, k=5)):
+		for similar_manga in similar_mangas:
+			other = next(manga for manga in mangas if manga["id"] == similar_manga["id"])
+			assert similar_manga["similarity_score"] == calculate_similarity_score(mangas[position], other)
+			assert similar_manga["title"] == other["title"]
+
+@pytest.mark.parametrize("metric", METRICS)
+@pytest.mark.parametrize("k", [1, 10, 200])
+def test_query_matches_scoring_every_pair(metric, k):
+	mangas = create_mangas(150, 12, seed=3)
+	index = SimilarityIndex.from_mangas(mangas)
+	for position in (0, 1, 4, 77, 149):
+		reference_scores = calculate_reference_scores(mangas, position, metric)
+		for exclude_self, exclude_duplicates in ((False, False), (True, False), (False, True)):
+			excluded = set()
+			if exclude_self:
+				excluded.add(position)
+			if exclude_duplicates:
+				excluded.update(column for column, manga in enumerate(mangas) if manga["title"] == mangas[position]["title"])
+			reference_columns = get_reference_top_k(reference_scores, k, excluded)
+			ids, titles, scores = index.query(mangas[position]["id"], k, metric, exclude_self, exclude_duplicates)
+			assert ids.tolist() == [mangas[column]["id"] for column in reference_columns]
+			assert titles == [mangas[column]["title"] for column in reference_columns]
+			assert scores.tolist() == [reference_scores[column] for column in reference_columns]
+
+def test_query_of_an_unknown_manga_and_metric():
+	index = SimilarityIndex.from_mangas(create_mangas(10, 4))
+	with pytest.raises(KeyError):
+		index.query(2)
+	with pytest.raises(ValueError):
+		index.query(1, metric="cosine")